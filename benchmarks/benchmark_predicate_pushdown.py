@@ -0,0 +1,98 @@
+import smcmodel_localize.data_pipes
+import smcmodel_localize.database_connections
+import pandas as pd
+import numpy as np
+import argparse
+import tempfile
+import time
+import os
+
+class DatabaseConnectionNoPushdown:
+
+    def __init__(self, database_connection):
+        self.database_connection = database_connection
+
+    def fetch_data_object_time_series(
+        self,
+        start_time = None,
+        end_time = None,
+        object_ids = None
+    ):
+        return self.database_connection.fetch_data_object_time_series(
+            start_time = start_time,
+            end_time = end_time,
+            object_ids = object_ids
+        )
+
+def synthetic_rssi_dataframe(
+    num_timestamps,
+    num_anchors,
+    num_objects,
+    seed = 0
+):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range('2020-01-01 12:00', periods = num_timestamps, freq = 's', tz = 'UTC')
+    anchor_ids = ['anchor_{:02}'.format(anchor_index) for anchor_index in range(num_anchors)]
+    object_ids = ['object_{:02}'.format(object_index) for object_index in range(num_objects)]
+    num_rows = num_timestamps*num_anchors*num_objects
+    dataframe = pd.DataFrame({
+        'timestamp': np.repeat(timestamps, num_anchors*num_objects),
+        'anchor_id': np.tile(np.repeat(anchor_ids, num_objects), num_timestamps),
+        'object_id': np.tile(object_ids, num_timestamps*num_anchors),
+        'rssi': rng.uniform(-110.0, -30.0, size = num_rows)
+    })
+    return dataframe
+
+def time_prepare_observation_data(database_connection, num_repeats, **kwargs):
+    durations = []
+    for repeat_index in range(num_repeats):
+        start = time.perf_counter()
+        smcmodel_localize.data_pipes.prepare_observation_data(
+            database_connection = database_connection,
+            measurement_value_field_name = 'rssi',
+            **kwargs
+        )
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare prepare_observation_data with and without predicate pushdown')
+    parser.add_argument('--num-timestamps', type = int, default = 3600)
+    parser.add_argument('--num-anchors', type = int, default = 8)
+    parser.add_argument('--num-objects', type = int, default = 10)
+    parser.add_argument('--measurement-value-min', type = float, default = -80.0)
+    parser.add_argument('--measurement-value-max', type = float, default = -40.0)
+    parser.add_argument('--num-repeats', type = int, default = 3)
+    arguments = parser.parse_args()
+    dataframe = synthetic_rssi_dataframe(
+        num_timestamps = arguments.num_timestamps,
+        num_anchors = arguments.num_anchors,
+        num_objects = arguments.num_objects
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        database_connection = smcmodel_localize.database_connections.DatabaseConnectionSQLite(
+            path = os.path.join(directory, 'observations.db')
+        )
+        database_connection.write_dataframe_object_time_series(dataframe)
+        filter_arguments = {
+            'measurement_value_min': arguments.measurement_value_min,
+            'measurement_value_max': arguments.measurement_value_max
+        }
+        pushdown_seconds = time_prepare_observation_data(
+            database_connection,
+            arguments.num_repeats,
+            **filter_arguments
+        )
+        client_side_seconds = time_prepare_observation_data(
+            DatabaseConnectionNoPushdown(database_connection),
+            arguments.num_repeats,
+            **filter_arguments
+        )
+        database_connection.close()
+    print('{} rows'.format(len(dataframe)))
+    print('Client-side filtering: {:.3f} s'.format(client_side_seconds))
+    print('Predicate pushdown: {:.3f} s'.format(pushdown_seconds))
+    print('Speedup: {:.2f}x'.format(client_side_seconds/pushdown_seconds))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+import smcmodel_localize.model_multilateration
+import smcmodel_localize.data_pipes
+import smcmodel_localize.legacy_data_processing
+import smcmodel_localize.timestamps
+import pandas as pd
+import numpy as np
+import argparse
+import datetime
+import platform
+import tempfile
+import json
+import time
+import sys
+import os
+
+BENCHMARK_NAMES = (
+    'localization_model',
+    'multilateration',
+    'observation_df_to_arrays',
+    'state_summary_df_to_data_list',
+    'csv_ingestion'
+)
+MEASUREMENT_VALUE_NAME = 'range'
+
+# Synthetic rooms are rectangles with the anchors spread around the walls and
+# the objects doing bounded random walks inside. Each ping measures the true
+# range plus Gaussian noise and succeeds with probability ping_success_rate;
+# failed pings are simply absent from the observation data, as they would be
+# in the sensor logs.
+
+def synthetic_room(
+    num_objects,
+    num_anchors,
+    num_timestamps,
+    ping_success_rate = 1.0,
+    room_size = (10.0, 20.0),
+    range_sd = 0.1,
+    object_speed = 0.1,
+    seed = 0
+):
+    rng = np.random.default_rng(seed)
+    room_corners = np.array([[0.0, 0.0], list(room_size)])
+    perimeter_positions = np.linspace(0.0, 2*(room_size[0] + room_size[1]), num_anchors, endpoint = False)
+    anchor_positions = np.array([
+        _perimeter_point(perimeter_position, room_size)
+        for perimeter_position in perimeter_positions
+    ])
+    steps = rng.normal(scale = object_speed, size = (num_timestamps, num_objects, 2))
+    steps[0] = rng.uniform(room_corners[0], room_corners[1], size = (num_objects, 2))
+    object_positions = np.clip(np.cumsum(steps, axis = 0), room_corners[0], room_corners[1])
+    ranges = np.linalg.norm(
+        object_positions[:, np.newaxis, :, :] - anchor_positions[np.newaxis, :, np.newaxis, :],
+        axis = -1
+    )
+    ranges = ranges + rng.normal(scale = range_sd, size = ranges.shape)
+    ping_successful = rng.uniform(size = ranges.shape) < ping_success_rate
+    timestamps = pd.date_range('2020-01-01 12:00', periods = num_timestamps, freq = 's', tz = 'UTC')
+    anchor_ids = np.array(['anchor_{:02}'.format(anchor_index) for anchor_index in range(num_anchors)])
+    object_ids = np.array(['object_{:02}'.format(object_index) for object_index in range(num_objects)])
+    timestamp_indices, anchor_indices, object_indices = np.nonzero(ping_successful)
+    observation_df = pd.DataFrame({
+        'timestamp': timestamps[timestamp_indices],
+        'anchor_id': anchor_ids[anchor_indices],
+        'object_id': object_ids[object_indices],
+        MEASUREMENT_VALUE_NAME: ranges[ping_successful]
+    })
+    room = {
+        'room_corners': room_corners,
+        'anchor_positions': anchor_positions,
+        'object_positions': object_positions,
+        'timestamps': timestamps,
+        'anchor_ids': anchor_ids.tolist(),
+        'object_ids': object_ids.tolist(),
+        'observation_df': observation_df
+    }
+    return room
+
+def _perimeter_point(perimeter_position, room_size):
+    width, height = room_size
+    if perimeter_position < width:
+        return [perimeter_position, 0.0]
+    perimeter_position -= width
+    if perimeter_position < height:
+        return [width, perimeter_position]
+    perimeter_position -= height
+    if perimeter_position < width:
+        return [width - perimeter_position, height]
+    perimeter_position -= width
+    return [0.0, height - perimeter_position]
+
+def best_time(function, num_repeats, setup = None):
+    durations = []
+    for repeat_index in range(num_repeats):
+        arguments = setup() if setup is not None else {}
+        start = time.perf_counter()
+        function(**arguments)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def benchmark_localization_model(room, observation_arrays, num_samples_list, ping_success_rate, num_repeats):
+    # Imported here so the other benchmarks run without TensorFlow
+    import smcmodel_localize.model
+    num_timestamps = len(observation_arrays['timestamps'])
+    model = smcmodel_localize.model.LocalizationModel(
+        num_objects = len(room['object_ids']),
+        num_anchors = len(room['anchor_ids']),
+        room_corners = room['room_corners'],
+        anchor_positions = room['anchor_positions'],
+        measurement_value_name = MEASUREMENT_VALUE_NAME,
+        ping_success_rate = ping_success_rate
+    )
+    # Data sources can only be iterated once, so each repeat gets fresh ones
+    def setup():
+        return {
+            'observation_data_queue': smcmodel_localize.data_pipes.observation_arrays_to_data_source(
+                arrays = observation_arrays,
+                measurement_value_field_name = MEASUREMENT_VALUE_NAME
+            ),
+            'state_summary_database': smcmodel_localize.data_pipes.create_state_summary_data_destination(
+                num_objects = len(room['object_ids']),
+                num_moving_object_dimensions = 2
+            )
+        }
+    results = {}
+    for num_samples in num_samples_list:
+        seconds = best_time(
+            lambda **arguments: model.estimate_state_time_series(num_samples = num_samples, **arguments),
+            num_repeats,
+            setup
+        )
+        results['localization_model_{}_samples'.format(num_samples)] = _result(seconds, num_timestamps, 'steps')
+    return results
+
+def benchmark_multilateration(room, observation_arrays, num_repeats):
+    num_timestamps = len(observation_arrays['timestamps'])
+    num_objects = len(room['object_ids'])
+    model = smcmodel_localize.model_multilateration.LocalizationModelMultilateration(
+        num_objects = num_objects,
+        num_anchors = len(room['anchor_ids']),
+        anchor_positions = room['anchor_positions'],
+        initial_position_guesses = np.tile(np.mean(room['room_corners'], axis = 0), (num_objects, 1)),
+        num_moving_object_dimensions = 2,
+        measurement_value_name = MEASUREMENT_VALUE_NAME
+    )
+    def setup():
+        return {
+            'observation_data_queue': smcmodel_localize.data_pipes.observation_arrays_to_data_source(
+                arrays = observation_arrays,
+                measurement_value_field_name = MEASUREMENT_VALUE_NAME
+            ),
+            'state_summary_database': smcmodel_localize.data_pipes.create_state_summary_data_destination_multilateration(
+                num_objects = num_objects,
+                num_moving_object_dimensions = 2
+            )
+        }
+    seconds = best_time(model.estimate_state_time_series_multilateration, num_repeats, setup)
+    return {'multilateration': _result(seconds, num_timestamps, 'steps')}
+
+def benchmark_observation_df_to_arrays(room, num_repeats):
+    observation_df = room['observation_df']
+    seconds = best_time(
+        lambda: smcmodel_localize.data_pipes.observation_df_to_arrays(
+            dataframe = observation_df,
+            measurement_value_field_name = MEASUREMENT_VALUE_NAME
+        ),
+        num_repeats
+    )
+    return {'observation_df_to_arrays': _result(seconds, len(observation_df), 'rows')}
+
+def benchmark_state_summary_df_to_data_list(room, num_repeats):
+    object_positions = room['object_positions']
+    state_summary_df = smcmodel_localize.data_pipes.state_summary_arrays_to_df(
+        state_summary_arrays = {
+            'timestamps': smcmodel_localize.timestamps.to_posix_timestamps(room['timestamps']),
+            'moving_object_positions_mean': object_positions,
+            'moving_object_positions_sd': np.zeros_like(object_positions)
+        },
+        object_ids = room['object_ids'],
+        position_mean_field_names = ['x_position', 'y_position'],
+        position_sd_field_names = ['x_position_sd', 'y_position_sd']
+    )
+    seconds = best_time(
+        lambda: smcmodel_localize.data_pipes.state_summary_df_to_data_list(state_summary_df),
+        num_repeats
+    )
+    return {'state_summary_df_to_data_list': _result(seconds, len(state_summary_df), 'rows')}
+
+def benchmark_csv_ingestion(room, num_repeats, num_workers = None):
+    observation_df = room['observation_df'].rename(columns = {MEASUREMENT_VALUE_NAME: 'value'})
+    results = {}
+    with tempfile.TemporaryDirectory() as top_directory:
+        # One directory per room (here just one) holding one file per object
+        directory = os.path.join(top_directory, 'room')
+        os.makedirs(directory)
+        for object_id, object_df in observation_df.groupby('object_id'):
+            object_df.to_csv(os.path.join(directory, '{}.csv'.format(object_id)), index = False)
+        walker_variants = [
+            ('csv_ingestion', {}),
+            ('csv_ingestion_typed', {'typed': True}),
+        ]
+        if num_workers is not None and num_workers > 1:
+            walker_variants.append(('csv_ingestion_{}_workers'.format(num_workers), {'num_workers': num_workers}))
+        for name, walker_arguments in walker_variants:
+            seconds = best_time(
+                lambda: smcmodel_localize.legacy_data_processing.csv_directories_to_dataframe(
+                    top_directory = top_directory,
+                    **walker_arguments
+                ),
+                num_repeats
+            )
+            results[name] = _result(seconds, len(observation_df), 'rows')
+    return results
+
+def _result(seconds, num_items, units):
+    return {
+        'seconds': seconds,
+        'rate': num_items/seconds,
+        'units': '{}/s'.format(units)
+    }
+
+# Results are compared on best-of-N wall time. A benchmark counts as a
+# regression when it takes more than (1 + tolerance) times its baseline time.
+
+def compare_to_baseline(results, baseline, tolerance):
+    if baseline['parameters'] != results['parameters']:
+        print('Warning: baseline was run with different parameters; comparisons may not be meaningful')
+    regressions = []
+    for name, result in results['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            print('{}: {:.4f} s (no baseline)'.format(name, result['seconds']))
+            continue
+        ratio = result['seconds']/baseline_result['seconds']
+        regression = ratio > 1.0 + tolerance
+        if regression:
+            regressions.append(name)
+        print('{}: {:.4f} s -> {:.4f} s ({:.2f}x baseline){}'.format(
+            name,
+            baseline_result['seconds'],
+            result['seconds'],
+            ratio,
+            ' REGRESSION' if regression else ''
+        ))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Time the filter, multilateration, data pipes, and CSV ingestion on a synthetic room')
+    parser.add_argument('--num-objects', type = int, default = 5)
+    parser.add_argument('--num-anchors', type = int, default = 6)
+    parser.add_argument('--num-timestamps', type = int, default = 600)
+    parser.add_argument('--ping-success-rate', type = float, default = 0.8, help = 'Fraction of pings present in the synthetic data')
+    parser.add_argument('--num-samples', type = int, nargs = '+', default = [100, 1000, 10000], help = 'Particle counts for the localization model')
+    parser.add_argument('--num-workers', type = int, default = None, help = 'Also time CSV ingestion with this many workers')
+    parser.add_argument('--num-repeats', type = int, default = 3)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--benchmarks', nargs = '+', choices = BENCHMARK_NAMES, default = list(BENCHMARK_NAMES))
+    parser.add_argument('--output', help = 'Write results to this JSON file')
+    parser.add_argument('--baseline', help = 'Compare results against this JSON file (written earlier with --output)')
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'Allowed fractional slowdown relative to the baseline')
+    arguments = parser.parse_args()
+    parameters = {
+        'num_objects': arguments.num_objects,
+        'num_anchors': arguments.num_anchors,
+        'num_timestamps': arguments.num_timestamps,
+        'ping_success_rate': arguments.ping_success_rate,
+        'num_samples': arguments.num_samples,
+        'num_workers': arguments.num_workers,
+        'num_repeats': arguments.num_repeats,
+        'seed': arguments.seed
+    }
+    room = synthetic_room(
+        num_objects = arguments.num_objects,
+        num_anchors = arguments.num_anchors,
+        num_timestamps = arguments.num_timestamps,
+        ping_success_rate = arguments.ping_success_rate,
+        seed = arguments.seed
+    )
+    print('{} timestamps, {} anchors, {} objects, {} observations'.format(
+        arguments.num_timestamps,
+        arguments.num_anchors,
+        arguments.num_objects,
+        len(room['observation_df'])
+    ))
+    observation_arrays = smcmodel_localize.data_pipes.observation_df_to_arrays(
+        dataframe = room['observation_df'],
+        measurement_value_field_name = MEASUREMENT_VALUE_NAME
+    )
+    benchmark_results = {}
+    if 'localization_model' in arguments.benchmarks:
+        benchmark_results.update(benchmark_localization_model(
+            room,
+            observation_arrays,
+            arguments.num_samples,
+            arguments.ping_success_rate,
+            arguments.num_repeats
+        ))
+    if 'multilateration' in arguments.benchmarks:
+        benchmark_results.update(benchmark_multilateration(room, observation_arrays, arguments.num_repeats))
+    if 'observation_df_to_arrays' in arguments.benchmarks:
+        benchmark_results.update(benchmark_observation_df_to_arrays(room, arguments.num_repeats))
+    if 'state_summary_df_to_data_list' in arguments.benchmarks:
+        benchmark_results.update(benchmark_state_summary_df_to_data_list(room, arguments.num_repeats))
+    if 'csv_ingestion' in arguments.benchmarks:
+        benchmark_results.update(benchmark_csv_ingestion(room, arguments.num_repeats, arguments.num_workers))
+    results = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__
+        },
+        'parameters': parameters,
+        'results': benchmark_results
+    }
+    for name, result in benchmark_results.items():
+        print('{}: {:.4f} s ({:.1f} {})'.format(name, result['seconds'], result['rate'], result['units']))
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as fp:
+            json.dump(results, fp, indent = 2)
+        print('Wrote results to {}'.format(arguments.output))
+    if arguments.baseline is not None:
+        with open(arguments.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        regressions = compare_to_baseline(results, baseline, arguments.tolerance)
+        if len(regressions) > 0:
+            print('{} benchmarks regressed by more than {:.0%}'.format(len(regressions), arguments.tolerance))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
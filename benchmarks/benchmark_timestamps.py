@@ -0,0 +1,103 @@
+import smcmodel_localize.data_pipes
+import smcmodel_localize.timestamps
+import pandas as pd
+import numpy as np
+import argparse
+import itertools
+import time
+
+# Reference implementations of the conversions as they were done before
+# timestamps were kept as float64 POSIX arrays throughout
+
+def legacy_observation_timestamps(timestamps):
+    return [timestamp.timestamp() for timestamp in timestamps.tolist()]
+
+def legacy_timestamp_object_id_product_df(timestamps, object_ids):
+    timestamps_converted = pd.to_datetime(timestamps, unit = 's').tz_localize('UTC')
+    return pd.DataFrame(
+        list(itertools.product(
+            timestamps_converted,
+            object_ids
+        )),
+        columns = [
+            'timestamp',
+            'object_id'
+        ]
+    )
+
+def legacy_state_summary_df_to_data_list(state_summary_df):
+    data_list = state_summary_df.to_dict(orient = 'records')
+    for i in range(len(data_list)):
+        data_list[i]['timestamp'] = data_list[i]['timestamp'].to_pydatetime()
+    return data_list
+
+def legacy_numpy_datetimes(posix_timestamps):
+    return np.array([
+        np.datetime64(pd.Timestamp(timestamp, unit = 's').to_datetime64())
+        for timestamp in posix_timestamps
+    ])
+
+def best_time(function, num_repeats):
+    durations = []
+    for repeat_index in range(num_repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare timestamp conversion costs for a day of data')
+    parser.add_argument('--sampling-interval', type = float, default = 1.0, help = 'Seconds between timestamps')
+    parser.add_argument('--num-objects', type = int, default = 10)
+    parser.add_argument('--num-repeats', type = int, default = 3)
+    arguments = parser.parse_args()
+    num_timestamps = int(round(24*60*60/arguments.sampling_interval))
+    timestamps = pd.date_range(
+        '2020-01-01',
+        periods = num_timestamps,
+        freq = pd.Timedelta(seconds = arguments.sampling_interval),
+        tz = 'UTC'
+    ).values
+    posix_timestamps = smcmodel_localize.timestamps.to_posix_timestamps(timestamps)
+    object_ids = ['object_{:02}'.format(object_index) for object_index in range(arguments.num_objects)]
+    state_summary_df = smcmodel_localize.data_pipes.timestamp_object_id_product_df(
+        timestamps = posix_timestamps,
+        object_ids = object_ids
+    )
+    state_summary_df['x_position'] = 0.0
+    state_summary_df['y_position'] = 0.0
+    comparisons = [
+        (
+            'Observation timestamps',
+            lambda: legacy_observation_timestamps(pd.DatetimeIndex(timestamps)),
+            lambda: smcmodel_localize.timestamps.to_posix_timestamps(timestamps)
+        ),
+        (
+            'State summary timestamp/object product',
+            lambda: legacy_timestamp_object_id_product_df(posix_timestamps, object_ids),
+            lambda: smcmodel_localize.data_pipes.timestamp_object_id_product_df(posix_timestamps, object_ids)
+        ),
+        (
+            'State summary data list',
+            lambda: legacy_state_summary_df_to_data_list(state_summary_df),
+            lambda: smcmodel_localize.data_pipes.state_summary_df_to_data_list(state_summary_df)
+        ),
+        (
+            'Visualization datetimes',
+            lambda: legacy_numpy_datetimes(posix_timestamps),
+            lambda: smcmodel_localize.timestamps.posix_timestamps_to_numpy_datetimes(posix_timestamps)
+        )
+    ]
+    print('{} timestamps, {} objects'.format(num_timestamps, arguments.num_objects))
+    for name, legacy_function, function in comparisons:
+        legacy_seconds = best_time(legacy_function, arguments.num_repeats)
+        seconds = best_time(function, arguments.num_repeats)
+        print('{}: {:.4f} s -> {:.4f} s ({:.1f}x)'.format(
+            name,
+            legacy_seconds,
+            seconds,
+            legacy_seconds/seconds
+        ))
+
+if __name__ == '__main__':
+    main()
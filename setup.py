@@ -7,7 +7,6 @@ VERSION = open(os.path.join(BASEDIR, 'VERSION')).read().strip()
 # Dependencies (format is 'PYPI_PACKAGE_NAME[>=]=VERSION_NUMBER')
 BASE_DEPENDENCIES = [
     'wf-smcmodel>=0.0.1',
-    'wf-datetime-conversion>=0.0.1',
     'tensorflow>=2.2',
     'tensorflow-probability>=0.10.0',
     'pandas>=1.0.5',
@@ -20,6 +19,14 @@ BASE_DEPENDENCIES = [
     'python-slugify>=4.0.0'
 ]
 
+PARQUET_DEPENDENCIES = [
+    'pyarrow>=4.0.0'
+]
+
+LZ4_DEPENDENCIES = [
+    'lz4>=3.1.0'
+]
+
 # TEST_DEPENDENCIES = [
 # ]
 #
@@ -41,10 +48,12 @@ setup(
     author_email='ted.quinn@wildflowerschools.org',
     install_requires=BASE_DEPENDENCIES,
     # tests_require=TEST_DEPENDENCIES,
-    # extras_require = {
-    #     'test': TEST_DEPENDENCIES,
-    #     'local': LOCAL_DEPENDENCIES
-    # },
+    extras_require = {
+        'parquet': PARQUET_DEPENDENCIES,
+        'lz4': LZ4_DEPENDENCIES,
+        # 'test': TEST_DEPENDENCIES,
+        # 'local': LOCAL_DEPENDENCIES
+    },
     keywords=['Bayes', 'SMC', 'localization'],
     classifiers=[
         'Intended Audience :: Developers',
@@ -1,3 +1,101 @@
-from smcmodel_localize.model import *
-from smcmodel_localize.model_multilateration import *
-from smcmodel_localize.data_pipes import *
+import importlib
+
+# Submodules (and the TensorFlow, SciPy, and smcmodel imports behind them) are
+# loaded on first attribute access, so scripts that only need the data
+# helpers don't pay for importing the SMC model
+
+_EXPORTS = {
+    'smcmodel_localize.model': [
+        'LocalizationModel',
+        'identity_measurement_value_mean_function',
+        'constant_measurement_value_sd_function'
+    ],
+    'smcmodel_localize.structures': [
+        'parameter_structure_generator',
+        'state_structure_generator',
+        'observation_structure_generator',
+        'state_summary_structure_generator'
+    ],
+    'smcmodel_localize.model_multilateration': [
+        'LocalizationModelMultilateration',
+        'state_summary_structure_generator_multilateration'
+    ],
+    'smcmodel_localize.data_pipes': [
+        'prepare_observation_data',
+        'fetch_observation_arrays',
+        'observation_data_list_to_df',
+        'filter_observation_df',
+        'observation_df_to_arrays',
+        'observation_arrays_to_data_source',
+        'DataSourceLongRecords',
+        'get_object_info_from_csv_file',
+        'get_anchor_info_from_csv_file',
+        'create_state_summary_data_destination',
+        'create_state_summary_data_destination_multilateration',
+        'write_output_data',
+        'write_output_data_multilateration',
+        'write_state_summary_df',
+        'state_summary_data_destination_to_arrays',
+        'state_summary_arrays_to_df',
+        'state_summary_arrays_multilateration_to_df',
+        'timestamp_object_id_product_df',
+        'state_summary_df_to_data_list'
+    ],
+    'smcmodel_localize.data_pipe_classes': [
+        'BufferedDataDestination'
+    ],
+    'smcmodel_localize.database_connections': [
+        'DATE_PARTITION_FIELD_NAME',
+        'PARTITION_NULL_FALLBACK',
+        'SCHEMA_METADATA_KEY',
+        'MAX_INLINE_SQLITE_PARAMETERS',
+        'DatabaseConnectionParquet',
+        'DatabaseConnectionSQLite'
+    ],
+    'smcmodel_localize.observation_cache': [
+        'CACHE_FILE_EXTENSION',
+        'ObservationCache',
+        'connection_identity'
+    ]
+}
+
+_EXPORT_MODULES = {
+    name: module_name
+    for module_name, names in _EXPORTS.items()
+    for name in names
+}
+
+_SUBMODULES = (
+    'chunk_store',
+    'cubes',
+    'data_pipe_classes',
+    'data_pipes',
+    'database_connections',
+    'file_manifest',
+    'ingestion_ledger',
+    'instrumentation',
+    'legacy_data_processing',
+    'legacy_visualization',
+    'model',
+    'model_multilateration',
+    'observation_cache',
+    'sharding',
+    'structures',
+    'timestamps'
+)
+
+__all__ = list(_EXPORT_MODULES.keys())
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        # Importing a submodule also binds it as an attribute of the package
+        return importlib.import_module('{}.{}'.format(__name__, name))
+    module_name = _EXPORT_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError('module \'{}\' has no attribute \'{}\''.format(__name__, name))
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
@@ -0,0 +1,169 @@
+import smcmodel_localize.timestamps
+import numpy as np
+import concurrent.futures
+import json
+import os
+import uuid
+import zlib
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+CHUNK_CODECS = ('none', 'zlib', 'lz4')
+META_FILENAME = 'meta.json'
+TIMESTAMPS_FILENAME = 'timestamps.npy'
+
+# A chunk store holds one observation cube ([T, 1, anchors, objects]) in a
+# directory: a meta.json file describing the cube and its chunks, the
+# timestamps as float64 POSIX seconds, and one file per block of chunk_size
+# timestamps. Each chunk is encoded independently, so a time sub-range can be
+# read by decoding only the chunks that overlap it.
+
+def arrays_to_chunk_store(
+    arrays,
+    directory,
+    measurement_value_name,
+    chunk_size = 3600,
+    codec = 'none',
+    compression_level = 1,
+    num_workers = None
+):
+    _check_codec(codec)
+    if chunk_size < 1:
+        raise ValueError('Chunk size must be at least 1')
+    os.makedirs(directory, exist_ok = True)
+    timestamps = smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps'])
+    measurement_value_array = np.ascontiguousarray(arrays[measurement_value_name])
+    num_timestamps = measurement_value_array.shape[0]
+    chunk_starts = list(range(0, num_timestamps, chunk_size))
+    chunks = []
+    for chunk_index, chunk_start in enumerate(chunk_starts):
+        chunk_end = min(chunk_start + chunk_size, num_timestamps)
+        chunks.append({
+            'filename': 'chunk_{:06}.bin'.format(chunk_index),
+            'start_index': chunk_start,
+            'end_index': chunk_end,
+            'start_timestamp': float(timestamps[chunk_start]),
+            'end_timestamp': float(timestamps[chunk_end - 1])
+        })
+    def write_chunk(chunk):
+        chunk_array = measurement_value_array[chunk['start_index']:chunk['end_index']]
+        _write_file(
+            os.path.join(directory, chunk['filename']),
+            _encode(chunk_array.tobytes(), codec, compression_level)
+        )
+    print('Writing {} chunks to {}'.format(len(chunks), directory))
+    # zlib and lz4 release the GIL while compressing, so threads are enough
+    # to write chunks in parallel
+    if num_workers is None or num_workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            write_chunk(chunk)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = num_workers) as executor:
+            list(executor.map(write_chunk, chunks))
+    timestamps_path = os.path.join(directory, TIMESTAMPS_FILENAME)
+    np.save(timestamps_path, timestamps)
+    meta = {
+        'measurement_value_name': measurement_value_name,
+        'num_timestamps': int(num_timestamps),
+        'num_anchors': int(arrays['num_anchors']),
+        'num_objects': int(arrays['num_objects']),
+        # tolist() gives plain Python strings and numbers, so numeric IDs
+        # come back as numbers
+        'anchor_ids': np.asarray(arrays['anchor_ids']).tolist(),
+        'object_ids': np.asarray(arrays['object_ids']).tolist(),
+        'dtype': measurement_value_array.dtype.str,
+        'shape': list(measurement_value_array.shape[1:]),
+        'chunk_size': chunk_size,
+        'codec': codec,
+        'chunks': chunks
+    }
+    # The metadata is written last, so a store without it is incomplete
+    _write_file(
+        os.path.join(directory, META_FILENAME),
+        json.dumps(meta, indent = 2).encode('utf-8')
+    )
+
+def chunk_store_to_arrays(
+    directory,
+    start_timestamp = None,
+    end_timestamp = None
+):
+    meta = read_chunk_store_meta(directory)
+    timestamps = np.load(os.path.join(directory, TIMESTAMPS_FILENAME))
+    start_index = 0
+    end_index = len(timestamps)
+    if start_timestamp is not None:
+        start_index = int(np.searchsorted(timestamps, smcmodel_localize.timestamps.to_posix_timestamp(start_timestamp), side = 'left'))
+    if end_timestamp is not None:
+        end_index = int(np.searchsorted(timestamps, smcmodel_localize.timestamps.to_posix_timestamp(end_timestamp), side = 'right'))
+    end_index = max(end_index, start_index)
+    dtype = np.dtype(meta['dtype'])
+    chunk_shape = tuple(meta['shape'])
+    measurement_value_array = np.empty((end_index - start_index,) + chunk_shape, dtype = dtype)
+    for chunk in meta['chunks']:
+        if chunk['end_index'] <= start_index or chunk['start_index'] >= end_index:
+            continue
+        chunk_array = np.frombuffer(
+            _decode(_read_file(os.path.join(directory, chunk['filename'])), meta['codec']),
+            dtype = dtype
+        ).reshape((chunk['end_index'] - chunk['start_index'],) + chunk_shape)
+        overlap_start = max(chunk['start_index'], start_index)
+        overlap_end = min(chunk['end_index'], end_index)
+        measurement_value_array[(overlap_start - start_index):(overlap_end - start_index)] = chunk_array[
+            (overlap_start - chunk['start_index']):(overlap_end - chunk['start_index'])
+        ]
+    arrays = {
+        'num_anchors': meta['num_anchors'],
+        'num_objects': meta['num_objects'],
+        'num_timestamps': end_index - start_index,
+        'anchor_ids': meta['anchor_ids'],
+        'object_ids': meta['object_ids'],
+        'timestamps': timestamps[start_index:end_index],
+        meta['measurement_value_name']: measurement_value_array
+    }
+    return arrays
+
+def read_chunk_store_meta(directory):
+    meta_path = os.path.join(directory, META_FILENAME)
+    if not os.path.exists(meta_path):
+        raise ValueError('No chunk store found in {}'.format(directory))
+    with open(meta_path, 'r') as fp:
+        meta = json.load(fp)
+    return meta
+
+def _check_codec(codec):
+    if codec not in CHUNK_CODECS:
+        raise ValueError('Chunk codec must be one of {} but received \'{}\''.format(
+            CHUNK_CODECS,
+            codec
+        ))
+    if codec == 'lz4' and lz4_frame is None:
+        raise ImportError('The lz4 chunk codec requires lz4 (pip install wf-smcmodel-localize[lz4])')
+
+def _encode(data, codec, compression_level):
+    if codec == 'zlib':
+        return zlib.compress(data, compression_level)
+    if codec == 'lz4':
+        return lz4_frame.compress(data, compression_level = compression_level)
+    return data
+
+def _decode(data, codec):
+    _check_codec(codec)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    if codec == 'lz4':
+        return lz4_frame.decompress(data)
+    return data
+
+def _write_file(path, data):
+    temporary_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    with open(temporary_path, 'wb') as fp:
+        fp.write(data)
+    os.replace(temporary_path, path)
+
+def _read_file(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
@@ -0,0 +1,96 @@
+import pandas as pd
+import numpy as np
+
+DUPLICATE_REDUCTION_METHODS = ('mean', 'min', 'max', 'latest', 'count')
+
+# The 'count' method replaces each measurement value with the number of
+# readings collapsed into it, which is useful for inspecting the source data
+# but isn't a measurement the model can use, so it's excluded where cubes are
+# built for the model
+CUBE_DUPLICATE_REDUCTION_METHODS = ('mean', 'min', 'max', 'latest')
+
+def reduce_duplicate_observations(
+    dataframe,
+    measurement_value_field_name,
+    method = 'mean',
+    timestamp_field_name = 'timestamp',
+    anchor_id_field_name = 'anchor_id',
+    object_id_field_name = 'object_id'
+):
+    if method not in DUPLICATE_REDUCTION_METHODS:
+        raise ValueError('Duplicate reduction method must be one of {} but received \'{}\''.format(
+            DUPLICATE_REDUCTION_METHODS,
+            method
+        ))
+    timestamp_codes, timestamp_uniques = pd.factorize(dataframe[timestamp_field_name])
+    anchor_codes, anchor_uniques = pd.factorize(dataframe[anchor_id_field_name])
+    object_codes, object_uniques = pd.factorize(dataframe[object_id_field_name])
+    # Rows with missing keys can't be placed in a cube, so they are dropped
+    # here rather than collapsed together
+    valid_rows = np.flatnonzero((timestamp_codes >= 0) & (anchor_codes >= 0) & (object_codes >= 0))
+    keys = (
+        timestamp_codes[valid_rows].astype(np.int64)*len(anchor_uniques) +
+        anchor_codes[valid_rows]
+    )*len(object_uniques) + object_codes[valid_rows]
+    order = np.argsort(keys, kind = 'stable')
+    sorted_keys = keys[order]
+    group_starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_keys)) + 1)).astype(np.int64)
+    group_ends = np.concatenate((group_starts[1:], [len(sorted_keys)])).astype(np.int64)
+    num_duplicates = len(sorted_keys) - len(group_starts)
+    if len(sorted_keys) == 0 or (num_duplicates == 0 and method != 'count'):
+        if len(valid_rows) == len(dataframe):
+            return dataframe, 0
+        return dataframe.iloc[valid_rows].reset_index(drop = True), 0
+    values = dataframe[measurement_value_field_name].to_numpy(dtype = np.float64)[valid_rows][order]
+    if method == 'mean':
+        not_nan = ~np.isnan(values)
+        sums = np.add.reduceat(np.where(not_nan, values, 0.0), group_starts)
+        counts = np.add.reduceat(not_nan.astype(np.int64), group_starts)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            reduced_values = np.where(counts > 0, sums/counts, np.nan)
+    elif method == 'min':
+        reduced_values = np.fmin.reduceat(values, group_starts)
+    elif method == 'max':
+        reduced_values = np.fmax.reduceat(values, group_starts)
+    elif method == 'latest':
+        # The stable sort keeps each group in source order, so the last row of
+        # each group is the latest reading delivered
+        reduced_values = values[group_ends - 1]
+    else:
+        reduced_values = (group_ends - group_starts).astype(np.float64)
+    # Keep narrower float columns (e.g., float32 from typed parsing) narrow
+    value_dtype = dataframe[measurement_value_field_name].dtype
+    if method != 'count' and isinstance(value_dtype, np.dtype) and value_dtype.kind == 'f':
+        reduced_values = reduced_values.astype(value_dtype)
+    if method == 'latest':
+        representative_rows = valid_rows[order[group_ends - 1]]
+    else:
+        representative_rows = valid_rows[order[group_starts]]
+    # Restore source order so downstream steps see rows as they arrived
+    source_order = np.argsort(representative_rows, kind = 'stable')
+    dataframe_reduced = dataframe.iloc[representative_rows[source_order]].copy()
+    dataframe_reduced[measurement_value_field_name] = reduced_values[source_order]
+    dataframe_reduced.reset_index(drop = True, inplace = True)
+    return dataframe_reduced, num_duplicates
+
+def collapse_duplicate_observations(
+    dataframe,
+    measurement_value_field_name,
+    method = 'mean',
+    timestamp_field_name = 'timestamp',
+    anchor_id_field_name = 'anchor_id',
+    object_id_field_name = 'object_id'
+):
+    if method not in CUBE_DUPLICATE_REDUCTION_METHODS:
+        raise ValueError('Duplicate reduction method for measurement cubes must be one of {} but received \'{}\''.format(
+            CUBE_DUPLICATE_REDUCTION_METHODS,
+            method
+        ))
+    return reduce_duplicate_observations(
+        dataframe = dataframe,
+        measurement_value_field_name = measurement_value_field_name,
+        method = method,
+        timestamp_field_name = timestamp_field_name,
+        anchor_id_field_name = anchor_id_field_name,
+        object_id_field_name = object_id_field_name
+    )
@@ -0,0 +1,224 @@
+import smcmodel.data_pipes
+import numpy as np
+import threading
+import queue
+import time
+
+# Data pipes that subclass smcmodel's pipes. Importing
+# smcmodel also imports TensorFlow, so these are kept apart from the pandas
+# helpers in data_pipes, which can then be used without TensorFlow.
+
+_WAKE_WRITER = object()
+
+class BufferedDataDestination(smcmodel.data_pipes.DataDestination):
+
+    def __init__(
+        self,
+        data_destination,
+        structure = None,
+        num_samples = None,
+        batch_size = 1000,
+        max_queue_depth = 1,
+        flush_interval = None
+    ):
+        if structure is None:
+            structure = data_destination.structure
+        if num_samples is None:
+            num_samples = data_destination.num_samples
+        if batch_size < 1:
+            raise ValueError('Batch size must be at least 1')
+        if max_queue_depth < 1:
+            raise ValueError('Maximum queue depth must be at least 1')
+        self.data_destination = data_destination
+        self.structure = structure
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.max_queue_depth = max_queue_depth
+        self.flush_interval = flush_interval
+        # One buffer is filled by the caller while up to max_queue_depth
+        # buffers wait for or are being written by the writer thread. When no
+        # free buffer is left, the caller blocks until the writer catches up.
+        self.free_buffers = queue.Queue()
+        for buffer_index in range(max_queue_depth + 1):
+            self.free_buffers.put(self._allocate_buffer())
+        self.pending_buffers = queue.Queue()
+        self.current_buffer = self.free_buffers.get()
+        self.num_buffered = 0
+        self.first_buffered_time = None
+        # The lock guards the current buffer, which the writer thread also
+        # hands off once its oldest row has waited flush_interval seconds
+        self.buffer_lock = threading.Lock()
+        self.error = None
+        self.closed = False
+        self.writer_thread = threading.Thread(
+            target = self._writer_loop,
+            daemon = True
+        )
+        self.writer_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except Exception:
+            if exc_type is None:
+                raise
+        return False
+
+    def _allocate_buffer(self):
+        buffer = {
+            'timestamps': np.empty(shape = (self.batch_size,), dtype = np.float64),
+            'arrays': {}
+        }
+        for variable_name in self.structure.keys():
+            variable_shape = self.structure[variable_name]['shape']
+            variable_dtype = np.dtype(self.structure[variable_name]['type'])
+            buffer['arrays'][variable_name] = np.empty(
+                shape = (self.batch_size, self.num_samples) + tuple(variable_shape),
+                dtype = variable_dtype
+            )
+        return buffer
+
+    # Internal method for writing data (see parent class)
+    def _write_data(self, timestamp, single_time_data):
+        if self.closed:
+            raise ValueError('Cannot write data to a closed buffered data destination')
+        self._raise_writer_error()
+        for variable_name in self.structure.keys():
+            if variable_name not in single_time_data.keys():
+                raise ValueError('Variable {} specified in structure but not found in data'.format(variable_name))
+            expected_array_shape = (self.num_samples,) + tuple(self.structure[variable_name]['shape'])
+            array_shape = np.shape(single_time_data[variable_name])
+            if array_shape != expected_array_shape:
+                raise ValueError('Expected shape {} for {} but received shape {}'.format(
+                    expected_array_shape,
+                    variable_name,
+                    array_shape
+                ))
+        with self.buffer_lock:
+            buffer_index = self.num_buffered
+            self.current_buffer['timestamps'][buffer_index] = timestamp
+            for variable_name in self.structure.keys():
+                self.current_buffer['arrays'][variable_name][buffer_index] = single_time_data[variable_name]
+            self.num_buffered += 1
+            buffer_started = self.num_buffered == 1
+            if buffer_started:
+                self.first_buffered_time = time.monotonic()
+            buffer_full = self.num_buffered >= self.batch_size
+        if buffer_full:
+            self._hand_off_buffer()
+        elif buffer_started and self.flush_interval is not None:
+            # Wake the writer so it waits on the new buffer's deadline
+            self.pending_buffers.put(_WAKE_WRITER)
+
+    def flush(self):
+        if self.closed:
+            return
+        self._hand_off_buffer()
+        self.pending_buffers.join()
+        self._raise_writer_error()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._hand_off_buffer()
+        finally:
+            self.pending_buffers.put(None)
+            self.writer_thread.join()
+            self.closed = True
+        self._raise_writer_error()
+
+    # The free buffer is taken before the lock, since waiting for one while
+    # holding the lock would keep the writer thread from freeing any
+    def _hand_off_buffer(self):
+        free_buffer = self.free_buffers.get()
+        with self.buffer_lock:
+            self._swap_buffer(free_buffer)
+
+    def _swap_buffer(self, free_buffer):
+        if self.num_buffered == 0:
+            self.free_buffers.put(free_buffer)
+            return
+        self.pending_buffers.put((self.current_buffer, self.num_buffered))
+        self.current_buffer = free_buffer
+        self.num_buffered = 0
+        self.first_buffered_time = None
+
+    def _flush_if_due(self):
+        with self.buffer_lock:
+            if self.num_buffered == 0 or time.monotonic() - self.first_buffered_time < self.flush_interval:
+                return
+            try:
+                free_buffer = self.free_buffers.get_nowait()
+            except queue.Empty:
+                # Every other buffer is waiting to be written, so the writer
+                # has work to do anyway
+                return
+            self._swap_buffer(free_buffer)
+
+    def _time_until_flush(self):
+        with self.buffer_lock:
+            if self.num_buffered == 0:
+                return None
+            return max(self.first_buffered_time + self.flush_interval - time.monotonic(), 0.0)
+
+    def _raise_writer_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _writer_loop(self):
+        while True:
+            if self.flush_interval is None:
+                item = self.pending_buffers.get()
+            else:
+                try:
+                    item = self.pending_buffers.get(timeout = self._time_until_flush())
+                except queue.Empty:
+                    self._flush_if_due()
+                    continue
+            if item is _WAKE_WRITER:
+                self.pending_buffers.task_done()
+                continue
+            if item is None:
+                self.pending_buffers.task_done()
+                break
+            buffer, num_rows = item
+            try:
+                # Once the wrapped destination has failed, later batches are
+                # dropped and the error is raised in the calling thread
+                if self.error is None:
+                    self._write_batch(buffer, num_rows)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.free_buffers.put(buffer)
+                self.pending_buffers.task_done()
+
+    def _write_batch(self, buffer, num_rows):
+        timestamps = buffer['timestamps'][:num_rows]
+        arrays = buffer['arrays']
+        if isinstance(self.data_destination, smcmodel.data_pipes.DataDestinationArrayDict):
+            # Append the whole batch at once rather than concatenating one
+            # timestamp at a time
+            self.data_destination.timestamps = np.concatenate((
+                self.data_destination.timestamps,
+                timestamps
+            ))
+            for variable_name in self.structure.keys():
+                self.data_destination.array_dict[variable_name] = np.concatenate((
+                    self.data_destination.array_dict[variable_name],
+                    arrays[variable_name][:num_rows].astype(
+                        self.data_destination.array_dict[variable_name].dtype,
+                        copy = False
+                    )
+                ))
+        else:
+            for row_index in range(num_rows):
+                single_time_data = {
+                    variable_name: arrays[variable_name][row_index].copy()
+                    for variable_name in self.structure.keys()
+                }
+                self.data_destination.write_data(timestamps[row_index], single_time_data)
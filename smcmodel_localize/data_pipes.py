@@ -1,34 +1,75 @@
-import smcmodel.data_pipes
-import smcmodel_localize.model
+import smcmodel_localize.structures
 import smcmodel_localize.model_multilateration
+import smcmodel_localize.timestamps
+import smcmodel_localize.cubes
+import smcmodel_localize.instrumentation
 import pandas as pd
 import numpy as np
+import importlib
 import itertools
 
+# smcmodel (and with it TensorFlow) is only imported by the functions that
+# build smcmodel data sources and destinations, so the pandas helpers here can
+# be used without TensorFlow. Classes that subclass smcmodel's pipes live in
+# data_pipe_classes and are loaded from there on first access.
+
+_DATA_PIPE_CLASS_NAMES = ('BufferedDataDestination',)
+
+def __getattr__(name):
+    if name in _DATA_PIPE_CLASS_NAMES:
+        return getattr(importlib.import_module('smcmodel_localize.data_pipe_classes'), name)
+    raise AttributeError('module \'{}\' has no attribute \'{}\''.format(__name__, name))
+
 def prepare_observation_data(
     database_connection,
     measurement_value_field_name,
     start_time = None,
     end_time = None,
     object_ids = None,
+    anchor_ids = None,
     measurement_value_min = None,
-    measurement_value_max = None
+    measurement_value_max = None,
+    duplicate_reduction_method = 'mean',
+    observation_cache = None,
+    instrumentation = None
 ):
-    observation_data_list = database_connection.fetch_data_object_time_series(
-        start_time = start_time,
-        end_time = end_time,
-        object_ids = object_ids
-    )
-    observation_df = observation_data_list_to_df(observation_data_list)
-    observation_df = filter_observation_df(
-        dataframe = observation_df,
-        measurement_value_field_name = measurement_value_field_name,
-        measurement_value_min = measurement_value_min,
-        measurement_value_max = measurement_value_max
-    )
-    observation_arrays = observation_df_to_arrays(
-        dataframe = observation_df,
-        measurement_value_field_name = measurement_value_field_name)
+    instrumentation = smcmodel_localize.instrumentation.active_instrumentation(instrumentation)
+    observation_arrays = None
+    if observation_cache is not None:
+        cache_key = observation_cache.key(
+            database_connection = database_connection,
+            measurement_value_field_name = measurement_value_field_name,
+            start_time = start_time,
+            end_time = end_time,
+            object_ids = object_ids,
+            anchor_ids = anchor_ids,
+            measurement_value_min = measurement_value_min,
+            measurement_value_max = measurement_value_max,
+            duplicate_reduction_method = duplicate_reduction_method
+        )
+        with instrumentation.timer('observation_cache_read'):
+            observation_arrays = observation_cache.get(cache_key)
+        instrumentation.count('observation_cache_hits' if observation_arrays is not None else 'observation_cache_misses')
+    if observation_arrays is None:
+        observation_arrays = fetch_observation_arrays(
+            database_connection = database_connection,
+            measurement_value_field_name = measurement_value_field_name,
+            start_time = start_time,
+            end_time = end_time,
+            object_ids = object_ids,
+            anchor_ids = anchor_ids,
+            measurement_value_min = measurement_value_min,
+            measurement_value_max = measurement_value_max,
+            duplicate_reduction_method = duplicate_reduction_method,
+            instrumentation = instrumentation
+        )
+        if observation_cache is not None:
+            with instrumentation.timer('observation_cache_write'):
+                observation_cache.put(
+                    cache_key,
+                    observation_arrays,
+                    measurement_value_field_name
+                )
     observation_data_source = observation_arrays_to_data_source(
         arrays = observation_arrays,
         measurement_value_field_name = measurement_value_field_name
@@ -44,7 +85,71 @@ def prepare_observation_data(
     }
     return observation_data
 
+def fetch_observation_arrays(
+    database_connection,
+    measurement_value_field_name,
+    start_time = None,
+    end_time = None,
+    object_ids = None,
+    anchor_ids = None,
+    measurement_value_min = None,
+    measurement_value_max = None,
+    duplicate_reduction_method = 'mean',
+    instrumentation = None
+):
+    instrumentation = smcmodel_localize.instrumentation.active_instrumentation(instrumentation)
+    fetch_arguments = {
+        'start_time': start_time,
+        'end_time': end_time,
+        'object_ids': object_ids
+    }
+    # Push filters down to the connection where it advertises support for
+    # them; anything it can't handle is applied to the fetched data below
+    supported_fetch_predicates = getattr(database_connection, 'supported_fetch_predicates', ())
+    if 'measurement_value_range' in supported_fetch_predicates:
+        # Also lets the connection return the measurement column when there
+        # are no matching rows
+        fetch_arguments['measurement_value_field_name'] = measurement_value_field_name
+    if (
+        (measurement_value_min is not None or measurement_value_max is not None) and
+        'measurement_value_range' in supported_fetch_predicates
+    ):
+        fetch_arguments['measurement_value_min'] = measurement_value_min
+        fetch_arguments['measurement_value_max'] = measurement_value_max
+        measurement_value_min = None
+        measurement_value_max = None
+    if anchor_ids is not None and 'anchor_ids' in supported_fetch_predicates:
+        fetch_arguments['anchor_ids'] = anchor_ids
+        anchor_ids = None
+    if hasattr(database_connection, 'fetch_dataframe_object_time_series'):
+        with instrumentation.timer('fetch') as timer:
+            observation_df = database_connection.fetch_dataframe_object_time_series(**fetch_arguments)
+            timer.add_items(len(observation_df))
+    else:
+        with instrumentation.timer('fetch') as timer:
+            observation_data_list = database_connection.fetch_data_object_time_series(**fetch_arguments)
+            timer.add_items(len(observation_data_list))
+        with instrumentation.timer('dataframe_conversion', num_items = len(observation_data_list)):
+            observation_df = observation_data_list_to_df(observation_data_list)
+    with instrumentation.timer('filter', num_items = len(observation_df)):
+        observation_df = filter_observation_df(
+            dataframe = observation_df,
+            measurement_value_field_name = measurement_value_field_name,
+            measurement_value_min = measurement_value_min,
+            measurement_value_max = measurement_value_max,
+            anchor_ids = anchor_ids
+        )
+    with instrumentation.timer('cube_building', num_items = len(observation_df)):
+        observation_arrays = observation_df_to_arrays(
+            dataframe = observation_df,
+            measurement_value_field_name = measurement_value_field_name,
+            duplicate_reduction_method = duplicate_reduction_method,
+            instrumentation = instrumentation)
+    return observation_arrays
+
 def observation_data_list_to_df(data_list):
+    if isinstance(data_list, pd.DataFrame):
+        return data_list
     df = pd.DataFrame(data_list)
     return df
 
@@ -52,8 +157,12 @@ def filter_observation_df(
     dataframe,
     measurement_value_field_name,
     measurement_value_min = None,
-    measurement_value_max = None
+    measurement_value_max = None,
+    anchor_ids = None,
+    anchor_id_field_name = 'anchor_id'
 ):
+    if anchor_ids is not None:
+        dataframe = dataframe[dataframe[anchor_id_field_name].isin(anchor_ids)]
     if measurement_value_min is not None:
         dataframe = dataframe[dataframe[measurement_value_field_name] > measurement_value_min]
     if measurement_value_max is not None:
@@ -66,8 +175,35 @@ def observation_df_to_arrays(
     measurement_value_field_name,
     timestamp_field_name = 'timestamp',
     object_id_field_name = 'object_id',
-    anchor_id_field_name = 'anchor_id'
+    anchor_id_field_name = 'anchor_id',
+    duplicate_reduction_method = 'mean',
+    instrumentation = None
 ):
+    if duplicate_reduction_method is not None:
+        dataframe, num_duplicates = smcmodel_localize.cubes.collapse_duplicate_observations(
+            dataframe = dataframe,
+            measurement_value_field_name = measurement_value_field_name,
+            method = duplicate_reduction_method,
+            timestamp_field_name = timestamp_field_name,
+            anchor_id_field_name = anchor_id_field_name,
+            object_id_field_name = object_id_field_name
+        )
+        smcmodel_localize.instrumentation.active_instrumentation(instrumentation).count(
+            'duplicates_collapsed',
+            num_duplicates
+        )
+        if num_duplicates > 0:
+            print('Collapsed {} duplicate readings using {}'.format(
+                num_duplicates,
+                duplicate_reduction_method
+            ))
+    if len(dataframe) == 0:
+        return {
+            'timestamps': np.zeros(0, dtype = np.float64),
+            'anchor_ids': [],
+            'object_ids': [],
+            measurement_value_field_name: np.zeros((0, 1, 0, 0), dtype = np.float64)
+        }
     timestamps = np.sort(dataframe[timestamp_field_name].unique())
     anchor_ids = np.sort(dataframe[anchor_id_field_name].unique())
     object_ids = np.sort(dataframe[object_id_field_name].unique())
@@ -102,7 +238,7 @@ def observation_df_to_arrays(
         num_anchors,
         num_objects
     )
-    timestamps_output = [timestamp.timestamp() for timestamp in timestamps.tolist()]
+    timestamps_output = smcmodel_localize.timestamps.to_posix_timestamps(timestamps)
     anchor_ids_output = anchor_ids.tolist()
     object_ids_output = object_ids.tolist()
     arrays = {
@@ -114,7 +250,8 @@ def observation_df_to_arrays(
     return arrays
 
 def observation_arrays_to_data_source(arrays, measurement_value_field_name):
-    structure = smcmodel_localize.model.observation_structure_generator(
+    import smcmodel.data_pipes
+    structure = smcmodel_localize.structures.observation_structure_generator(
         num_anchors = len(arrays['anchor_ids']),
         num_objects = len(arrays['object_ids']),
         measurement_value_name = measurement_value_field_name
@@ -126,6 +263,110 @@ def observation_arrays_to_data_source(arrays, measurement_value_field_name):
         array_dict = arrays)
     return data_source
 
+# Duck-typed like smcmodel's DataSource (an iterator of (timestamp,
+# single_time_data) pairs) rather than subclassing it, so streaming records
+# doesn't require importing smcmodel
+class DataSourceLongRecords:
+
+    def __init__(
+        self,
+        records,
+        measurement_value_field_name,
+        anchor_ids = None,
+        object_ids = None,
+        timestamp_field_name = 'timestamp',
+        object_id_field_name = 'object_id',
+        anchor_id_field_name = 'anchor_id'
+    ):
+        if isinstance(records, pd.DataFrame):
+            if anchor_ids is None:
+                anchor_ids = np.sort(records[anchor_id_field_name].unique()).tolist()
+            if object_ids is None:
+                object_ids = np.sort(records[object_id_field_name].unique()).tolist()
+            num_timestamps = records[timestamp_field_name].nunique()
+            record_batches = [records]
+        else:
+            if anchor_ids is None or object_ids is None:
+                raise ValueError('Anchor IDs and object IDs must be specified when records are supplied as an iterator of batches')
+            num_timestamps = None
+            record_batches = records
+        self.measurement_value_field_name = measurement_value_field_name
+        self.timestamp_field_name = timestamp_field_name
+        self.object_id_field_name = object_id_field_name
+        self.anchor_id_field_name = anchor_id_field_name
+        self.anchor_ids = list(anchor_ids)
+        self.object_ids = list(object_ids)
+        self.num_anchors = len(self.anchor_ids)
+        self.num_objects = len(self.object_ids)
+        self.num_timestamps = num_timestamps
+        self.structure = smcmodel_localize.structures.observation_structure_generator(
+            num_anchors = self.num_anchors,
+            num_objects = self.num_objects,
+            measurement_value_name = measurement_value_field_name
+        )
+        self.anchor_index = pd.Index(self.anchor_ids)
+        self.object_index = pd.Index(self.object_ids)
+        # The same buffer is refilled and returned at every timestep, so
+        # consumers that keep observations past the current step need to copy
+        # them
+        self.buffer = np.full((1, self.num_anchors, self.num_objects), np.nan, dtype = np.float32)
+        self.single_time_data = {measurement_value_field_name: self.buffer}
+        self.iterator = self._generate(iter(record_batches))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def _generate(self, record_batches):
+        carried_arrays = None
+        previous_timestamp = -np.inf
+        for record_batch in record_batches:
+            if not isinstance(record_batch, pd.DataFrame) and hasattr(record_batch, 'to_pandas'):
+                record_batch = record_batch.to_pandas()
+            timestamps = smcmodel_localize.timestamps.to_posix_timestamps(record_batch[self.timestamp_field_name])
+            anchor_indices = self.anchor_index.get_indexer(record_batch[self.anchor_id_field_name])
+            object_indices = self.object_index.get_indexer(record_batch[self.object_id_field_name])
+            measurement_values = np.asarray(record_batch[self.measurement_value_field_name], dtype = np.float32)
+            # Records for anchors or objects outside the specified IDs are
+            # ignored
+            known = (anchor_indices >= 0) & (object_indices >= 0)
+            arrays = (
+                timestamps[known],
+                anchor_indices[known],
+                object_indices[known],
+                measurement_values[known]
+            )
+            # The last timestamp of a batch may continue into the next one, so
+            # its records are held back until the next batch arrives
+            if carried_arrays is not None:
+                arrays = tuple([
+                    np.concatenate((carried_array, array))
+                    for carried_array, array in zip(carried_arrays, arrays)
+                ])
+            timestamps = arrays[0]
+            if len(timestamps) == 0:
+                carried_arrays = None
+                continue
+            if timestamps[0] < previous_timestamp or np.any(np.diff(timestamps) < 0):
+                raise ValueError('Records must be sorted by timestamp')
+            boundaries = np.flatnonzero(np.diff(timestamps)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(timestamps)]))
+            for start, end in zip(starts[:-1], ends[:-1]):
+                yield self._fill_buffer(arrays, start, end)
+            carried_arrays = tuple([array[starts[-1]:] for array in arrays])
+            previous_timestamp = timestamps[starts[-1]]
+        if carried_arrays is not None and len(carried_arrays[0]) > 0:
+            yield self._fill_buffer(carried_arrays, 0, len(carried_arrays[0]))
+
+    def _fill_buffer(self, arrays, start, end):
+        timestamps, anchor_indices, object_indices, measurement_values = arrays
+        self.buffer.fill(np.nan)
+        self.buffer[0, anchor_indices[start:end], object_indices[start:end]] = measurement_values[start:end]
+        return float(timestamps[start]), self.single_time_data
+
 def get_object_info_from_csv_file(
     object_ids,
     path,
@@ -177,7 +418,8 @@ def get_anchor_info_from_csv_file(
     return anchor_info
 
 def create_state_summary_data_destination(num_objects, num_moving_object_dimensions):
-    structure = smcmodel_localize.model.state_summary_structure_generator(num_objects, num_moving_object_dimensions)
+    import smcmodel.data_pipes
+    structure = smcmodel_localize.structures.state_summary_structure_generator(num_objects, num_moving_object_dimensions)
     state_summary_data_destination = smcmodel.data_pipes.DataDestinationArrayDict(
         structure = structure,
         num_samples = 1
@@ -185,6 +427,7 @@ def create_state_summary_data_destination(num_objects, num_moving_object_dimensi
     return state_summary_data_destination
 
 def create_state_summary_data_destination_multilateration(num_objects, num_moving_object_dimensions):
+    import smcmodel.data_pipes
     structure = smcmodel_localize.model_multilateration.state_summary_structure_generator_multilateration(
         num_objects,
         num_moving_object_dimensions
@@ -200,17 +443,24 @@ def write_output_data(
     state_summary_data_destination,
     object_ids,
     position_mean_field_names,
-    position_sd_field_names
+    position_sd_field_names,
+    instrumentation = None
 ):
+    instrumentation = smcmodel_localize.instrumentation.active_instrumentation(instrumentation)
     state_summary_arrays = state_summary_data_destination_to_arrays(state_summary_data_destination = state_summary_data_destination)
-    state_summary_df = state_summary_arrays_to_df(
-        state_summary_arrays = state_summary_arrays,
-        object_ids = object_ids,
-        position_mean_field_names = position_mean_field_names,
-        position_sd_field_names = position_sd_field_names
-    )
-    state_summary_data_list = state_summary_df_to_data_list(state_summary_df = state_summary_df)
-    database_connection.write_data_object_time_series(state_summary_data_list)
+    with instrumentation.timer('state_summary_dataframe_conversion') as timer:
+        state_summary_df = state_summary_arrays_to_df(
+            state_summary_arrays = state_summary_arrays,
+            object_ids = object_ids,
+            position_mean_field_names = position_mean_field_names,
+            position_sd_field_names = position_sd_field_names
+        )
+        timer.add_items(len(state_summary_df))
+    with instrumentation.timer('write', num_items = len(state_summary_df)):
+        write_state_summary_df(
+            database_connection = database_connection,
+            state_summary_df = state_summary_df
+        )
     return state_summary_arrays
 
 def write_output_data_multilateration(
@@ -218,17 +468,34 @@ def write_output_data_multilateration(
     state_summary_data_destination,
     object_ids,
     position_field_names,
+    instrumentation = None
 ):
+    instrumentation = smcmodel_localize.instrumentation.active_instrumentation(instrumentation)
     state_summary_arrays = state_summary_data_destination_to_arrays(state_summary_data_destination = state_summary_data_destination)
-    state_summary_df = state_summary_arrays_multilateration_to_df(
-        state_summary_arrays = state_summary_arrays,
-        object_ids = object_ids,
-        position_field_names = position_field_names,
-    )
-    state_summary_data_list = state_summary_df_to_data_list(state_summary_df = state_summary_df)
-    database_connection.write_data_object_time_series(state_summary_data_list)
+    with instrumentation.timer('state_summary_dataframe_conversion') as timer:
+        state_summary_df = state_summary_arrays_multilateration_to_df(
+            state_summary_arrays = state_summary_arrays,
+            object_ids = object_ids,
+            position_field_names = position_field_names,
+        )
+        timer.add_items(len(state_summary_df))
+    with instrumentation.timer('write', num_items = len(state_summary_df)):
+        write_state_summary_df(
+            database_connection = database_connection,
+            state_summary_df = state_summary_df
+        )
     return state_summary_arrays
 
+def write_state_summary_df(
+    database_connection,
+    state_summary_df
+):
+    if hasattr(database_connection, 'write_dataframe_object_time_series'):
+        database_connection.write_dataframe_object_time_series(state_summary_df)
+    else:
+        state_summary_data_list = state_summary_df_to_data_list(state_summary_df = state_summary_df)
+        database_connection.write_data_object_time_series(state_summary_data_list)
+
 def state_summary_data_destination_to_arrays(
     state_summary_data_destination
 ):
@@ -250,16 +517,9 @@ def state_summary_arrays_to_df(
     num_timestamps = len(timestamps)
     num_object_ids = len(object_ids)
     num_spatial_dimensions = len(position_mean_field_names)
-    timestamps_converted = pd.to_datetime(timestamps, unit = 's').tz_localize('UTC')
-    timestamp_object_id_df = pd.DataFrame(
-        list(itertools.product(
-            timestamps_converted,
-            object_ids
-        )),
-        columns = [
-            'timestamp',
-            'object_id'
-        ]
+    timestamp_object_id_df = timestamp_object_id_product_df(
+        timestamps = timestamps,
+        object_ids = object_ids
     )
     position_means_df = pd.DataFrame(
         position_means.reshape((num_timestamps*num_object_ids, num_spatial_dimensions)),
@@ -280,16 +540,9 @@ def state_summary_arrays_multilateration_to_df(
     num_timestamps = len(timestamps)
     num_object_ids = len(object_ids)
     num_spatial_dimensions = len(position_field_names)
-    timestamps_converted = pd.to_datetime(timestamps, unit = 's').tz_localize('UTC')
-    timestamp_object_id_df = pd.DataFrame(
-        list(itertools.product(
-            timestamps_converted,
-            object_ids
-        )),
-        columns = [
-            'timestamp',
-            'object_id'
-        ]
+    timestamp_object_id_df = timestamp_object_id_product_df(
+        timestamps = timestamps,
+        object_ids = object_ids
     )
     positions_df = pd.DataFrame(
         positions.reshape((num_timestamps*num_object_ids, num_spatial_dimensions)),
@@ -297,10 +550,28 @@ def state_summary_arrays_multilateration_to_df(
     df = pd.concat((timestamp_object_id_df, positions_df), axis = 1)
     return df
 
+def timestamp_object_id_product_df(
+    timestamps,
+    object_ids
+):
+    num_timestamps = len(timestamps)
+    num_object_ids = len(object_ids)
+    timestamps_converted = smcmodel_localize.timestamps.posix_timestamps_to_datetime_index(timestamps)
+    object_ids_array = np.empty(num_object_ids, dtype = object)
+    object_ids_array[:] = list(object_ids)
+    timestamp_object_id_df = pd.DataFrame({
+        'timestamp': timestamps_converted.repeat(num_object_ids),
+        'object_id': np.tile(object_ids_array, num_timestamps)
+    })
+    return timestamp_object_id_df
+
 def state_summary_df_to_data_list(
     state_summary_df
 ):
-    data_list = state_summary_df.to_dict(orient = 'records')
-    for i in range(len(data_list)):
-        data_list[i]['timestamp'] = data_list[i]['timestamp'].to_pydatetime()
+    column_names = list(state_summary_df.columns)
+    column_values = [
+        state_summary_df[column_name].dt.to_pydatetime() if column_name == 'timestamp' else state_summary_df[column_name].tolist()
+        for column_name in column_names
+    ]
+    data_list = [dict(zip(column_names, row_values)) for row_values in zip(*column_values)]
     return data_list
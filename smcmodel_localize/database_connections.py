@@ -0,0 +1,437 @@
+import smcmodel_localize.timestamps
+import pandas as pd
+import numpy as np
+import sqlite3
+import json
+import os
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+except ImportError:
+    pa = None
+    pads = None
+
+DATE_PARTITION_FIELD_NAME = 'date'
+# Hive partition directories store missing values under this name, so an
+# object ID equal to it would read back as missing
+PARTITION_NULL_FALLBACK = '__HIVE_DEFAULT_PARTITION__'
+SCHEMA_METADATA_KEY = b'smcmodel_localize'
+# Longer ID lists are matched against a temporary table rather than bound
+# one variable each, which can exceed SQLite's limit on bound variables
+MAX_INLINE_SQLITE_PARAMETERS = 500
+
+class DatabaseConnectionParquet:
+
+    supported_fetch_predicates = ('measurement_value_range', 'anchor_ids')
+
+    def __init__(
+        self,
+        directory,
+        timestamp_field_name = 'timestamp',
+        object_id_field_name = 'object_id',
+        anchor_id_field_name = 'anchor_id'
+    ):
+        if pa is None:
+            raise ImportError('DatabaseConnectionParquet requires pyarrow (pip install wf-smcmodel-localize[parquet])')
+        self.directory = directory
+        self.timestamp_field_name = timestamp_field_name
+        self.object_id_field_name = object_id_field_name
+        self.anchor_id_field_name = anchor_id_field_name
+        # Partition values are URI-encoded in the directory names, so object
+        # IDs containing '/', '=' or '%' map to a single directory and are
+        # decoded when read
+        self.partitioning = pads.HivePartitioning(
+            pa.schema([
+                (DATE_PARTITION_FIELD_NAME, pa.string()),
+                (object_id_field_name, pa.string())
+            ]),
+            null_fallback = PARTITION_NULL_FALLBACK,
+            segment_encoding = 'uri'
+        )
+
+    def cache_identity(self):
+        return 'parquet:{}'.format(os.path.abspath(self.directory))
+
+    def fetch_data_object_time_series(
+        self,
+        start_time = None,
+        end_time = None,
+        object_ids = None,
+        anchor_ids = None,
+        measurement_value_field_name = None,
+        measurement_value_min = None,
+        measurement_value_max = None
+    ):
+        dataframe = self.fetch_dataframe_object_time_series(
+            start_time = start_time,
+            end_time = end_time,
+            object_ids = object_ids,
+            anchor_ids = anchor_ids,
+            measurement_value_field_name = measurement_value_field_name,
+            measurement_value_min = measurement_value_min,
+            measurement_value_max = measurement_value_max
+        )
+        data_list = dataframe.to_dict(orient = 'records')
+        return data_list
+
+    def fetch_dataframe_object_time_series(
+        self,
+        start_time = None,
+        end_time = None,
+        object_ids = None,
+        anchor_ids = None,
+        measurement_value_field_name = None,
+        measurement_value_min = None,
+        measurement_value_max = None
+    ):
+        if not os.path.isdir(self.directory):
+            return _empty_dataframe(
+                self.timestamp_field_name,
+                self.anchor_id_field_name,
+                self.object_id_field_name,
+                measurement_value_field_name
+            )
+        dataset = pads.dataset(
+            self.directory,
+            format = 'parquet',
+            partitioning = self.partitioning
+        )
+        # Date and object ID conditions prune whole partition directories;
+        # timestamp conditions are checked against row group statistics
+        expression = None
+        if start_time is not None:
+            start_time = pd.Timestamp(start_time)
+            start_time = start_time.tz_localize('UTC') if start_time.tzinfo is None else start_time.tz_convert('UTC')
+            expression = _and_expression(
+                expression,
+                pads.field(DATE_PARTITION_FIELD_NAME) >= start_time.strftime('%Y-%m-%d')
+            )
+            expression = _and_expression(
+                expression,
+                pads.field(self.timestamp_field_name) >= pa.scalar(start_time.to_pydatetime(), type = pa.timestamp('us', tz = 'UTC'))
+            )
+        if end_time is not None:
+            end_time = pd.Timestamp(end_time)
+            end_time = end_time.tz_localize('UTC') if end_time.tzinfo is None else end_time.tz_convert('UTC')
+            expression = _and_expression(
+                expression,
+                pads.field(DATE_PARTITION_FIELD_NAME) <= end_time.strftime('%Y-%m-%d')
+            )
+            expression = _and_expression(
+                expression,
+                pads.field(self.timestamp_field_name) <= pa.scalar(end_time.to_pydatetime(), type = pa.timestamp('us', tz = 'UTC'))
+            )
+        if object_ids is not None:
+            expression = _and_expression(
+                expression,
+                pads.field(self.object_id_field_name).isin([str(object_id) for object_id in object_ids])
+            )
+        if anchor_ids is not None:
+            expression = _and_expression(
+                expression,
+                pads.field(self.anchor_id_field_name).isin(list(anchor_ids))
+            )
+        if measurement_value_min is not None:
+            expression = _and_expression(
+                expression,
+                pads.field(measurement_value_field_name) > measurement_value_min
+            )
+        if measurement_value_max is not None:
+            expression = _and_expression(
+                expression,
+                pads.field(measurement_value_field_name) < measurement_value_max
+            )
+        table = dataset.to_table(filter = expression)
+        dataframe = table.to_pandas()
+        dataframe.drop(columns = [DATE_PARTITION_FIELD_NAME], inplace = True)
+        # Partition values come back as strings at the end of the table, so
+        # the object ID dtype and the column order are restored from the
+        # metadata recorded when the data was written
+        schema_metadata = dataset.schema.metadata or {}
+        if SCHEMA_METADATA_KEY in schema_metadata:
+            write_metadata = json.loads(schema_metadata[SCHEMA_METADATA_KEY].decode('utf-8'))
+            dataframe[self.object_id_field_name] = dataframe[self.object_id_field_name].astype(write_metadata['object_id_dtype'])
+            column_names = [column_name for column_name in write_metadata['column_names'] if column_name in dataframe.columns]
+            column_names += [column_name for column_name in dataframe.columns if column_name not in column_names]
+            dataframe = dataframe[column_names]
+        dataframe.sort_values(self.timestamp_field_name, kind = 'stable', inplace = True)
+        dataframe.reset_index(drop = True, inplace = True)
+        return dataframe
+
+    def write_data_object_time_series(self, data_list):
+        dataframe = pd.DataFrame(data_list)
+        self.write_dataframe_object_time_series(dataframe)
+
+    def write_dataframe_object_time_series(self, dataframe):
+        if len(dataframe) == 0:
+            return
+        dataframe = dataframe.copy()
+        write_metadata = {
+            'object_id_dtype': str(dataframe[self.object_id_field_name].dtype),
+            'column_names': [str(column_name) for column_name in dataframe.columns]
+        }
+        dataframe[self.timestamp_field_name] = pd.to_datetime(dataframe[self.timestamp_field_name], utc = True)
+        if dataframe[self.object_id_field_name].isna().any():
+            raise ValueError('Object IDs must not be missing when writing to Parquet partitions')
+        dataframe[self.object_id_field_name] = dataframe[self.object_id_field_name].astype(str)
+        invalid_object_ids = dataframe[self.object_id_field_name].isin(['', PARTITION_NULL_FALLBACK])
+        if invalid_object_ids.any():
+            raise ValueError('Object IDs {} cannot be used as Parquet partition values'.format(
+                sorted(set(dataframe.loc[invalid_object_ids, self.object_id_field_name]))
+            ))
+        dataframe[DATE_PARTITION_FIELD_NAME] = dataframe[self.timestamp_field_name].dt.strftime('%Y-%m-%d')
+        table = pa.Table.from_pandas(dataframe, preserve_index = False)
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[SCHEMA_METADATA_KEY] = json.dumps(write_metadata).encode('utf-8')
+        table = table.replace_schema_metadata(schema_metadata)
+        # Each write adds new files to the partition directories, so repeated
+        # writes append rather than overwrite
+        pads.write_dataset(
+            table,
+            self.directory,
+            format = 'parquet',
+            partitioning = self.partitioning,
+            basename_template = 'part-{}-{{i}}.parquet'.format(uuid.uuid4().hex),
+            existing_data_behavior = 'overwrite_or_ignore'
+        )
+
+    # Partitions are (date, object ID) pairs, with dates as 'YYYY-MM-DD' in
+    # UTC, matching the partition directories
+    def delete_object_time_series_partitions(self, partitions):
+        if not os.path.isdir(self.directory):
+            return
+        partitions = set((str(date), str(object_id)) for date, object_id in partitions)
+        dataset = pads.dataset(
+            self.directory,
+            format = 'parquet',
+            partitioning = self.partitioning
+        )
+        for fragment in dataset.get_fragments():
+            partition_keys = pads.get_partition_keys(fragment.partition_expression)
+            if (partition_keys.get(DATE_PARTITION_FIELD_NAME), partition_keys.get(self.object_id_field_name)) in partitions:
+                os.remove(fragment.path)
+
+class DatabaseConnectionSQLite:
+
+    supported_fetch_predicates = ('measurement_value_range', 'anchor_ids')
+
+    def __init__(
+        self,
+        path,
+        table_name = 'data_object_time_series',
+        timestamp_field_name = 'timestamp',
+        object_id_field_name = 'object_id',
+        anchor_id_field_name = 'anchor_id'
+    ):
+        self.path = path
+        self.table_name = table_name
+        self.timestamp_field_name = timestamp_field_name
+        self.object_id_field_name = object_id_field_name
+        self.anchor_id_field_name = anchor_id_field_name
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+
+    def cache_identity(self):
+        return 'sqlite:{}:{}'.format(os.path.abspath(self.path), self.table_name)
+
+    def close(self):
+        self.connection.close()
+
+    def fetch_data_object_time_series(
+        self,
+        start_time = None,
+        end_time = None,
+        object_ids = None,
+        anchor_ids = None,
+        measurement_value_field_name = None,
+        measurement_value_min = None,
+        measurement_value_max = None
+    ):
+        dataframe = self.fetch_dataframe_object_time_series(
+            start_time = start_time,
+            end_time = end_time,
+            object_ids = object_ids,
+            anchor_ids = anchor_ids,
+            measurement_value_field_name = measurement_value_field_name,
+            measurement_value_min = measurement_value_min,
+            measurement_value_max = measurement_value_max
+        )
+        data_list = dataframe.to_dict(orient = 'records')
+        return data_list
+
+    def fetch_dataframe_object_time_series(
+        self,
+        start_time = None,
+        end_time = None,
+        object_ids = None,
+        anchor_ids = None,
+        measurement_value_field_name = None,
+        measurement_value_min = None,
+        measurement_value_max = None
+    ):
+        if len(self._column_names()) == 0:
+            return _empty_dataframe(
+                self.timestamp_field_name,
+                self.anchor_id_field_name,
+                self.object_id_field_name,
+                measurement_value_field_name
+            )
+        conditions = []
+        parameters = []
+        temporary_table_names = []
+        if start_time is not None:
+            conditions.append('{} >= ?'.format(_quote_identifier(self.timestamp_field_name)))
+            parameters.append(smcmodel_localize.timestamps.to_posix_timestamp(start_time))
+        if end_time is not None:
+            conditions.append('{} <= ?'.format(_quote_identifier(self.timestamp_field_name)))
+            parameters.append(smcmodel_localize.timestamps.to_posix_timestamp(end_time))
+        if object_ids is not None:
+            conditions.append(self._in_condition(self.object_id_field_name, object_ids, parameters, temporary_table_names))
+        if anchor_ids is not None:
+            conditions.append(self._in_condition(self.anchor_id_field_name, anchor_ids, parameters, temporary_table_names))
+        if measurement_value_min is not None:
+            conditions.append('{} > ?'.format(_quote_identifier(measurement_value_field_name)))
+            parameters.append(measurement_value_min)
+        if measurement_value_max is not None:
+            conditions.append('{} < ?'.format(_quote_identifier(measurement_value_field_name)))
+            parameters.append(measurement_value_max)
+        query = 'SELECT * FROM {}'.format(_quote_identifier(self.table_name))
+        if len(conditions) > 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY {}'.format(_quote_identifier(self.timestamp_field_name))
+        try:
+            dataframe = pd.read_sql_query(query, self.connection, params = parameters)
+        finally:
+            for temporary_table_name in temporary_table_names:
+                self.connection.execute('DROP TABLE temp.{}'.format(_quote_identifier(temporary_table_name)))
+        dataframe[self.timestamp_field_name] = pd.to_datetime(
+            dataframe[self.timestamp_field_name],
+            unit = 's',
+            utc = True
+        )
+        return dataframe
+
+    def write_data_object_time_series(self, data_list):
+        dataframe = pd.DataFrame(data_list)
+        self.write_dataframe_object_time_series(dataframe)
+
+    def write_dataframe_object_time_series(self, dataframe):
+        if len(dataframe) == 0:
+            return
+        dataframe = dataframe.copy()
+        # Timestamps are stored as seconds since epoch so that range
+        # conditions compare numbers rather than strings
+        dataframe[self.timestamp_field_name] = smcmodel_localize.timestamps.to_posix_timestamps(dataframe[self.timestamp_field_name])
+        self._ensure_columns(dataframe.columns)
+        dataframe.to_sql(
+            self.table_name,
+            self.connection,
+            if_exists = 'append',
+            index = False
+        )
+        self.connection.commit()
+
+    # Partitions are (date, object ID) pairs, with dates as 'YYYY-MM-DD' in
+    # UTC
+    def delete_object_time_series_partitions(self, partitions):
+        if len(self._column_names()) == 0:
+            return
+        for date, object_id in partitions:
+            start_time = pd.Timestamp(date, tz = 'UTC')
+            self.connection.execute(
+                'DELETE FROM {} WHERE {} = ? AND {} >= ? AND {} < ?'.format(
+                    _quote_identifier(self.table_name),
+                    _quote_identifier(self.object_id_field_name),
+                    _quote_identifier(self.timestamp_field_name),
+                    _quote_identifier(self.timestamp_field_name)
+                ),
+                _to_parameter_list([
+                    object_id,
+                    start_time.timestamp(),
+                    (start_time + pd.Timedelta(days = 1)).timestamp()
+                ])
+            )
+        self.connection.commit()
+
+    def _in_condition(self, field_name, values, parameters, temporary_table_names):
+        values = _to_parameter_list(values)
+        if len(values) <= MAX_INLINE_SQLITE_PARAMETERS:
+            parameters.extend(values)
+            return '{} IN ({})'.format(
+                _quote_identifier(field_name),
+                ', '.join(['?']*len(values))
+            )
+        temporary_table_name = 'ids_{}'.format(uuid.uuid4().hex)
+        self.connection.execute('CREATE TEMP TABLE {} (value)'.format(_quote_identifier(temporary_table_name)))
+        self.connection.executemany(
+            'INSERT INTO temp.{} VALUES (?)'.format(_quote_identifier(temporary_table_name)),
+            [(value,) for value in values]
+        )
+        temporary_table_names.append(temporary_table_name)
+        return '{} IN (SELECT value FROM temp.{})'.format(
+            _quote_identifier(field_name),
+            _quote_identifier(temporary_table_name)
+        )
+
+    def _column_names(self):
+        cursor = self.connection.execute('PRAGMA table_info({})'.format(_quote_identifier(self.table_name)))
+        return [row[1] for row in cursor.fetchall()]
+
+    def _ensure_columns(self, column_names):
+        existing_column_names = self._column_names()
+        if len(existing_column_names) == 0:
+            other_column_names = [column_name for column_name in column_names if column_name != self.timestamp_field_name]
+            self.connection.execute('CREATE TABLE {} ({})'.format(
+                _quote_identifier(self.table_name),
+                ', '.join(
+                    ['{} REAL NOT NULL'.format(_quote_identifier(self.timestamp_field_name))] +
+                    [_quote_identifier(column_name) for column_name in other_column_names]
+                )
+            ))
+            self.connection.execute('CREATE INDEX {} ON {} ({})'.format(
+                _quote_identifier(self.table_name + '_timestamp_index'),
+                _quote_identifier(self.table_name),
+                _quote_identifier(self.timestamp_field_name)
+            ))
+            if self.object_id_field_name in other_column_names:
+                self.connection.execute('CREATE INDEX {} ON {} ({}, {})'.format(
+                    _quote_identifier(self.table_name + '_object_id_timestamp_index'),
+                    _quote_identifier(self.table_name),
+                    _quote_identifier(self.object_id_field_name),
+                    _quote_identifier(self.timestamp_field_name)
+                ))
+        else:
+            for column_name in column_names:
+                if column_name not in existing_column_names:
+                    self.connection.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                        _quote_identifier(self.table_name),
+                        _quote_identifier(column_name)
+                    ))
+        self.connection.commit()
+
+def _quote_identifier(identifier):
+    return '"{}"'.format(str(identifier).replace('"', '""'))
+
+def _empty_dataframe(
+    timestamp_field_name,
+    anchor_id_field_name,
+    object_id_field_name,
+    measurement_value_field_name = None
+):
+    columns = {
+        timestamp_field_name: pd.Series([], dtype = 'datetime64[us, UTC]'),
+        anchor_id_field_name: pd.Series([], dtype = object),
+        object_id_field_name: pd.Series([], dtype = object)
+    }
+    if measurement_value_field_name is not None:
+        columns[measurement_value_field_name] = pd.Series([], dtype = np.float64)
+    return pd.DataFrame(columns)
+
+def _to_parameter_list(values):
+    return [value.item() if isinstance(value, np.generic) else value for value in values]
+
+def _and_expression(expression, new_expression):
+    if expression is None:
+        return new_expression
+    return expression & new_expression
@@ -0,0 +1,137 @@
+import smcmodel_localize.timestamps
+import pandas as pd
+import json
+import os
+import uuid
+
+MANIFEST_VERSION = 1
+
+# The manifest records, for each CSV file, its size and modification time
+# along with the range of timestamps (as POSIX seconds) and the object IDs it
+# contains. Entries are rescanned only when the size or modification time of
+# the file changes, so the manifest can be kept alongside an archive and
+# updated incrementally as files are added.
+
+class FileManifest:
+
+    def __init__(
+        self,
+        path,
+        timestamp_column_name = 'timestamp',
+        object_id_column_name = 'object_id'
+    ):
+        self.path = path
+        self.timestamp_column_name = timestamp_column_name
+        self.object_id_column_name = object_id_column_name
+        self.entries = {}
+        self.modified = False
+        if os.path.exists(path):
+            with open(path, 'r') as fp:
+                manifest_data = json.load(fp)
+            # Entries scanned with different column names (or an older layout)
+            # can't be trusted, so they are discarded and rebuilt
+            if (
+                manifest_data.get('version') == MANIFEST_VERSION and
+                manifest_data.get('timestamp_column_name') == timestamp_column_name and
+                manifest_data.get('object_id_column_name') == object_id_column_name
+            ):
+                self.entries = manifest_data['entries']
+
+    def entry(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat_result = os.stat(file_path)
+        entry = self.entries.get(file_path)
+        if (
+            entry is not None and
+            entry['size'] == stat_result.st_size and
+            entry['mtime_ns'] == stat_result.st_mtime_ns
+        ):
+            return entry
+        entry = self._scan(file_path, stat_result)
+        self.entries[file_path] = entry
+        self.modified = True
+        return entry
+
+    def select_file_tasks(
+        self,
+        file_tasks,
+        start_timestamp = None,
+        end_timestamp = None,
+        object_ids = None
+    ):
+        start_posix = smcmodel_localize.timestamps.to_posix_timestamp(start_timestamp) if start_timestamp is not None else None
+        end_posix = smcmodel_localize.timestamps.to_posix_timestamp(end_timestamp) if end_timestamp is not None else None
+        object_id_strings = set([str(object_id) for object_id in object_ids]) if object_ids is not None else None
+        selected_file_tasks = []
+        for file_task in file_tasks:
+            directory, filename, file_ids = file_task
+            entry = self.entry(os.path.join(directory, filename))
+            if entry['min_timestamp'] is None:
+                continue
+            if start_posix is not None and entry['max_timestamp'] < start_posix:
+                continue
+            if end_posix is not None and entry['min_timestamp'] > end_posix:
+                continue
+            if object_id_strings is not None:
+                # An object ID parsed from the directory or filename overrides
+                # the contents of the file
+                if 'object_id' in file_ids:
+                    file_object_ids = [file_ids['object_id']]
+                else:
+                    file_object_ids = entry['object_ids']
+                if file_object_ids is not None and object_id_strings.isdisjoint([str(object_id) for object_id in file_object_ids]):
+                    continue
+            selected_file_tasks.append(file_task)
+        self.save()
+        print('Selected {} of {} files using manifest {}'.format(
+            len(selected_file_tasks),
+            len(file_tasks),
+            self.path
+        ))
+        return selected_file_tasks
+
+    def save(self):
+        if not self.modified:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok = True)
+        temporary_path = os.path.join(
+            directory,
+            '.{}.{}.tmp'.format(os.path.basename(self.path), uuid.uuid4().hex)
+        )
+        manifest_data = {
+            'version': MANIFEST_VERSION,
+            'timestamp_column_name': self.timestamp_column_name,
+            'object_id_column_name': self.object_id_column_name,
+            'entries': self.entries
+        }
+        with open(temporary_path, 'w') as fp:
+            json.dump(manifest_data, fp)
+        os.replace(temporary_path, self.path)
+        self.modified = False
+
+    def _scan(self, file_path, stat_result):
+        header = pd.read_csv(file_path, nrows = 0).columns.tolist()
+        if self.timestamp_column_name not in header:
+            raise ValueError('Timestamp column \'{}\' not found in {}'.format(
+                self.timestamp_column_name,
+                file_path
+            ))
+        columns = [self.timestamp_column_name]
+        if self.object_id_column_name in header:
+            columns.append(self.object_id_column_name)
+        dataframe = pd.read_csv(file_path, usecols = columns)
+        timestamps = smcmodel_localize.timestamps.to_posix_timestamps(
+            pd.to_datetime(dataframe[self.timestamp_column_name]).dropna()
+        )
+        if self.object_id_column_name in header:
+            object_ids = sorted(set([str(object_id) for object_id in dataframe[self.object_id_column_name].dropna().unique()]))
+        else:
+            object_ids = None
+        return {
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'min_timestamp': float(timestamps.min()) if len(timestamps) > 0 else None,
+            'max_timestamp': float(timestamps.max()) if len(timestamps) > 0 else None,
+            'object_ids': object_ids
+        }
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import uuid
+
+LEDGER_VERSION = 1
+HASH_BLOCK_SIZE = 1024*1024
+
+# The ledger records the state (size, modification time, and optionally a
+# content hash) of each input file at the time it was ingested. Files whose
+# state matches the ledger are skipped on the next run. When content hashes
+# are enabled, a file whose size or modification time changed but whose
+# contents did not (e.g., after being copied) is also skipped.
+#
+# Each entry can also list the outputs (e.g., per-day, per-object file stems)
+# the file contributed to, so that when the file changes the outputs built
+# from its previous contents can be found and rebuilt.
+
+class IngestionLedger:
+
+    def __init__(
+        self,
+        path,
+        use_content_hash = False
+    ):
+        self.path = path
+        self.use_content_hash = use_content_hash
+        self.entries = {}
+        self.pending_entries = {}
+        self.modified = False
+        if os.path.exists(path):
+            with open(path, 'r') as fp:
+                ledger_data = json.load(fp)
+            if ledger_data.get('version') == LEDGER_VERSION:
+                self.entries = ledger_data['entries']
+
+    def select_new_file_tasks(self, file_tasks):
+        new_file_tasks = []
+        for file_task in file_tasks:
+            file_path = file_task_path(file_task)
+            # The state is captured before the file is read so that a file
+            # which changes during ingestion is picked up again next time
+            state = self._file_state(file_path)
+            if self._is_current(file_path, state):
+                continue
+            if self.use_content_hash and 'sha256' not in state:
+                state['sha256'] = self._content_hash(file_path)
+            self.pending_entries[file_path] = state
+            new_file_tasks.append(file_task)
+        print('Found {} new or changed files out of {}'.format(
+            len(new_file_tasks),
+            len(file_tasks)
+        ))
+        return new_file_tasks
+
+    def record(self, file_tasks, file_outputs = None):
+        for file_index, file_task in enumerate(file_tasks):
+            file_path = file_task_path(file_task)
+            state = self.pending_entries.pop(file_path, None)
+            if state is None:
+                state = self._file_state(file_path)
+                if self.use_content_hash:
+                    state['sha256'] = self._content_hash(file_path)
+            if file_outputs is not None:
+                state['outputs'] = sorted(file_outputs[file_index])
+            self.entries[file_path] = state
+            self.modified = True
+
+    def is_recorded(self, file_task):
+        return file_task_path(file_task) in self.entries
+
+    # Returns None if the file isn't in the ledger or was recorded without its
+    # outputs
+    def recorded_outputs(self, file_task):
+        entry = self.entries.get(file_task_path(file_task))
+        if entry is None:
+            return None
+        return entry.get('outputs')
+
+    def record_outputs(self, file_task, outputs):
+        entry = self.entries.get(file_task_path(file_task))
+        if entry is None:
+            raise ValueError('File {} is not in the ledger'.format(file_task_path(file_task)))
+        entry['outputs'] = sorted(outputs)
+        self.modified = True
+
+    def forget(self, file_path):
+        file_path = os.path.abspath(file_path)
+        if file_path in self.entries:
+            del self.entries[file_path]
+            self.modified = True
+
+    def save(self):
+        if not self.modified:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok = True)
+        temporary_path = os.path.join(
+            directory,
+            '.{}.{}.tmp'.format(os.path.basename(self.path), uuid.uuid4().hex)
+        )
+        ledger_data = {
+            'version': LEDGER_VERSION,
+            'entries': self.entries
+        }
+        with open(temporary_path, 'w') as fp:
+            json.dump(ledger_data, fp)
+        os.replace(temporary_path, self.path)
+        self.modified = False
+
+    def _is_current(self, file_path, state):
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        if entry['size'] == state['size'] and entry['mtime_ns'] == state['mtime_ns']:
+            return True
+        if self.use_content_hash and entry.get('sha256') is not None:
+            state['sha256'] = self._content_hash(file_path)
+            if entry['sha256'] == state['sha256']:
+                # Same contents under a new modification time; update the
+                # ledger so the file isn't hashed again on the next run
+                if 'outputs' in entry:
+                    state['outputs'] = entry['outputs']
+                self.entries[file_path] = state
+                self.modified = True
+                return True
+        return False
+
+    def _file_state(self, file_path):
+        stat_result = os.stat(file_path)
+        return {
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns
+        }
+
+    def _content_hash(self, file_path):
+        content_hash = hashlib.sha256()
+        with open(file_path, 'rb') as fp:
+            for block in iter(lambda: fp.read(HASH_BLOCK_SIZE), b''):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+def file_task_path(file_task):
+    directory, filename, file_ids = file_task
+    return os.path.abspath(os.path.join(directory, filename))
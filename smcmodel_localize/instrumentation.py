@@ -0,0 +1,235 @@
+import json
+import time
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Instrumentation collects the time spent in each named stage of a run (fetch,
+# cube building, SMC steps, writes, ...), the number of items each stage
+# handled, free-form counters, and the process memory high-water mark at the
+# end of each stage. Functions that accept an instrumentation argument fall
+# back to NULL_INSTRUMENTATION, whose timers and counters do nothing, so
+# uninstrumented runs pay only for a method call per stage.
+#
+# If a callback is specified, it is called with a dict describing each stage
+# as it completes (stage, seconds, num_items, peak_rss_bytes).
+
+class Instrumentation:
+
+    enabled = True
+
+    def __init__(
+        self,
+        callback = None,
+        track_memory = True
+    ):
+        self.callback = callback
+        self.track_memory = track_memory
+        self.stages = {}
+        self.counters = {}
+        self.start_time = time.perf_counter()
+
+    def timer(self, stage, num_items = None):
+        return StageTimer(self, stage, num_items)
+
+    def record(self, stage, seconds, num_items = None):
+        stage_totals = self.stages.get(stage)
+        if stage_totals is None:
+            stage_totals = {
+                'calls': 0,
+                'seconds': 0.0,
+                'num_items': 0,
+                'peak_rss_bytes': None
+            }
+            self.stages[stage] = stage_totals
+        stage_totals['calls'] += 1
+        stage_totals['seconds'] += seconds
+        if num_items is not None:
+            stage_totals['num_items'] += num_items
+        peak_rss = peak_rss_bytes() if self.track_memory else None
+        if peak_rss is not None:
+            stage_totals['peak_rss_bytes'] = peak_rss
+        if self.callback is not None:
+            self.callback({
+                'stage': stage,
+                'seconds': seconds,
+                'num_items': num_items,
+                'peak_rss_bytes': peak_rss
+            })
+
+    def count(self, counter, value = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def report(self):
+        wall_seconds = time.perf_counter() - self.start_time
+        stages = {}
+        for stage, stage_totals in self.stages.items():
+            stages[stage] = {
+                'calls': stage_totals['calls'],
+                'seconds': stage_totals['seconds'],
+                'fraction_of_wall_time': stage_totals['seconds']/wall_seconds if wall_seconds > 0 else None,
+                'num_items': stage_totals['num_items'],
+                'items_per_second': stage_totals['num_items']/stage_totals['seconds'] if stage_totals['seconds'] > 0 else None,
+                'peak_rss_bytes': stage_totals['peak_rss_bytes']
+            }
+        report = {
+            'wall_seconds': wall_seconds,
+            'peak_rss_bytes': peak_rss_bytes() if self.track_memory else None,
+            'stages': stages,
+            'counters': dict(self.counters)
+        }
+        return report
+
+    def write_report(self, path):
+        with open(path, 'w') as fp:
+            json.dump(self.report(), fp, indent = 2)
+
+    def print_report(self):
+        report = self.report()
+        print('Wall time: {:.3f} s'.format(report['wall_seconds']))
+        for stage, stage_report in report['stages'].items():
+            print('{}: {:.3f} s over {} calls ({:.1%} of wall time){}'.format(
+                stage,
+                stage_report['seconds'],
+                stage_report['calls'],
+                stage_report['fraction_of_wall_time'] or 0.0,
+                ', {} items ({:.1f}/s)'.format(
+                    stage_report['num_items'],
+                    stage_report['items_per_second']
+                ) if stage_report['num_items'] > 0 and stage_report['items_per_second'] is not None else ''
+            ))
+        for counter, value in report['counters'].items():
+            print('{}: {}'.format(counter, value))
+        if report['peak_rss_bytes'] is not None:
+            print('Peak RSS: {:.1f} MiB'.format(report['peak_rss_bytes']/1024**2))
+
+class StageTimer:
+
+    def __init__(self, instrumentation, stage, num_items = None):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.num_items = num_items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record(
+            self.stage,
+            time.perf_counter() - self.start,
+            self.num_items
+        )
+        return False
+
+    def add_items(self, num_items):
+        self.num_items = (self.num_items or 0) + num_items
+
+class NullInstrumentation:
+
+    enabled = False
+
+    def timer(self, stage, num_items = None):
+        return NULL_STAGE_TIMER
+
+    def record(self, stage, seconds, num_items = None):
+        pass
+
+    def count(self, counter, value = 1):
+        pass
+
+class NullStageTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_items(self, num_items):
+        pass
+
+# Wrappers which time each read from a data source and each write to a data
+# destination, used to separate pipe time from model time when the inference
+# loop itself can't be instrumented. Any other attribute access is passed
+# through to the wrapped object.
+
+class InstrumentedDataSource:
+
+    def __init__(
+        self,
+        data_source,
+        instrumentation,
+        stage = 'observation_read'
+    ):
+        self.data_source = data_source
+        self.data_iterator = iter(data_source)
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.num_reads = 0
+        self.read_seconds = 0.0
+        self.first_read_time = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        if self.first_read_time is None:
+            self.first_read_time = start
+        try:
+            data = next(self.data_iterator)
+        finally:
+            seconds = time.perf_counter() - start
+            self.read_seconds += seconds
+        self.num_reads += 1
+        self.instrumentation.record(self.stage, seconds, num_items = 1)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.data_source, name)
+
+class InstrumentedDataDestination:
+
+    def __init__(
+        self,
+        data_destination,
+        instrumentation,
+        stage = 'state_summary_write'
+    ):
+        self.data_destination = data_destination
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.write_seconds = 0.0
+
+    def write_data(self, timestamp, single_time_data):
+        start = time.perf_counter()
+        try:
+            self.data_destination.write_data(timestamp, single_time_data)
+        finally:
+            seconds = time.perf_counter() - start
+            self.write_seconds += seconds
+        self.instrumentation.record(self.stage, seconds, num_items = 1)
+
+    def __getattr__(self, name):
+        return getattr(self.data_destination, name)
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+NULL_STAGE_TIMER = NullStageTimer()
+
+def active_instrumentation(instrumentation):
+    if instrumentation is None:
+        return NULL_INSTRUMENTATION
+    return instrumentation
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return max_rss
+    return max_rss*1024
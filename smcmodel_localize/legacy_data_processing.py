@@ -1,12 +1,22 @@
-import smcmodel_localize.model
+import smcmodel_localize.database_connections
+import smcmodel_localize.timestamps
+import smcmodel_localize.cubes
+import smcmodel_localize.chunk_store
+import smcmodel_localize.instrumentation
+import smcmodel_localize.ingestion_ledger
 # from smcmodel.databases.memory import DatabaseMemory
-import datetime_conversion
 import pandas as pd
 import numpy as np
 import slugify
 import time
 import os
 import itertools
+import json
+import functools
+import concurrent.futures
+import gzip
+import bz2
+import lzma
 
 DEFAULT_TIMESTAMP_COLUMN_NAME = 'timestamp'
 DEFAULT_ANCHOR_ID_COLUMN_NAME = 'anchor_id'
@@ -14,6 +24,21 @@ DEFAULT_ANCHOR_DATA_COLUMN_NAME_PREFIX = 'anchor_'
 DEFAULT_OBJECT_ID_COLUMN_NAME = 'object_id'
 DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME = 'value'
 
+OUTPUT_FORMATS = ('npz', 'chunked')
+
+COMPRESSION_OPENERS = {
+    None: open,
+    'gzip': gzip.open,
+    'bz2': bz2.open,
+    'xz': lzma.open
+}
+
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'bz2': '.bz2',
+    'xz': '.xz'
+}
+
 def wide_csv_file_to_long_csv_file(
     directory,
     filename,
@@ -23,35 +48,61 @@ def wide_csv_file_to_long_csv_file(
     new_data_column_name,
     new_id_values = None,
     output_directory = '.',
-    output_filename_prefix = 'long_'
+    output_filename_prefix = 'long_',
+    chunk_size = 100000,
+    compression = None
 ):
+    if new_id_values is not None and len(new_id_values) != len(data_column_names):
+        raise ValueError('Variable value list must be same length as value column name list')
+    if compression not in COMPRESSION_OPENERS:
+        raise ValueError('Compression must be one of {} but received \'{}\''.format(
+            list(COMPRESSION_OPENERS.keys()),
+            compression
+        ))
     path = os.path.join(directory, filename)
-    dataframe = pd.read_csv(path, dtype=str)
-    if new_id_values is not None:
-        if len(new_id_values) != len(data_column_names):
-            raise ValueError('Variable value list must be same length as value column name list')
-        mapping_dict = {data_column_names[i]: new_id_values[i] for i in range(len(new_id_values))}
-        dataframe.rename(
-            mapper = mapping_dict,
-            axis = 'columns',
-            inplace= True
-        )
-        data_column_names = new_id_values
-    dataframe_long = pd.melt(
-        dataframe,
-        id_vars = id_column_names,
-        value_vars = data_column_names,
-        var_name = new_id_column_name,
-        value_name = new_data_column_name
-    )
-    dataframe_long.dropna(
-        axis = 0,
-        subset = [new_data_column_name],
-        inplace = True
-    )
     output_filename = output_filename_prefix + filename
+    if compression is not None:
+        output_filename += COMPRESSION_EXTENSIONS[compression]
     output_path = os.path.join(output_directory, output_filename)
-    dataframe_long.to_csv(output_path, index = False)
+    # The input is melted one chunk of rows at a time and each chunk is
+    # appended to the output, so memory use doesn't grow with the file. The
+    # output is written to a temporary file and moved into place at the end.
+    temporary_output_path = os.path.join(output_directory, '.{}.tmp'.format(output_filename))
+    header_written = False
+    try:
+        with COMPRESSION_OPENERS[compression](temporary_output_path, 'wt', newline = '') as fp:
+            for dataframe in pd.read_csv(path, dtype=str, chunksize = chunk_size):
+                chunk_data_column_names = data_column_names
+                if new_id_values is not None:
+                    mapping_dict = {data_column_names[i]: new_id_values[i] for i in range(len(new_id_values))}
+                    dataframe.rename(
+                        mapper = mapping_dict,
+                        axis = 'columns',
+                        inplace= True
+                    )
+                    chunk_data_column_names = new_id_values
+                dataframe_long = pd.melt(
+                    dataframe,
+                    id_vars = id_column_names,
+                    value_vars = chunk_data_column_names,
+                    var_name = new_id_column_name,
+                    value_name = new_data_column_name
+                )
+                dataframe_long.dropna(
+                    axis = 0,
+                    subset = [new_data_column_name],
+                    inplace = True
+                )
+                dataframe_long.to_csv(fp, index = False, header = not header_written)
+                header_written = True
+            if not header_written:
+                pd.DataFrame(columns = list(id_column_names) + [new_id_column_name, new_data_column_name]).to_csv(fp, index = False)
+    except BaseException:
+        # Don't leave a partial temporary file behind
+        if os.path.exists(temporary_output_path):
+            os.remove(temporary_output_path)
+        raise
+    os.replace(temporary_output_path, output_path)
 
 
 def csv_file_to_dataframe(
@@ -60,10 +111,35 @@ def csv_file_to_dataframe(
     timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
     anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
     object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
-    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    typed = False,
+    timestamp_format = None,
+    engine = None
 ):
     path = os.path.join(directory, filename)
-    dataframe = pd.read_csv(path, parse_dates = [timestamp_column_name])
+    if typed:
+        dataframe = pd.read_csv(
+            path,
+            usecols = [
+                timestamp_column_name,
+                anchor_id_column_name,
+                object_id_column_name,
+                measurement_value_column_name
+            ],
+            dtype = {
+                timestamp_column_name: str,
+                anchor_id_column_name: 'category',
+                object_id_column_name: 'category',
+                measurement_value_column_name: np.float32
+            },
+            engine = engine
+        )
+        dataframe[timestamp_column_name] = pd.to_datetime(
+            dataframe[timestamp_column_name],
+            format = timestamp_format
+        )
+    else:
+        dataframe = pd.read_csv(path, parse_dates = [timestamp_column_name])
     dataframe.rename(
         mapper = {
             timestamp_column_name: DEFAULT_TIMESTAMP_COLUMN_NAME,
@@ -74,6 +150,8 @@ def csv_file_to_dataframe(
         axis = 'columns',
         inplace = True
     )
+    if typed:
+        report_dataframe_memory(dataframe, path)
     return dataframe
 
 def wide_csv_file_to_dataframe(
@@ -84,6 +162,9 @@ def wide_csv_file_to_dataframe(
     object_id_column_name,
     min_data_value = None,
     max_data_value = None,
+    typed = False,
+    timestamp_format = None,
+    engine = None
 ):
     num_anchor_data_columns = len(anchor_data_column_names)
     new_anchor_data_column_names = ['{}{:02}'.format(DEFAULT_ANCHOR_DATA_COLUMN_NAME_PREFIX, i) for i in range(num_anchor_data_columns)]
@@ -94,7 +175,24 @@ def wide_csv_file_to_dataframe(
     anchor_data_column_name_mapper = {anchor_data_column_names[i]: new_anchor_data_column_names[i] for i in range(num_anchor_data_columns)}
     column_name_mapper.update(anchor_data_column_name_mapper)
     path = os.path.join(directory, filename)
-    dataframe = pd.read_csv(path, parse_dates = [timestamp_column_name])
+    if typed:
+        dtype = {
+            timestamp_column_name: str,
+            object_id_column_name: 'category'
+        }
+        dtype.update({anchor_data_column_name: np.float32 for anchor_data_column_name in anchor_data_column_names})
+        dataframe = pd.read_csv(
+            path,
+            usecols = [timestamp_column_name, object_id_column_name] + list(anchor_data_column_names),
+            dtype = dtype,
+            engine = engine
+        )
+        dataframe[timestamp_column_name] = pd.to_datetime(
+            dataframe[timestamp_column_name],
+            format = timestamp_format
+        )
+    else:
+        dataframe = pd.read_csv(path, parse_dates = [timestamp_column_name])
     dataframe.rename(
         mapper = column_name_mapper,
         axis = 'columns',
@@ -124,6 +222,15 @@ def wide_csv_file_to_dataframe(
     )
     return dataframe
 
+def report_dataframe_memory(dataframe, path):
+    peak_rss = smcmodel_localize.instrumentation.peak_rss_bytes()
+    print('Read {} rows from {} ({:.1f} MB in memory, peak RSS {})'.format(
+        len(dataframe),
+        path,
+        dataframe.memory_usage(deep = True).sum()/1024**2,
+        '{:.1f} MB'.format(peak_rss/1024**2) if peak_rss is not None else 'unavailable'
+    ))
+
 def add_ids_to_dataframe(
     dataframe,
     **kwargs
@@ -191,7 +298,7 @@ def csv_directories_to_dataframe(
     directory_parser = None,
     filename_filter = None,
     filename_parser = None,
-    add_ids = {},
+    add_ids = None,
     anchor_ids = None,
     object_ids = None,
     start_timestamp = None,
@@ -199,49 +306,49 @@ def csv_directories_to_dataframe(
     timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
     anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
     object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
-    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None
 ):
-    dataframes = []
-    directory_entries = os.listdir(top_directory)
-    for directory_entry in directory_entries:
-        path = os.path.join(top_directory, directory_entry)
-        if os.path.isdir(path) and (directory_filter is None or directory_filter.match(directory_entry)):
-            if directory_parser is not None:
-                additional_ids = directory_parser(directory_entry)
-                add_ids.update(additional_ids)
-            dataframe = csv_files_to_dataframe(
-                directory = path,
-                filename_filter = filename_filter,
-                filename_parser = filename_parser,
-                add_ids = add_ids,
-                anchor_ids = anchor_ids,
-                object_ids = object_ids,
-                start_timestamp = start_timestamp,
-                end_timestamp = end_timestamp,
-                timestamp_column_name = timestamp_column_name,
-                anchor_id_column_name = anchor_id_column_name,
-                object_id_column_name = object_id_column_name,
-                measurement_value_column_name = measurement_value_column_name
-            )
-            if dataframe is not None and len(dataframe) > 0:
-                print('Adding {} rows from directory {} spanning {} to {}'.format(
-                    len(dataframe),
-                    path,
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
-                dataframes.append(dataframe)
-    if len(dataframes) == 0:
-        return None
-    dataframe_all = pd.concat(dataframes, ignore_index = True)
-    dataframe_all = dataframe_all[[
-        DEFAULT_TIMESTAMP_COLUMN_NAME,
-        DEFAULT_OBJECT_ID_COLUMN_NAME,
-        DEFAULT_ANCHOR_ID_COLUMN_NAME,
-        DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
-    ]]
-    dataframe_all.sort_values(DEFAULT_TIMESTAMP_COLUMN_NAME, inplace=True)
-    dataframe_all.reset_index(inplace = True, drop = True)
-    return dataframe_all
+    file_tasks = csv_directories_file_tasks(
+        top_directory = top_directory,
+        directory_filter = directory_filter,
+        directory_parser = directory_parser,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids
+    )
+    if manifest is not None:
+        file_tasks = manifest.select_file_tasks(
+            file_tasks,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            object_ids = object_ids
+        )
+    dataframes = _map_tasks(
+        function = functools.partial(
+            _csv_file_task_to_dataframe,
+            anchor_ids = anchor_ids,
+            object_ids = object_ids,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            timestamp_column_name = timestamp_column_name,
+            anchor_id_column_name = anchor_id_column_name,
+            object_id_column_name = object_id_column_name,
+            measurement_value_column_name = measurement_value_column_name,
+            typed = typed,
+            timestamp_format = timestamp_format,
+            engine = engine
+        ),
+        tasks = file_tasks,
+        num_workers = num_workers,
+        use_processes = use_processes
+    )
+    return _combine_dataframes(dataframes, long_format = True)
 
 def wide_csv_directories_to_dataframe(
     top_directory,
@@ -252,54 +359,60 @@ def wide_csv_directories_to_dataframe(
     directory_parser = None,
     filename_filter = None,
     filename_parser = None,
-    add_ids = {},
+    add_ids = None,
     object_ids = None,
     start_timestamp = None,
     end_timestamp = None,
     min_data_value = None,
-    max_data_value = None
+    max_data_value = None,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None
 ):
-    dataframes = []
-    directory_entries = os.listdir(top_directory)
-    for directory_entry in directory_entries:
-        path = os.path.join(top_directory, directory_entry)
-        if os.path.isdir(path) and (directory_filter is None or directory_filter.match(directory_entry)):
-            if directory_parser is not None:
-                additional_ids = directory_parser(directory_entry)
-                add_ids.update(additional_ids)
-            dataframe = wide_csv_files_to_dataframe(
-                directory = path,
-                timestamp_column_name = timestamp_column_name,
-                anchor_data_column_names = anchor_data_column_names,
-                object_id_column_name = object_id_column_name,
-                filename_filter = filename_filter,
-                filename_parser = filename_parser,
-                add_ids = add_ids,
-                object_ids = object_ids,
-                start_timestamp = start_timestamp,
-                end_timestamp = end_timestamp,
-                min_data_value = min_data_value,
-                max_data_value = max_data_value
-            )
-            if dataframe is not None and len(dataframe) > 0:
-                print('Adding {} rows from directory {} spanning {} to {}'.format(
-                    len(dataframe),
-                    path,
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
-                dataframes.append(dataframe)
-    if len(dataframes) == 0:
-        return None
-    dataframe_all = pd.concat(dataframes, ignore_index = True)
-    dataframe_all.sort_values(DEFAULT_TIMESTAMP_COLUMN_NAME, inplace=True)
-    dataframe_all.reset_index(inplace = True, drop = True)
-    return dataframe_all
+    file_tasks = csv_directories_file_tasks(
+        top_directory = top_directory,
+        directory_filter = directory_filter,
+        directory_parser = directory_parser,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids
+    )
+    if manifest is not None:
+        file_tasks = manifest.select_file_tasks(
+            file_tasks,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            object_ids = object_ids
+        )
+    dataframes = _map_tasks(
+        function = functools.partial(
+            _wide_csv_file_task_to_dataframe,
+            timestamp_column_name = timestamp_column_name,
+            anchor_data_column_names = anchor_data_column_names,
+            object_id_column_name = object_id_column_name,
+            object_ids = object_ids,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            min_data_value = min_data_value,
+            max_data_value = max_data_value,
+            typed = typed,
+            timestamp_format = timestamp_format,
+            engine = engine
+        ),
+        tasks = file_tasks,
+        num_workers = num_workers,
+        use_processes = use_processes
+    )
+    return _combine_dataframes(dataframes, long_format = False)
 
 def csv_files_to_dataframe(
     directory,
     filename_filter = None,
     filename_parser = None,
-    add_ids = {},
+    add_ids = None,
     anchor_ids = None,
     object_ids = None,
     start_timestamp = None,
@@ -307,54 +420,47 @@ def csv_files_to_dataframe(
     timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
     anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
     object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
-    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None
 ):
-    dataframes = []
-    directory_entries = os.listdir(directory)
-    for directory_entry in directory_entries:
-        path = os.path.join(directory, directory_entry)
-        if not os.path.isdir(path) and (filename_filter is None or filename_filter.match(directory_entry)):
-            if filename_parser is not None:
-                additional_ids = filename_parser(directory_entry)
-                add_ids.update(additional_ids)
-            dataframe = csv_file_to_dataframe(
-                directory = directory,
-                filename = directory_entry,
-                timestamp_column_name = timestamp_column_name,
-                anchor_id_column_name = anchor_id_column_name,
-                object_id_column_name = object_id_column_name,
-                measurement_value_column_name = measurement_value_column_name
-            )
-            dataframe = add_ids_to_dataframe(
-                dataframe,
-                **add_ids
-            )
-            dataframe = filter_dataframe(
-                dataframe,
-                anchor_ids,
-                object_ids,
-                start_timestamp,
-                end_timestamp,
-            )
-            if len(dataframe) > 0:
-                print('Adding {} rows from file {} spanning {} to {}'.format(
-                    len(dataframe),
-                    path,
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
-                dataframes.append(dataframe)
-    if len(dataframes) == 0:
-         return None
-    dataframe_all = pd.concat(dataframes, ignore_index = True)
-    dataframe_all = dataframe_all[[
-        DEFAULT_TIMESTAMP_COLUMN_NAME,
-        DEFAULT_OBJECT_ID_COLUMN_NAME,
-        DEFAULT_ANCHOR_ID_COLUMN_NAME,
-        DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
-    ]]
-    dataframe_all.sort_values(DEFAULT_TIMESTAMP_COLUMN_NAME, inplace=True)
-    dataframe_all.reset_index(inplace = True, drop = True)
-    return dataframe_all
+    file_tasks = csv_files_file_tasks(
+        directory = directory,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids
+    )
+    if manifest is not None:
+        file_tasks = manifest.select_file_tasks(
+            file_tasks,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            object_ids = object_ids
+        )
+    dataframes = _map_tasks(
+        function = functools.partial(
+            _csv_file_task_to_dataframe,
+            anchor_ids = anchor_ids,
+            object_ids = object_ids,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            timestamp_column_name = timestamp_column_name,
+            anchor_id_column_name = anchor_id_column_name,
+            object_id_column_name = object_id_column_name,
+            measurement_value_column_name = measurement_value_column_name,
+            typed = typed,
+            timestamp_format = timestamp_format,
+            engine = engine
+        ),
+        tasks = file_tasks,
+        num_workers = num_workers,
+        use_processes = use_processes
+    )
+    return _combine_dataframes(dataframes, long_format = True)
 
 def wide_csv_files_to_dataframe(
     directory,
@@ -363,54 +469,242 @@ def wide_csv_files_to_dataframe(
     object_id_column_name,
     filename_filter = None,
     filename_parser = None,
-    add_ids = {},
+    add_ids = None,
     object_ids = None,
     start_timestamp = None,
     end_timestamp = None,
     min_data_value = None,
-    max_data_value = None
+    max_data_value = None,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None
 ):
-    dataframes = []
-    directory_entries = os.listdir(directory)
+    file_tasks = csv_files_file_tasks(
+        directory = directory,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids
+    )
+    if manifest is not None:
+        file_tasks = manifest.select_file_tasks(
+            file_tasks,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            object_ids = object_ids
+        )
+    dataframes = _map_tasks(
+        function = functools.partial(
+            _wide_csv_file_task_to_dataframe,
+            timestamp_column_name = timestamp_column_name,
+            anchor_data_column_names = anchor_data_column_names,
+            object_id_column_name = object_id_column_name,
+            object_ids = object_ids,
+            start_timestamp = start_timestamp,
+            end_timestamp = end_timestamp,
+            min_data_value = min_data_value,
+            max_data_value = max_data_value,
+            typed = typed,
+            timestamp_format = timestamp_format,
+            engine = engine
+        ),
+        tasks = file_tasks,
+        num_workers = num_workers,
+        use_processes = use_processes
+    )
+    return _combine_dataframes(dataframes, long_format = False)
+
+# A file task is a (directory, filename, ids) tuple. Each task gets its own
+# copy of the IDs, so IDs parsed from one directory or filename never carry
+# over to another file.
+
+def csv_directories_file_tasks(
+    top_directory,
+    directory_filter = None,
+    directory_parser = None,
+    filename_filter = None,
+    filename_parser = None,
+    add_ids = None
+):
+    file_tasks = []
+    directory_entries = sorted(os.listdir(top_directory))
+    for directory_entry in directory_entries:
+        path = os.path.join(top_directory, directory_entry)
+        if os.path.isdir(path) and (directory_filter is None or directory_filter.match(directory_entry)):
+            directory_ids = dict(add_ids) if add_ids is not None else {}
+            if directory_parser is not None:
+                directory_ids.update(directory_parser(directory_entry))
+            file_tasks.extend(csv_files_file_tasks(
+                directory = path,
+                filename_filter = filename_filter,
+                filename_parser = filename_parser,
+                add_ids = directory_ids
+            ))
+    return file_tasks
+
+def csv_files_file_tasks(
+    directory,
+    filename_filter = None,
+    filename_parser = None,
+    add_ids = None
+):
+    file_tasks = []
+    directory_entries = sorted(os.listdir(directory))
     for directory_entry in directory_entries:
         path = os.path.join(directory, directory_entry)
         if not os.path.isdir(path) and (filename_filter is None or filename_filter.match(directory_entry)):
+            file_ids = dict(add_ids) if add_ids is not None else {}
             if filename_parser is not None:
-                additional_ids = filename_parser(directory_entry)
-                add_ids.update(additional_ids)
-            dataframe = wide_csv_file_to_dataframe(
-                directory = directory,
-                filename = directory_entry,
-                timestamp_column_name = timestamp_column_name,
-                anchor_data_column_names = anchor_data_column_names,
-                object_id_column_name = object_id_column_name,
-                min_data_value = min_data_value,
-                max_data_value = max_data_value
-            )
-            dataframe = add_ids_to_dataframe(
-                dataframe,
-                **add_ids
-            )
-            dataframe = wide_filter_dataframe(
-                dataframe,
-                object_ids,
-                start_timestamp,
-                end_timestamp,
-            )
-            if len(dataframe) > 0:
-                print('Adding {} rows from file {} spanning {} to {}'.format(
-                    len(dataframe),
-                    path,
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
-                    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
-                dataframes.append(dataframe)
+                file_ids.update(filename_parser(directory_entry))
+            file_tasks.append((directory, directory_entry, file_ids))
+    return file_tasks
+
+def _csv_file_task_to_dataframe(
+    file_task,
+    anchor_ids = None,
+    object_ids = None,
+    start_timestamp = None,
+    end_timestamp = None,
+    timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+    anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
+    object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    typed = False,
+    timestamp_format = None,
+    engine = None
+):
+    directory, filename, file_ids = file_task
+    dataframe = csv_file_to_dataframe(
+        directory = directory,
+        filename = filename,
+        timestamp_column_name = timestamp_column_name,
+        anchor_id_column_name = anchor_id_column_name,
+        object_id_column_name = object_id_column_name,
+        measurement_value_column_name = measurement_value_column_name,
+        typed = typed,
+        timestamp_format = timestamp_format,
+        engine = engine
+    )
+    dataframe = add_ids_to_dataframe(
+        dataframe,
+        **file_ids
+    )
+    dataframe = filter_dataframe(
+        dataframe,
+        anchor_ids,
+        object_ids,
+        start_timestamp,
+        end_timestamp,
+    )
+    return _report_file_dataframe(dataframe, directory, filename)
+
+def _wide_csv_file_task_to_dataframe(
+    file_task,
+    timestamp_column_name,
+    anchor_data_column_names,
+    object_id_column_name,
+    object_ids = None,
+    start_timestamp = None,
+    end_timestamp = None,
+    min_data_value = None,
+    max_data_value = None,
+    typed = False,
+    timestamp_format = None,
+    engine = None
+):
+    directory, filename, file_ids = file_task
+    dataframe = wide_csv_file_to_dataframe(
+        directory = directory,
+        filename = filename,
+        timestamp_column_name = timestamp_column_name,
+        anchor_data_column_names = anchor_data_column_names,
+        object_id_column_name = object_id_column_name,
+        min_data_value = min_data_value,
+        max_data_value = max_data_value,
+        typed = typed,
+        timestamp_format = timestamp_format,
+        engine = engine
+    )
+    dataframe = add_ids_to_dataframe(
+        dataframe,
+        **file_ids
+    )
+    dataframe = wide_filter_dataframe(
+        dataframe,
+        object_ids,
+        start_timestamp,
+        end_timestamp,
+    )
+    return _report_file_dataframe(dataframe, directory, filename)
+
+def _report_file_dataframe(dataframe, directory, filename):
+    if len(dataframe) == 0:
+        return None
+    print('Adding {} rows from file {} spanning {} to {}'.format(
+        len(dataframe),
+        os.path.join(directory, filename),
+        dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
+        dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
+    return dataframe
+
+def _map_tasks(
+    function,
+    tasks,
+    num_workers = None,
+    use_processes = False
+):
+    if num_workers is None or num_workers <= 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+    if use_processes:
+        executor_class = concurrent.futures.ProcessPoolExecutor
+    else:
+        executor_class = concurrent.futures.ThreadPoolExecutor
+    with executor_class(max_workers = num_workers) as executor:
+        results = list(executor.map(function, tasks))
+    return results
+
+def _combine_dataframes(dataframes, long_format = True):
+    dataframes = [dataframe for dataframe in dataframes if dataframe is not None]
     if len(dataframes) == 0:
-         return None
+        return None
+    dataframes = union_categorical_columns(dataframes)
     dataframe_all = pd.concat(dataframes, ignore_index = True)
-    dataframe_all.sort_values(DEFAULT_TIMESTAMP_COLUMN_NAME, inplace=True)
+    if long_format:
+        dataframe_all = dataframe_all[[
+            DEFAULT_TIMESTAMP_COLUMN_NAME,
+            DEFAULT_OBJECT_ID_COLUMN_NAME,
+            DEFAULT_ANCHOR_ID_COLUMN_NAME,
+            DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+        ]]
+    dataframe_all.sort_values(DEFAULT_TIMESTAMP_COLUMN_NAME, inplace = True, kind = 'stable')
     dataframe_all.reset_index(inplace = True, drop = True)
     return dataframe_all
 
+def union_categorical_columns(dataframes):
+    # Concatenating categorical columns with different categories falls back
+    # to object dtype, so the categories are unified first
+    categorical_column_names = [
+        column_name
+        for column_name in dataframes[0].columns
+        if isinstance(dataframes[0][column_name].dtype, pd.CategoricalDtype) and all([
+            column_name in dataframe.columns and isinstance(dataframe[column_name].dtype, pd.CategoricalDtype)
+            for dataframe in dataframes
+        ])
+    ]
+    if len(categorical_column_names) == 0:
+        return dataframes
+    dataframes = [dataframe.copy(deep = False) for dataframe in dataframes]
+    for column_name in categorical_column_names:
+        categories = pd.api.types.union_categoricals(
+            [dataframe[column_name] for dataframe in dataframes],
+            ignore_order = True
+        ).categories
+        for dataframe in dataframes:
+            dataframe[column_name] = dataframe[column_name].cat.set_categories(categories)
+    return dataframes
+
 def csv_directories_to_npz_files_by_object_one_day(
     input_top_directory,
     output_directory,
@@ -426,12 +720,26 @@ def csv_directories_to_npz_files_by_object_one_day(
     directory_parser = None,
     filename_filter = None,
     filename_parser = None,
-    add_ids = {},
+    add_ids = None,
     timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
     anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
     object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
-    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None,
+    output_format = 'npz',
+    chunk_size = 3600,
+    codec = 'none'
 ):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Output format must be one of {} but received \'{}\''.format(
+            OUTPUT_FORMATS,
+            output_format
+        ))
     start_timestamp = pd.Timestamp(year = year, month = month, day = day, hour = start_hour, tz=tz)
     end_timestamp = pd.Timestamp(year = year, month = month, day = day, hour = end_hour, tz=tz)
     print('Retrieving observations between {} and {}'.format(
@@ -452,20 +760,530 @@ def csv_directories_to_npz_files_by_object_one_day(
         timestamp_column_name = timestamp_column_name,
         anchor_id_column_name = anchor_id_column_name,
         object_id_column_name = object_id_column_name,
-        measurement_value_column_name = measurement_value_column_name
+        measurement_value_column_name = measurement_value_column_name,
+        num_workers = num_workers,
+        use_processes = use_processes,
+        typed = typed,
+        timestamp_format = timestamp_format,
+        engine = engine,
+        manifest = manifest
     )
+    if dataframe_all is None:
+        print('No observations for {:04}-{:02}-{:02}'.format(year, month, day))
+        return
     print('Gathered {} observations'.format(len(dataframe_all)))
-    arrays_by_object = dataframe_to_arrays_by_object(
-        dataframe = dataframe_all,
-        measurement_value_name = measurement_value_name)
     output_filename_stem_with_date = '{}_{:04}{:02}{:02}'.format(output_filename_stem, year, month, day)
-    arrays_by_object_to_npz_files_by_object(
-        arrays_by_object,
-        directory = output_directory,
-        filename_stem = output_filename_stem_with_date
+    dataframe_to_output_files_by_object(
+        dataframe = dataframe_all,
+        output_directory = output_directory,
+        output_filename_stem = output_filename_stem_with_date,
+        measurement_value_name = measurement_value_name,
+        output_format = output_format,
+        chunk_size = chunk_size,
+        codec = codec,
+        num_workers = num_workers
+    )
+
+def dataframe_to_output_files_by_object(
+    dataframe,
+    output_directory,
+    output_filename_stem,
+    measurement_value_name,
+    output_format = 'npz',
+    chunk_size = 3600,
+    codec = 'none',
+    num_workers = None
+):
+    arrays_by_object = dataframe_to_arrays_by_object(
+        dataframe = dataframe,
+        measurement_value_name = measurement_value_name,
+        lazy = True)
+    if output_format == 'chunked':
+        arrays_by_object_to_chunk_stores_by_object(
+            arrays_by_object,
+            directory = output_directory,
+            filename_stem = output_filename_stem,
+            measurement_value_name = measurement_value_name,
+            chunk_size = chunk_size,
+            codec = codec,
+            num_workers = num_workers
+        )
+    else:
+        arrays_by_object_to_npz_files_by_object(
+            arrays_by_object,
+            directory = output_directory,
+            filename_stem = output_filename_stem
+        )
+
+def csv_directories_to_npz_files_by_object_date_range(
+    input_top_directory,
+    output_directory,
+    output_filename_stem,
+    measurement_value_name,
+    start_date,
+    end_date,
+    start_hour = 12,
+    end_hour = 19,
+    tz = 'UTC',
+    directory_filter = None,
+    directory_parser = None,
+    filename_filter = None,
+    filename_parser = None,
+    add_ids = None,
+    timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+    anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
+    object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    num_workers = None,
+    use_processes = False,
+    num_day_workers = None,
+    typed = False,
+    timestamp_format = None,
+    engine = None,
+    manifest = None,
+    output_format = 'npz',
+    chunk_size = 3600,
+    codec = 'none'
+):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Output format must be one of {} but received \'{}\''.format(
+            OUTPUT_FORMATS,
+            output_format
+        ))
+    dates = [timestamp.date() for timestamp in pd.date_range(pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date(), freq = 'D')]
+    if len(dates) == 0:
+        raise ValueError('End date {} is before start date {}'.format(end_date, start_date))
+    start_timestamp = pd.Timestamp(year = dates[0].year, month = dates[0].month, day = dates[0].day, hour = start_hour, tz=tz)
+    end_timestamp = pd.Timestamp(year = dates[-1].year, month = dates[-1].month, day = dates[-1].day, hour = end_hour, tz=tz)
+    print('Retrieving observations between {} and {}'.format(
+        start_timestamp.astimezone('UTC').isoformat(),
+        end_timestamp.astimezone('UTC').isoformat(),
+    ))
+    # The tree is walked once for the whole range and the rows are then
+    # sharded by local day
+    dataframe_all = csv_directories_to_dataframe(
+        top_directory = input_top_directory,
+        directory_filter = directory_filter,
+        directory_parser = directory_parser,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids,
+        anchor_ids = None,
+        object_ids = None,
+        start_timestamp = start_timestamp,
+        end_timestamp = end_timestamp,
+        timestamp_column_name = timestamp_column_name,
+        anchor_id_column_name = anchor_id_column_name,
+        object_id_column_name = object_id_column_name,
+        measurement_value_column_name = measurement_value_column_name,
+        num_workers = num_workers,
+        use_processes = use_processes,
+        typed = typed,
+        timestamp_format = timestamp_format,
+        engine = engine,
+        manifest = manifest
+    )
+    if dataframe_all is None:
+        dataframe_all = pd.DataFrame(columns = [
+            DEFAULT_TIMESTAMP_COLUMN_NAME,
+            DEFAULT_OBJECT_ID_COLUMN_NAME,
+            DEFAULT_ANCHOR_ID_COLUMN_NAME,
+            DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME
+        ])
+    print('Gathered {} observations'.format(len(dataframe_all)))
+    local_timestamps = pd.to_datetime(dataframe_all[DEFAULT_TIMESTAMP_COLUMN_NAME], utc = True).dt.tz_convert(tz)
+    local_dates = local_timestamps.dt.date
+    day_tasks = []
+    for date in dates:
+        day_start_timestamp = pd.Timestamp(year = date.year, month = date.month, day = date.day, hour = start_hour, tz=tz)
+        day_end_timestamp = pd.Timestamp(year = date.year, month = date.month, day = date.day, hour = end_hour, tz=tz)
+        day_boolean = (
+            (local_dates == date) &
+            (local_timestamps >= day_start_timestamp) &
+            (local_timestamps <= day_end_timestamp)
+        )
+        day_tasks.append((date, dataframe_all[day_boolean]))
+    day_summaries = _map_tasks(
+        function = functools.partial(
+            _process_day_task,
+            output_directory = output_directory,
+            output_filename_stem = output_filename_stem,
+            measurement_value_name = measurement_value_name,
+            output_format = output_format,
+            chunk_size = chunk_size,
+            codec = codec,
+            num_workers = num_workers
+        ),
+        tasks = day_tasks,
+        num_workers = num_day_workers,
+        use_processes = use_processes
     )
+    summary = pd.DataFrame(
+        day_summaries,
+        columns = ['date', 'num_rows', 'num_objects', 'seconds']
+    )
+    print('Processed {} days ({} rows) in {:.1f} seconds of worker time'.format(
+        len(summary),
+        summary['num_rows'].sum(),
+        summary['seconds'].sum()
+    ))
+    print(summary.to_string(index = False))
+    return summary
+
+def _process_day_task(
+    day_task,
+    output_directory,
+    output_filename_stem,
+    measurement_value_name,
+    output_format = 'npz',
+    chunk_size = 3600,
+    codec = 'none',
+    num_workers = None
+):
+    date, dataframe = day_task
+    start_time = time.time()
+    num_objects = 0
+    if len(dataframe) > 0:
+        num_objects = dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME].nunique()
+        output_filename_stem_with_date = '{}_{:04}{:02}{:02}'.format(output_filename_stem, date.year, date.month, date.day)
+        dataframe_to_output_files_by_object(
+            dataframe = dataframe.reset_index(drop = True),
+            output_directory = output_directory,
+            output_filename_stem = output_filename_stem_with_date,
+            measurement_value_name = measurement_value_name,
+            output_format = output_format,
+            chunk_size = chunk_size,
+            codec = codec,
+            num_workers = num_workers
+        )
+    else:
+        print('No observations for {}'.format(date.isoformat()))
+    return {
+        'date': date,
+        'num_rows': len(dataframe),
+        'num_objects': num_objects,
+        'seconds': time.time() - start_time
+    }
 
-def dataframe_to_arrays(dataframe, measurement_value_name):
+def csv_directories_to_npz_files_by_object_incremental(
+    input_top_directory,
+    output_directory,
+    output_filename_stem,
+    measurement_value_name,
+    ledger,
+    start_hour = 12,
+    end_hour = 19,
+    tz = 'UTC',
+    database_connection = None,
+    directory_filter = None,
+    directory_parser = None,
+    filename_filter = None,
+    filename_parser = None,
+    add_ids = None,
+    timestamp_column_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+    anchor_id_column_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
+    object_id_column_name = DEFAULT_OBJECT_ID_COLUMN_NAME,
+    measurement_value_column_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+    num_workers = None,
+    use_processes = False,
+    typed = False,
+    timestamp_format = None,
+    engine = None
+):
+    all_file_tasks = csv_directories_file_tasks(
+        top_directory = input_top_directory,
+        directory_filter = directory_filter,
+        directory_parser = directory_parser,
+        filename_filter = filename_filter,
+        filename_parser = filename_parser,
+        add_ids = add_ids
+    )
+    file_tasks = ledger.select_new_file_tasks(all_file_tasks)
+    if len(file_tasks) == 0:
+        ledger.save()
+        return
+    # Rows outside the daily window are dropped, as they are by
+    # csv_directories_to_npz_files_by_object_one_day, so incremental runs
+    # produce the same per-day outputs as a full rebuild
+    read_file_task = functools.partial(
+        _csv_file_task_to_day_hours_dataframe,
+        start_hour = start_hour,
+        end_hour = end_hour,
+        tz = tz,
+        timestamp_column_name = timestamp_column_name,
+        anchor_id_column_name = anchor_id_column_name,
+        object_id_column_name = object_id_column_name,
+        measurement_value_column_name = measurement_value_column_name,
+        typed = typed,
+        timestamp_format = timestamp_format,
+        engine = engine
+    )
+    dataframes = _map_tasks(
+        function = read_file_task,
+        tasks = file_tasks,
+        num_workers = num_workers,
+        use_processes = use_processes
+    )
+    if database_connection is not None:
+        output_keys_function = _database_partition_keys
+    else:
+        output_keys_function = functools.partial(
+            _npz_output_filename_stems,
+            filename_stem = output_filename_stem,
+            tz = tz
+        )
+    output_keys_list = [output_keys_function(dataframe) for dataframe in dataframes]
+    # Both the npz files and the databases can only be appended to, so every
+    # output (npz file or database partition) a changed file contributed to,
+    # before or after the change, is rebuilt from all of the files that
+    # contribute to it
+    rebuild_keys = set()
+    for file_task, output_keys in zip(file_tasks, output_keys_list):
+        if ledger.is_recorded(file_task):
+            rebuild_keys.update(ledger.recorded_outputs(file_task) or [])
+            rebuild_keys.update(np.unique(output_keys).tolist())
+    if (
+        len(rebuild_keys) > 0 and
+        database_connection is not None and
+        not hasattr(database_connection, 'delete_object_time_series_partitions')
+    ):
+        raise ValueError('Changed files can\'t be ingested again because the database connection doesn\'t support deleting their earlier rows')
+    reread_file_tasks = []
+    reread_dataframes = []
+    reread_output_keys_list = []
+    if len(rebuild_keys) > 0:
+        # Unchanged files are reread if they contribute to an output being
+        # rebuilt (or if the ledger doesn't know what they contribute to)
+        file_task_paths = set(smcmodel_localize.ingestion_ledger.file_task_path(file_task) for file_task in file_tasks)
+        reread_file_tasks = [
+            file_task
+            for file_task in all_file_tasks
+            if smcmodel_localize.ingestion_ledger.file_task_path(file_task) not in file_task_paths and
+            ledger.is_recorded(file_task) and (
+                ledger.recorded_outputs(file_task) is None or
+                not rebuild_keys.isdisjoint(ledger.recorded_outputs(file_task))
+            )
+        ]
+        print('Rebuilding {} outputs from {} new or changed files and {} unchanged files'.format(
+            len(rebuild_keys),
+            len(file_tasks),
+            len(reread_file_tasks)
+        ))
+        reread_dataframes = _map_tasks(
+            function = read_file_task,
+            tasks = reread_file_tasks,
+            num_workers = num_workers,
+            use_processes = use_processes
+        )
+        reread_output_keys_list = [output_keys_function(dataframe) for dataframe in reread_dataframes]
+    if database_connection is not None:
+        if len(rebuild_keys) > 0:
+            database_connection.delete_object_time_series_partitions(
+                [json.loads(rebuild_key) for rebuild_key in sorted(rebuild_keys)]
+            )
+        # Rows from new and changed files are all written; rows from the
+        # reread files only replace the partitions that were deleted
+        write_dataframes = dataframes + [
+            _select_output_keys(dataframe, output_keys, rebuild_keys)
+            for dataframe, output_keys in zip(reread_dataframes, reread_output_keys_list)
+        ]
+        dataframe_new = _combine_dataframes(write_dataframes, long_format = True)
+        if dataframe_new is not None:
+            print('Gathered {} new observations'.format(len(dataframe_new)))
+            dataframe_to_database(
+                dataframe = dataframe_new,
+                database_connection = database_connection,
+                measurement_value_name = measurement_value_name
+            )
+    else:
+        append_dataframes = [
+            _select_output_keys(dataframe, output_keys, rebuild_keys, exclude = True)
+            for dataframe, output_keys in zip(dataframes, output_keys_list)
+        ]
+        dataframe_new = _combine_dataframes(append_dataframes, long_format = True)
+        if dataframe_new is not None:
+            print('Gathered {} new observations'.format(len(dataframe_new)))
+            append_dataframe_to_npz_files_by_object_by_day(
+                dataframe = dataframe_new,
+                directory = output_directory,
+                filename_stem = output_filename_stem,
+                measurement_value_name = measurement_value_name,
+                tz = tz
+            )
+        if len(rebuild_keys) > 0:
+            rebuild_npz_files_by_output_stem(
+                dataframes = dataframes + reread_dataframes,
+                output_stems_list = output_keys_list + reread_output_keys_list,
+                rebuild_stems = rebuild_keys,
+                directory = output_directory,
+                measurement_value_name = measurement_value_name
+            )
+    for file_task, output_keys in zip(reread_file_tasks, reread_output_keys_list):
+        ledger.record_outputs(file_task, np.unique(output_keys).tolist())
+    # Files are only recorded once their data has been written, so an
+    # interrupted run is picked up again from the same files
+    ledger.record(
+        file_tasks,
+        file_outputs = [np.unique(output_keys).tolist() for output_keys in output_keys_list]
+    )
+    ledger.save()
+
+def _select_output_keys(dataframe, output_keys, selected_keys, exclude = False):
+    if dataframe is None:
+        return None
+    selected_boolean = np.isin(output_keys, list(selected_keys))
+    if exclude:
+        selected_boolean = ~selected_boolean
+    return dataframe[selected_boolean]
+
+def _csv_file_task_to_day_hours_dataframe(
+    file_task,
+    start_hour,
+    end_hour,
+    tz,
+    **kwargs
+):
+    dataframe = _csv_file_task_to_dataframe(file_task, **kwargs)
+    if dataframe is None:
+        return None
+    local_times = pd.to_datetime(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], utc = True).dt.tz_convert(tz).dt.tz_localize(None)
+    times_of_day = local_times - local_times.dt.normalize()
+    day_hours_boolean = np.ones(len(dataframe), dtype = bool)
+    if start_hour is not None:
+        day_hours_boolean &= (times_of_day >= pd.Timedelta(hours = start_hour)).to_numpy()
+    if end_hour is not None:
+        day_hours_boolean &= (times_of_day <= pd.Timedelta(hours = end_hour)).to_numpy()
+    if not day_hours_boolean.all():
+        dataframe = dataframe[day_hours_boolean].reset_index(drop = True)
+    if len(dataframe) == 0:
+        return None
+    return dataframe
+
+# The (UTC date, object ID) database partition each row belongs in, encoded
+# as JSON so it can be recorded in the ingestion ledger
+def _database_partition_keys(dataframe):
+    if dataframe is None:
+        return np.zeros(0, dtype = object)
+    dates = pd.to_datetime(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], utc = True).dt.strftime('%Y-%m-%d')
+    partition_codes, partitions = pd.MultiIndex.from_arrays([
+        dates,
+        dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME]
+    ]).factorize()
+    partition_keys = np.empty(len(partitions), dtype = object)
+    for partition_index, (date, object_id) in enumerate(partitions):
+        if isinstance(object_id, np.generic):
+            object_id = object_id.item()
+        partition_keys[partition_index] = json.dumps([date, object_id])
+    return partition_keys[partition_codes]
+
+# The stem of the per-day, per-object npz file each row belongs in
+def _npz_output_filename_stems(dataframe, filename_stem, tz):
+    if dataframe is None:
+        return np.zeros(0, dtype = object)
+    local_dates = pd.to_datetime(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], utc = True).dt.tz_convert(tz).dt.strftime('%Y%m%d')
+    object_ids = dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME].astype(str)
+    object_slugs = object_ids.map({object_id: slugify.slugify(object_id) for object_id in object_ids.unique()})
+    return ('{}_'.format(filename_stem) + local_dates + '_' + object_slugs).to_numpy(dtype = object)
+
+def append_dataframe_to_npz_files_by_object_by_day(
+    dataframe,
+    directory,
+    filename_stem,
+    measurement_value_name,
+    tz = 'UTC'
+):
+    dataframe = dataframe.copy()
+    dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME] = pd.to_datetime(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], utc = True)
+    output_stems = _npz_output_filename_stems(dataframe, filename_stem, tz)
+    for extended_filename_stem, dataframe_single_object in dataframe.groupby(output_stems):
+        filename = extended_filename_stem + '.npz'
+        if os.path.exists(os.path.join(directory, filename)):
+            existing_dataframe = arrays_to_dataframe(
+                arrays = npz_file_to_arrays(
+                    directory = directory,
+                    filename = filename,
+                    measurement_value_name = measurement_value_name
+                ),
+                measurement_value_name = measurement_value_name
+            )
+            print('Appending {} rows to {} existing rows in {}'.format(
+                len(dataframe_single_object),
+                len(existing_dataframe),
+                filename
+            ))
+            dataframe_single_object = pd.concat(
+                [existing_dataframe, dataframe_single_object],
+                ignore_index = True
+            )
+        # New rows come after existing rows, so where a new file repeats a
+        # reading that is already stored, the new one is kept
+        arrays = dataframe_to_arrays(
+            dataframe = dataframe_single_object,
+            measurement_value_name = measurement_value_name,
+            duplicate_reduction_method = 'latest'
+        )
+        arrays_to_npz_file(
+            arrays = arrays,
+            directory = directory,
+            filename_stem = extended_filename_stem
+        )
+
+def rebuild_npz_files_by_output_stem(
+    dataframes,
+    output_stems_list,
+    rebuild_stems,
+    directory,
+    measurement_value_name
+):
+    rebuild_stems_list = sorted(rebuild_stems)
+    rebuild_dataframes = []
+    for dataframe, output_stems in zip(dataframes, output_stems_list):
+        if dataframe is None:
+            continue
+        rebuild_boolean = np.isin(output_stems, rebuild_stems_list)
+        rebuild_dataframes.append(dataframe[rebuild_boolean].assign(_output_stem = output_stems[rebuild_boolean]))
+    dataframe_rebuild = _combine_dataframes(rebuild_dataframes, long_format = False)
+    dataframes_by_stem = {}
+    if dataframe_rebuild is not None:
+        dataframes_by_stem = dict(list(dataframe_rebuild.groupby('_output_stem')))
+    for extended_filename_stem in rebuild_stems_list:
+        dataframe_single_object = dataframes_by_stem.get(extended_filename_stem)
+        if dataframe_single_object is None:
+            npz_path = os.path.join(directory, extended_filename_stem + '.npz')
+            if os.path.exists(npz_path):
+                print('Removing {} (no remaining observations)'.format(npz_path))
+                os.remove(npz_path)
+            continue
+        arrays = dataframe_to_arrays(
+            dataframe = dataframe_single_object.drop(columns = '_output_stem').reset_index(drop = True),
+            measurement_value_name = measurement_value_name
+        )
+        arrays_to_npz_file(
+            arrays = arrays,
+            directory = directory,
+            filename_stem = extended_filename_stem
+        )
+
+def dataframe_to_database(
+    dataframe,
+    database_connection,
+    measurement_value_name
+):
+    dataframe = dataframe.rename(
+        columns = {DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME: measurement_value_name}
+    )
+    print('Writing {} rows to database'.format(len(dataframe)))
+    if hasattr(database_connection, 'write_dataframe_object_time_series'):
+        database_connection.write_dataframe_object_time_series(dataframe)
+        return
+    data_list = dataframe.to_dict(orient = 'records')
+    for data in data_list:
+        data[DEFAULT_TIMESTAMP_COLUMN_NAME] = data[DEFAULT_TIMESTAMP_COLUMN_NAME].to_pydatetime()
+    database_connection.write_data_object_time_series(data_list)
+
+def dataframe_to_arrays(dataframe, measurement_value_name, duplicate_reduction_method = 'mean'):
+    if duplicate_reduction_method is not None:
+        dataframe = _collapse_duplicate_observations(dataframe, duplicate_reduction_method)
     timestamps = np.sort(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].unique())
     anchor_ids = np.sort(dataframe[DEFAULT_ANCHOR_ID_COLUMN_NAME].unique())
     object_ids = np.sort(dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME].unique())
@@ -511,63 +1329,173 @@ def dataframe_to_arrays(dataframe, measurement_value_name):
     }
     return arrays
 
+def _collapse_duplicate_observations(dataframe, duplicate_reduction_method):
+    dataframe, num_duplicates = smcmodel_localize.cubes.collapse_duplicate_observations(
+        dataframe = dataframe,
+        measurement_value_field_name = DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME,
+        method = duplicate_reduction_method,
+        timestamp_field_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+        anchor_id_field_name = DEFAULT_ANCHOR_ID_COLUMN_NAME,
+        object_id_field_name = DEFAULT_OBJECT_ID_COLUMN_NAME
+    )
+    if num_duplicates > 0:
+        print('Collapsed {} duplicate readings using {}'.format(
+            num_duplicates,
+            duplicate_reduction_method
+        ))
+    return dataframe
+
 def wide_dataframe_to_arrays(dataframe, num_anchors, measurement_value_name):
-    timestamps = np.sort(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME].unique())
-    object_ids = np.sort(dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME].unique())
+    anchor_data_column_names = ['{}{:02}'.format(DEFAULT_ANCHOR_DATA_COLUMN_NAME_PREFIX, i) for i in range(num_anchors)]
+    # Each wide row already holds the full anchor block for one timestamp and
+    # object, so the rows can be scattered straight into the cube
+    timestamp_codes, timestamps = pd.factorize(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], sort = True)
+    object_codes, object_ids = pd.factorize(dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME], sort = True)
     num_timestamps = len(timestamps)
     num_objects = len(object_ids)
-    dataframe_all = pd.DataFrame(
-        list(itertools.product(
-            timestamps,
-            object_ids
-        )),
-        columns = [
-            DEFAULT_TIMESTAMP_COLUMN_NAME,
-            DEFAULT_OBJECT_ID_COLUMN_NAME
-        ]
+    measurement_values = dataframe[anchor_data_column_names].to_numpy()
+    if measurement_values.dtype.kind != 'f':
+        measurement_values = measurement_values.astype(np.float64)
+    valid_rows = (timestamp_codes >= 0) & (object_codes >= 0)
+    timestamp_codes = timestamp_codes[valid_rows]
+    object_codes = object_codes[valid_rows]
+    measurement_values = measurement_values[valid_rows]
+    keys = timestamp_codes.astype(np.int64)*num_objects + object_codes
+    unique_keys, reversed_indices = np.unique(keys[::-1], return_index = True)
+    if len(unique_keys) < len(keys):
+        print('Collapsed {} duplicate rows keeping the latest'.format(len(keys) - len(unique_keys)))
+        latest_rows = len(keys) - 1 - reversed_indices
+        timestamp_codes = timestamp_codes[latest_rows]
+        object_codes = object_codes[latest_rows]
+        measurement_values = measurement_values[latest_rows]
+    measurement_value_array = np.full(
+        (num_timestamps, 1, num_anchors, num_objects),
+        np.nan,
+        dtype = measurement_values.dtype
     )
-    dataframe_merged = dataframe_all.merge(
-        right = dataframe,
-        how = 'left',
-        on = [
-            DEFAULT_TIMESTAMP_COLUMN_NAME,
-            DEFAULT_OBJECT_ID_COLUMN_NAME
-        ]
-    )
-    anchor_data_column_names = ['{}{:02}'.format(DEFAULT_ANCHOR_DATA_COLUMN_NAME_PREFIX, i) for i in range(num_anchors)]
-    measurement_values = dataframe_merged[anchor_data_column_names].values
-    measurement_value_array = measurement_values.reshape(
-        num_timestamps,
-        1,
-        num_objects,
-        num_anchors
-    )
-    measurement_value_array = np.swapaxes(measurement_value_array, 2, 3)
+    measurement_value_array[timestamp_codes, 0, :, object_codes] = measurement_values
     arrays = {
         'num_timestamps': num_timestamps,
         'num_anchors': num_anchors,
         'num_objects': num_objects,
-        'timestamps': timestamps,
+        'timestamps': np.asarray(timestamps),
         'anchor_ids': anchor_data_column_names,
-        'object_ids': object_ids,
+        'object_ids': np.asarray(object_ids),
         measurement_value_name: measurement_value_array
     }
     return arrays
 
-def dataframe_to_arrays_by_object(dataframe, measurement_value_name):
-    arrays_dict = {}
-    for group_name, dataframe_single_object in dataframe.groupby(DEFAULT_OBJECT_ID_COLUMN_NAME):
-        object_id = group_name
+def wide_csv_file_to_arrays(
+    directory,
+    filename,
+    timestamp_column_name,
+    anchor_data_column_names,
+    object_id_column_name,
+    measurement_value_name,
+    min_data_value = None,
+    max_data_value = None
+):
+    dataframe = wide_csv_file_to_dataframe(
+        directory = directory,
+        filename = filename,
+        timestamp_column_name = timestamp_column_name,
+        anchor_data_column_names = anchor_data_column_names,
+        object_id_column_name = object_id_column_name,
+        min_data_value = min_data_value,
+        max_data_value = max_data_value
+    )
+    return wide_dataframe_to_arrays(
+        dataframe = dataframe,
+        num_anchors = len(anchor_data_column_names),
+        measurement_value_name = measurement_value_name
+    )
+
+def dataframe_to_arrays_by_object(
+    dataframe,
+    measurement_value_name,
+    duplicate_reduction_method = 'mean',
+    lazy = False
+):
+    if duplicate_reduction_method is not None:
+        dataframe = _collapse_duplicate_observations(dataframe, duplicate_reduction_method)
+    arrays_by_object = _generate_arrays_by_object(dataframe, measurement_value_name)
+    if lazy:
+        return arrays_by_object
+    return dict(arrays_by_object)
+
+def _generate_arrays_by_object(dataframe, measurement_value_name):
+    # Keys are factorized and sorted once for the whole frame; each object's
+    # cube is then filled from its slice of the shared code arrays
+    timestamp_codes, timestamp_uniques = pd.factorize(dataframe[DEFAULT_TIMESTAMP_COLUMN_NAME], sort = True)
+    anchor_codes, anchor_uniques = pd.factorize(dataframe[DEFAULT_ANCHOR_ID_COLUMN_NAME], sort = True)
+    object_codes, object_uniques = pd.factorize(dataframe[DEFAULT_OBJECT_ID_COLUMN_NAME], sort = True)
+    measurement_values = dataframe[DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME].to_numpy()
+    if measurement_values.dtype.kind != 'f':
+        measurement_values = measurement_values.astype(np.float64)
+    valid_rows = np.flatnonzero((timestamp_codes >= 0) & (anchor_codes >= 0) & (object_codes >= 0))
+    order = valid_rows[np.lexsort((
+        timestamp_codes[valid_rows],
+        object_codes[valid_rows]
+    ))]
+    timestamp_codes = timestamp_codes[order]
+    anchor_codes = anchor_codes[order]
+    object_codes = object_codes[order]
+    measurement_values = measurement_values[order]
+    object_boundaries = np.searchsorted(object_codes, np.arange(len(object_uniques) + 1))
+    for object_code, object_id in enumerate(object_uniques):
+        object_start = object_boundaries[object_code]
+        object_end = object_boundaries[object_code + 1]
+        if object_end == object_start:
+            continue
+        object_timestamp_codes = timestamp_codes[object_start:object_end]
+        # Timestamp codes are sorted within each object, so local indices
+        # follow from counting changes
+        timestamp_changes = np.concatenate(([0], (np.diff(object_timestamp_codes) != 0).astype(np.int64)))
+        local_timestamp_indices = np.cumsum(timestamp_changes)
+        object_timestamp_uniques = object_timestamp_codes[np.concatenate(([True], timestamp_changes[1:] != 0))]
+        object_anchor_uniques, local_anchor_indices = np.unique(
+            anchor_codes[object_start:object_end],
+            return_inverse = True
+        )
+        timestamps = timestamp_uniques[object_timestamp_uniques]
         print('Processing data for object {} ({} rows spanning {} to {})...'.format(
             object_id,
-            len(dataframe_single_object),
-            dataframe_single_object[DEFAULT_TIMESTAMP_COLUMN_NAME].min().isoformat(),
-            dataframe_single_object[DEFAULT_TIMESTAMP_COLUMN_NAME].max().isoformat()))
-        arrays_dict[object_id] = dataframe_to_arrays(
-            dataframe = dataframe_single_object,
-            measurement_value_name = measurement_value_name
+            object_end - object_start,
+            timestamps[0].isoformat(),
+            timestamps[-1].isoformat()))
+        num_timestamps = len(object_timestamp_uniques)
+        num_anchors = len(object_anchor_uniques)
+        measurement_value_array = np.full(
+            (num_timestamps, 1, num_anchors, 1),
+            np.nan,
+            dtype = measurement_values.dtype
         )
-    return arrays_dict
+        measurement_value_array[local_timestamp_indices, 0, local_anchor_indices.reshape(-1), 0] = measurement_values[object_start:object_end]
+        arrays = {
+            'num_timestamps': num_timestamps,
+            'num_anchors': num_anchors,
+            'num_objects': 1,
+            'timestamps': np.asarray(timestamps),
+            'anchor_ids': np.asarray(anchor_uniques[object_anchor_uniques]),
+            'object_ids': np.asarray(object_uniques[[object_code]]),
+            measurement_value_name: measurement_value_array
+        }
+        yield object_id, arrays
+
+def arrays_to_dataframe(arrays, measurement_value_name):
+    measurement_value_array = np.asarray(arrays[measurement_value_name])[:, 0, :, :]
+    num_timestamps, num_anchors, num_objects = measurement_value_array.shape
+    timestamps = smcmodel_localize.timestamps.posix_timestamps_to_datetime_index(
+        smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps'])
+    )
+    dataframe = pd.DataFrame({
+        DEFAULT_TIMESTAMP_COLUMN_NAME: timestamps.repeat(num_anchors*num_objects),
+        DEFAULT_OBJECT_ID_COLUMN_NAME: np.tile(np.asarray(arrays['object_ids']), num_timestamps*num_anchors),
+        DEFAULT_ANCHOR_ID_COLUMN_NAME: np.tile(np.repeat(np.asarray(arrays['anchor_ids']), num_objects), num_timestamps),
+        DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME: measurement_value_array.reshape(-1)
+    })
+    dataframe = dataframe[dataframe[DEFAULT_MEASUREMENT_VALUE_COLUMN_NAME].notna()].reset_index(drop = True)
+    return dataframe
 
 # def arrays_to_observation_database(arrays, measurement_value_name):
 #     observation_structure = smcmodel_localize.model.observation_structure_generator(arrays['num_anchors'], arrays['num_objects'], measurement_value_name)
@@ -593,12 +1521,42 @@ def dataframe_to_pkl_csv_files(
     print('Writing to {}'.format(csv_path))
     dataframe.to_csv(csv_path, index = False)
 
+def dataframe_to_parquet_files(
+    dataframe,
+    directory
+):
+    print('Writing to {}'.format(directory))
+    database_connection = smcmodel_localize.database_connections.DatabaseConnectionParquet(
+        directory = directory,
+        timestamp_field_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+        object_id_field_name = DEFAULT_OBJECT_ID_COLUMN_NAME
+    )
+    database_connection.write_dataframe_object_time_series(dataframe)
+
+def parquet_files_to_dataframe(
+    directory,
+    object_ids = None,
+    start_timestamp = None,
+    end_timestamp = None
+):
+    database_connection = smcmodel_localize.database_connections.DatabaseConnectionParquet(
+        directory = directory,
+        timestamp_field_name = DEFAULT_TIMESTAMP_COLUMN_NAME,
+        object_id_field_name = DEFAULT_OBJECT_ID_COLUMN_NAME
+    )
+    dataframe = database_connection.fetch_dataframe_object_time_series(
+        start_time = start_timestamp,
+        end_time = end_timestamp,
+        object_ids = object_ids
+    )
+    return dataframe
+
 def dataframe_to_pkl_csv_files_by_object(
     dataframe,
     directory,
     filename_stem
 ):
-    for object_id, dataframe_single_object in dataframe.groupby(DEFAULT_OBJECT_ID_COLUMN_NAME):
+    for object_id, dataframe_single_object in dataframe.groupby(DEFAULT_OBJECT_ID_COLUMN_NAME, observed = True):
         extended_filename_stem = filename_stem + '_' + slugify.slugify(object_id)
         dataframe_to_pkl_csv_files(
             dataframe = dataframe_single_object,
@@ -614,14 +1572,32 @@ def arrays_to_npz_file(
     npz_path = os.path.join(
         directory, filename_stem + '.npz')
     print('Writing to {}'.format(npz_path))
+    # Timestamps and IDs are stored as plain numpy types (not pickled
+    # objects) so the files can be read back with np.load
+    arrays = dict(
+        arrays,
+        timestamps = smcmodel_localize.timestamps.posix_timestamps_to_numpy_datetimes(
+            smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps'])
+        ),
+        anchor_ids = _npz_id_array(arrays['anchor_ids']),
+        object_ids = _npz_id_array(arrays['object_ids'])
+    )
     np.savez_compressed(npz_path, **arrays)
 
+# Only object arrays (e.g., string IDs) need converting; numeric IDs keep
+# their dtype so they come back as numbers
+def _npz_id_array(ids):
+    id_array = np.asarray(ids)
+    if id_array.dtype == object:
+        id_array = id_array.astype(str)
+    return id_array
+
 def arrays_by_object_to_npz_files_by_object(
     arrays_by_object,
     directory,
     filename_stem
 ):
-    for object_id, arrays in arrays_by_object.items():
+    for object_id, arrays in _arrays_by_object_items(arrays_by_object):
         extended_filename_stem = filename_stem + '_' + slugify.slugify(object_id)
         arrays_to_npz_file(
             arrays = arrays,
@@ -629,6 +1605,34 @@ def arrays_by_object_to_npz_files_by_object(
             filename_stem = extended_filename_stem
         )
 
+def arrays_by_object_to_chunk_stores_by_object(
+    arrays_by_object,
+    directory,
+    filename_stem,
+    measurement_value_name,
+    chunk_size = 3600,
+    codec = 'none',
+    num_workers = None
+):
+    for object_id, arrays in _arrays_by_object_items(arrays_by_object):
+        extended_filename_stem = filename_stem + '_' + slugify.slugify(object_id)
+        smcmodel_localize.chunk_store.arrays_to_chunk_store(
+            arrays = arrays,
+            directory = os.path.join(directory, extended_filename_stem),
+            measurement_value_name = measurement_value_name,
+            chunk_size = chunk_size,
+            codec = codec,
+            num_workers = num_workers
+        )
+
+def _arrays_by_object_items(arrays_by_object):
+    # Accepts either a dict keyed by object ID or an iterable of
+    # (object ID, arrays) pairs such as the lazy output of
+    # dataframe_to_arrays_by_object
+    if hasattr(arrays_by_object, 'items'):
+        return arrays_by_object.items()
+    return arrays_by_object
+
 def npz_file_to_arrays(
     directory,
     filename,
@@ -642,11 +1646,117 @@ def npz_file_to_arrays(
         'num_timestamps': npz_data['num_timestamps'].item(),
         'anchor_ids': npz_data['anchor_ids'].tolist(),
         'object_ids': npz_data['object_ids'].tolist(),
-        'timestamps': datetime_conversion.to_posix_timestamps(npz_data['timestamps']),
+        'timestamps': smcmodel_localize.timestamps.to_posix_timestamps(npz_data['timestamps']),
         measurement_value_name: np.asarray(npz_data[measurement_value_name])
     }
     return data
 
+def arrays_to_cube_files(
+    arrays,
+    directory,
+    filename_stem,
+    measurement_value_name
+):
+    arrays_list_to_cube_files(
+        arrays_list = [arrays],
+        directory = directory,
+        filename_stem = filename_stem,
+        measurement_value_name = measurement_value_name
+    )
+
+def arrays_list_to_cube_files(
+    arrays_list,
+    directory,
+    filename_stem,
+    measurement_value_name
+):
+    cube_path, timestamps_path, metadata_path = _cube_file_paths(directory, filename_stem)
+    arrays_list = sorted(
+        arrays_list,
+        key = lambda arrays: smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps'])[0]
+    )
+    anchor_ids = np.sort(np.unique(np.concatenate([np.asarray(arrays['anchor_ids']) for arrays in arrays_list])))
+    object_ids = np.sort(np.unique(np.concatenate([np.asarray(arrays['object_ids']) for arrays in arrays_list])))
+    timestamps = np.concatenate([smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps']) for arrays in arrays_list])
+    if np.any(np.diff(timestamps) <= 0):
+        raise ValueError('Timestamps of the arrays to be combined must be strictly increasing and must not overlap')
+    num_timestamps = len(timestamps)
+    num_anchors = len(anchor_ids)
+    num_objects = len(object_ids)
+    print('Writing to {}'.format(cube_path))
+    # Uncompressed .npy files can be memory-mapped when they are read back in;
+    # each set of arrays is written into its own region of the cube, so only
+    # one set has to be held in memory at a time
+    measurement_value_cube = np.lib.format.open_memmap(
+        cube_path,
+        mode = 'w+',
+        dtype = np.float32,
+        shape = (num_timestamps, 1, num_anchors, num_objects)
+    )
+    timestamp_index = 0
+    for arrays in arrays_list:
+        measurement_value_array = np.asarray(arrays[measurement_value_name], dtype = np.float32)
+        anchor_indices = np.searchsorted(anchor_ids, np.asarray(arrays['anchor_ids']))
+        object_indices = np.searchsorted(object_ids, np.asarray(arrays['object_ids']))
+        next_timestamp_index = timestamp_index + measurement_value_array.shape[0]
+        measurement_value_cube[timestamp_index:next_timestamp_index] = np.nan
+        measurement_value_cube[
+            timestamp_index:next_timestamp_index,
+            :,
+            anchor_indices[:, np.newaxis],
+            object_indices[np.newaxis, :]
+        ] = measurement_value_array
+        timestamp_index = next_timestamp_index
+    measurement_value_cube.flush()
+    del measurement_value_cube
+    np.save(timestamps_path, timestamps)
+    metadata = {
+        'measurement_value_name': measurement_value_name,
+        'num_timestamps': num_timestamps,
+        'num_anchors': num_anchors,
+        'num_objects': num_objects,
+        'anchor_ids': anchor_ids.tolist(),
+        'object_ids': object_ids.tolist()
+    }
+    with open(metadata_path, 'w') as file:
+        json.dump(metadata, file)
+
+def cube_files_to_arrays(
+    directory,
+    filename_stem,
+    start_timestamp = None,
+    end_timestamp = None
+):
+    cube_path, timestamps_path, metadata_path = _cube_file_paths(directory, filename_stem)
+    with open(metadata_path, 'r') as file:
+        metadata = json.load(file)
+    timestamps = np.load(timestamps_path)
+    measurement_value_cube = np.load(cube_path, mmap_mode = 'r')
+    start_index = 0
+    end_index = len(timestamps)
+    if start_timestamp is not None:
+        start_index = np.searchsorted(timestamps, smcmodel_localize.timestamps.to_posix_timestamp(start_timestamp), side = 'left')
+    if end_timestamp is not None:
+        end_index = np.searchsorted(timestamps, smcmodel_localize.timestamps.to_posix_timestamp(end_timestamp), side = 'right')
+    # Slicing a memory-mapped array returns another memory-mapped view, so no
+    # measurement data is read from disk until it is used
+    data = {
+        'num_anchors': metadata['num_anchors'],
+        'num_objects': metadata['num_objects'],
+        'num_timestamps': end_index - start_index,
+        'anchor_ids': metadata['anchor_ids'],
+        'object_ids': metadata['object_ids'],
+        'timestamps': timestamps[start_index:end_index],
+        metadata['measurement_value_name']: measurement_value_cube[start_index:end_index]
+    }
+    return data
+
+def _cube_file_paths(directory, filename_stem):
+    cube_path = os.path.join(directory, filename_stem + '.npy')
+    timestamps_path = os.path.join(directory, filename_stem + '_timestamps.npy')
+    metadata_path = os.path.join(directory, filename_stem + '.json')
+    return cube_path, timestamps_path, metadata_path
+
 def get_object_info_from_csv_file(
     object_ids,
     directory,
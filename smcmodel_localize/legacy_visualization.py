@@ -1,12 +1,21 @@
-import datetime_conversion
+import smcmodel_localize.timestamps
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
+import pandas as pd
 from pandas.plotting import register_matplotlib_converters
+import concurrent.futures
+import functools
 import os
 
 register_matplotlib_converters()
 
+DECIMATION_METHODS = ('min_max', 'lttb')
+TOPDOWN_MODES = ('lines', 'density')
+
 def plot_positions(
     state_summary_data_destination,
     start_timestamp = None,
@@ -25,84 +34,63 @@ def plot_positions(
     output_filename_stem = None,
     output_filename_object_ids = None,
     output_filename_extension = 'png',
-    show = False
+    show = False,
+    num_workers = None,
+    decimation = None,
+    decimation_width = None,
+    time_index = None
 ):
-    state_summary_timestamps = state_summary_data_destination.timestamps
+    if decimation is not None and decimation not in DECIMATION_METHODS:
+        raise ValueError('Decimation method must be one of {} but received \'{}\''.format(
+            DECIMATION_METHODS,
+            decimation
+        ))
+    if decimation is not None and decimation_width is None:
+        decimation_width = _pixel_width(x_size_inches)
     state_summary_time_series = state_summary_data_destination.array_dict
     num_objects = state_summary_time_series['moving_object_positions_mean'].shape[2]
-    num_position_axes = state_summary_time_series['moving_object_positions_mean'].shape[3]
-    state_summary_timestamps_np = datetime_conversion.to_numpy_datetimes(state_summary_timestamps)
-    state_summary_timestamps_boolean = np.full(state_summary_timestamps_np.shape, True)
-    if start_timestamp is not None:
-        start_timestamp_np = datetime_conversion.to_numpy_datetime(start_timestamp)
-        start_timestamp_boolean = np.greater_equal(state_summary_timestamps_np, start_timestamp_np)
-        state_summmary_timestamps_boolean = np.logical_and(state_summary_timestamps_boolean, start_timestamp_boolean)
-    if end_timestamp is not None:
-        end_timestamp_np = datetime_conversion.to_numpy_datetime(end_timestamp)
-        end_timestamp_boolean = np.less_equal(state_summary_timestamps_np, end_timestamp_np)
-        state_summary_timestamps_boolean = np.logical_and(state_summary_timestamps_boolean, end_timestamp_boolean)
+    if time_index is None:
+        time_index = smcmodel_localize.timestamps.TimeIndex(state_summary_data_destination.timestamps)
+    state_summary_slice = time_index.slice(start_timestamp, end_timestamp)
     if comparison_position_data is not None:
-        if comparison_timestamp_data is None:
-            if comparison_position_data.shape[0] != state_summary_timestamps_np.shape[0]:
-                raise ValueError('Comparison data length does not match primary data length and no corresponding comparison timestamps are specified')
-            comparison_timestamp_data_np = state_summary_timestamps_np
-        else:
-            comparison_timestamp_data_np = datetime_conversion.to_numpy_datetimes(comparison_timestamp_data)
-        comparison_timestamp_data_boolean = np.full(comparison_timestamp_data_np.shape, True)
-        if start_timestamp is not None:
-            comparison_data_start_timestamp_boolean = np.greater_equal(comparison_timestamp_data_np, start_timestamp_np)
-            comparison_timestamp_data_boolean = np.logical_and(comparison_timestamp_data_boolean, comparison_data_start_timestamp_boolean)
-        if end_timestamp is not None:
-            comparison_data_end_timestamp_boolean = np.less_equal(comparison_timestamp_data_np, end_timestamp_np)
-            comparison_timestamp_data_boolean = np.logical_and(comparison_timestamp_data_boolean, comparison_data_end_timestamp_boolean)
+        comparison_time_index, comparison_slice = _comparison_time_index_slice(
+            comparison_timestamp_data,
+            comparison_position_data,
+            time_index,
+            start_timestamp,
+            end_timestamp
+        )
         if comparison_position_data_label is None:
             comparison_position_data_label = 'Comparison position data'
-    date_formatter = mdates.DateFormatter('%H:%M:%S')
-    for object_index in range(num_objects):
-        if title_object_names is not None:
-            title_string = title_object_names[object_index]
-        else:
-            title_string = 'Object {}'.format(object_index)
-        if title_addendum is not None:
-            title_string += ' ({})'.format(title_addendum)
-        fig, axes = plt.subplots(nrows = num_position_axes, ncols = 1, sharex = True)
-        for position_axis_index in range(num_position_axes):
-            if comparison_position_data is not None:
-                axes[position_axis_index].plot(
-                    comparison_timestamp_data_np[comparison_timestamp_data_boolean],
-                    comparison_position_data[comparison_timestamp_data_boolean, object_index, position_axis_index],
-                    color='orange',
-                    label = comparison_position_data_label
-                )
-            axes[position_axis_index].plot(
-                state_summary_timestamps_np[state_summary_timestamps_boolean],
-                state_summary_time_series['moving_object_positions_mean'][state_summary_timestamps_boolean, 0, object_index, position_axis_index],
-                color='blue',
-                label = 'Mean estimate'
-            )
-            axes[position_axis_index].set_xlabel('Time ({})'.format(timezone_name))
-            axes[position_axis_index].set_ylabel('{} position'.format(position_axes_names[position_axis_index]))
-            axes[position_axis_index].xaxis.set_major_formatter(date_formatter)
-        lgd = axes[0].legend(loc='upper left', bbox_to_anchor=(1.0, 1.0))
-        fig_suptitle = fig.suptitle(title_string, fontsize = 'x-large')
-        fig.autofmt_xdate()
-        fig.set_size_inches(x_size_inches, y_size_inches)
-        if save:
-            if output_filename_object_ids is not None:
-                output_filename_object_id = output_filename_object_ids[object_index]
-            else:
-                output_filename_object_id = 'obj{:02}'.format(object_index)
-            output_path = os.path.join(
-                output_directory,
-                'positions_{}_{}.{}'.format(
-                    output_filename_stem,
-                    output_filename_object_id,
-                    output_filename_extension
-                )
-            )
-            plt.savefig(output_path, bbox_extra_artists=(lgd, fig_suptitle), bbox_inches='tight')
-        if show:
-            plt.show()
+    title_strings = _title_strings(num_objects, title_object_names, title_addendum)
+    output_paths = _output_paths(
+        num_objects,
+        save,
+        output_directory,
+        'positions',
+        output_filename_stem,
+        output_filename_object_ids,
+        output_filename_extension
+    )
+    _render_objects(
+        render_function = _render_positions,
+        num_objects = num_objects,
+        num_workers = num_workers,
+        show = show,
+        timestamps_np = time_index.numpy_datetimes[state_summary_slice],
+        positions = state_summary_time_series['moving_object_positions_mean'][state_summary_slice, 0],
+        comparison_timestamps_np = comparison_time_index.numpy_datetimes[comparison_slice] if comparison_position_data is not None else None,
+        comparison_positions = comparison_position_data[comparison_slice] if comparison_position_data is not None else None,
+        comparison_position_data_label = comparison_position_data_label,
+        title_strings = title_strings,
+        output_paths = output_paths,
+        position_axes_names = position_axes_names,
+        timezone_name = timezone_name,
+        x_size_inches = x_size_inches,
+        y_size_inches = y_size_inches,
+        decimation = decimation,
+        decimation_width = decimation_width
+    )
 
 def plot_positions_topdown(
     state_summary_data_destination,
@@ -121,80 +109,90 @@ def plot_positions_topdown(
     output_filename_stem = None,
     output_filename_object_ids = None,
     output_filename_extension = 'png',
-    show = False
+    show = False,
+    num_workers = None,
+    mode = 'lines',
+    room_corners = None,
+    density_bins = 100,
+    frame_window = None,
+    frame_step = None,
+    time_index = None
     ):
-    state_summary_timestamps = state_summary_data_destination.timestamps
+    if mode not in TOPDOWN_MODES:
+        raise ValueError('Top-down plot mode must be one of {} but received \'{}\''.format(
+            TOPDOWN_MODES,
+            mode
+        ))
+    if mode == 'density' and comparison_position_data is not None:
+        raise ValueError('Comparison position data can\'t be drawn in density mode')
+    if frame_window is not None and mode != 'density':
+        raise ValueError('Animation frames are only supported in density mode')
     state_summary_time_series = state_summary_data_destination.array_dict
     num_objects = state_summary_time_series['moving_object_positions_mean'].shape[2]
-    state_summary_timestamps_np = datetime_conversion.to_numpy_datetimes(state_summary_timestamps)
-    state_summary_timestamps_boolean = np.full(state_summary_timestamps_np.shape, True)
-    if start_timestamp is not None:
-        start_timestamp_np = datetime_conversion.to_numpy_datetime(start_timestamp)
-        start_timestamp_boolean = np.greater_equal(state_summary_timestamps_np, start_timestamp_np)
-        state_summmary_timestamps_boolean = np.logical_and(state_summary_timestamps_boolean, start_timestamp_boolean)
-    if end_timestamp is not None:
-        end_timestamp_np = datetime_conversion.to_numpy_datetime(end_timestamp)
-        end_timestamp_boolean = np.less_equal(state_summary_timestamps_np, end_timestamp_np)
-        state_summary_timestamps_boolean = np.logical_and(state_summary_timestamps_boolean, end_timestamp_boolean)
+    if time_index is None:
+        time_index = smcmodel_localize.timestamps.TimeIndex(state_summary_data_destination.timestamps)
+    state_summary_slice = time_index.slice(start_timestamp, end_timestamp)
     if comparison_position_data is not None:
-        if comparison_timestamp_data is None:
-            if comparison_position_data.shape[0] != state_summary_timestamps_np.shape[0]:
-                raise ValueError('Comparison data length does not match primary data length and no corresponding comparison timestamps are specified')
-            comparison_timestamp_data_np = state_summary_timestamps_np
-        else:
-            comparison_timestamp_data_np = datetime_conversion.to_numpy_datetimes(comparison_timestamp_data)
-        comparison_timestamp_data_boolean = np.full(comparison_timestamp_data_np.shape, True)
-        if start_timestamp is not None:
-            comparison_data_start_timestamp_boolean = np.greater_equal(comparison_timestamp_data_np, start_timestamp_np)
-            comparison_timestamp_data_boolean = np.logical_and(comparison_timestamp_data_boolean, comparison_data_start_timestamp_boolean)
-        if end_timestamp is not None:
-            comparison_data_end_timestamp_boolean = np.less_equal(comparison_timestamp_data_np, end_timestamp_np)
-            comparison_timestamp_data_boolean = np.logical_and(comparison_timestamp_data_boolean, comparison_data_end_timestamp_boolean)
+        comparison_time_index, comparison_slice = _comparison_time_index_slice(
+            comparison_timestamp_data,
+            comparison_position_data,
+            time_index,
+            start_timestamp,
+            end_timestamp
+        )
         if comparison_position_data_label is None:
             comparison_position_data_label = 'Comparison position data'
-    for object_index in range(num_objects):
-        if title_object_names is not None:
-            title_string = title_object_names[object_index]
-        else:
-            title_string = 'Object {}'.format(object_index)
-        if title_addendum is not None:
-            title_string += ' ({})'.format(title_addendum)
-        fig, ax = plt.subplots()
-        if comparison_position_data is not None:
-            ax.plot(
-                comparison_position_data[comparison_timestamp_data_boolean, object_index, 0],
-                comparison_position_data[comparison_timestamp_data_boolean, object_index, 1],
-                color='orange',
-                label = comparison_position_data_label
-            )
-        ax.plot(
-            state_summary_time_series['moving_object_positions_mean'][state_summary_timestamps_boolean, 0, object_index, 0],
-            state_summary_time_series['moving_object_positions_mean'][state_summary_timestamps_boolean, 0, object_index, 1],
-            color='blue',
-            label = 'Mean estimate'
+    title_strings = _title_strings(num_objects, title_object_names, title_addendum)
+    output_paths = _output_paths(
+        num_objects,
+        save,
+        output_directory,
+        'positions_topdown',
+        output_filename_stem,
+        output_filename_object_ids,
+        output_filename_extension
+    )
+    if mode == 'density':
+        positions = state_summary_time_series['moving_object_positions_mean'][state_summary_slice, 0]
+        if room_corners is None:
+            # The density is binned over the first two coordinates, so any
+            # height coordinate is ignored
+            room_corners = [
+                np.nanmin(positions[..., :2], axis = (0, 1)).tolist(),
+                np.nanmax(positions[..., :2], axis = (0, 1)).tolist()
+            ]
+        _render_objects(
+            render_function = _render_positions_density,
+            num_objects = num_objects,
+            num_workers = num_workers,
+            show = show,
+            timestamps_posix = time_index.posix_timestamps[state_summary_slice],
+            positions = positions,
+            room_corners = room_corners,
+            density_bins = density_bins,
+            frame_window_seconds = _seconds(frame_window),
+            frame_step_seconds = _seconds(frame_step),
+            title_strings = title_strings,
+            output_paths = output_paths,
+            position_axes_names = position_axes_names,
+            x_size_inches = x_size_inches,
+            y_size_inches = y_size_inches
         )
-        lgd = ax.legend(loc='upper left', bbox_to_anchor=(1.0, 1.0))
-        ax.set_xlabel('{} position'.format(position_axes_names[0]))
-        ax.set_ylabel('{} position'.format(position_axes_names[1]))
-        ax.set_aspect('equal')
-        fig_suptitle = fig.suptitle(title_string, fontsize = 'x-large')
-        fig.set_size_inches(x_size_inches, y_size_inches)
-        if save:
-            if output_filename_object_ids is not None:
-                output_filename_object_id = output_filename_object_ids[object_index]
-            else:
-                output_filename_object_id = 'obj{:02}'.format(object_index)
-            output_path = os.path.join(
-                output_directory,
-                'positions_topdown_{}_{}.{}'.format(
-                    output_filename_stem,
-                    output_filename_object_id,
-                    output_filename_extension
-                )
-            )
-            plt.savefig(output_path, bbox_extra_artists=(lgd, fig_suptitle), bbox_inches='tight')
-        if show:
-            plt.show()
+        return
+    _render_objects(
+        render_function = _render_positions_topdown,
+        num_objects = num_objects,
+        num_workers = num_workers,
+        show = show,
+        positions = state_summary_time_series['moving_object_positions_mean'][state_summary_slice, 0],
+        comparison_positions = comparison_position_data[comparison_slice] if comparison_position_data is not None else None,
+        comparison_position_data_label = comparison_position_data_label,
+        title_strings = title_strings,
+        output_paths = output_paths,
+        position_axes_names = position_axes_names,
+        x_size_inches = x_size_inches,
+        y_size_inches = y_size_inches
+    )
 
 def plot_state_summary_timestamp_density(
     state_summary_data_destination,
@@ -209,15 +207,16 @@ def plot_state_summary_timestamp_density(
     output_directory = '.',
     output_filename_stem = None,
     output_filename_extension = 'png',
-    show = False
+    show = False,
+    time_index = None
     ):
-    state_summary_timestamps = state_summary_data_destination.timestamps
-    state_summary_time_series = state_summary_data_destination.array_dict
-    state_summary_timestamps_np = datetime_conversion.to_numpy_datetimes(state_summary_timestamps)
+    if time_index is None:
+        time_index = smcmodel_localize.timestamps.TimeIndex(state_summary_data_destination.timestamps)
+    state_summary_slice = time_index.slice(start_timestamp, end_timestamp)
     date_formatter = mdates.DateFormatter('%H:%M:%S')
-    fig, ax = plt.subplots()
+    fig, ax = _create_figure(show = show)
     ax.hist(
-        state_summary_timestamps_np,
+        time_index.numpy_datetimes[state_summary_slice],
         bins = bins,
         color = 'blue'
     )
@@ -235,9 +234,10 @@ def plot_state_summary_timestamp_density(
                 output_filename_extension
             )
         )
-        plt.savefig(output_path, bbox_extra_artists=(fig_suptitle,), bbox_inches='tight')
+        fig.savefig(output_path, bbox_extra_artists=(fig_suptitle,), bbox_inches='tight')
     if show:
         plt.show()
+    _close_figure(fig)
 
 def plot_num_samples(
     state_summary_data_destination,
@@ -251,16 +251,18 @@ def plot_num_samples(
     output_directory = '.',
     output_filename_stem = None,
     output_filename_extension = 'png',
-    show = False
+    show = False,
+    time_index = None
     ):
-    state_summary_timestamps = state_summary_data_destination.timestamps
     state_summary_time_series = state_summary_data_destination.array_dict
-    state_summary_timestamps_np = datetime_conversion.to_numpy_datetimes(state_summary_timestamps)
+    if time_index is None:
+        time_index = smcmodel_localize.timestamps.TimeIndex(state_summary_data_destination.timestamps)
+    state_summary_slice = time_index.slice(start_timestamp, end_timestamp)
     date_formatter = mdates.DateFormatter('%H:%M:%S')
-    fig, ax = plt.subplots()
+    fig, ax = _create_figure(show = show)
     ax.plot(
-        state_summary_timestamps_np[:],
-        state_summary_time_series['num_resample_indices'][:, 0],
+        time_index.numpy_datetimes[state_summary_slice],
+        state_summary_time_series['num_resample_indices'][state_summary_slice, 0],
         color='blue'
     )
     ax.set_xlabel('Time ({})'.format(timezone_name))
@@ -277,6 +279,473 @@ def plot_num_samples(
                 output_filename_extension
             )
         )
-        plt.savefig(output_path, bbox_extra_artists=(fig_suptitle,), bbox_inches='tight')
+        fig.savefig(output_path, bbox_extra_artists=(fig_suptitle,), bbox_inches='tight')
     if show:
         plt.show()
+    _close_figure(fig)
+
+def _comparison_time_index_slice(
+    comparison_timestamp_data,
+    comparison_position_data,
+    time_index,
+    start_timestamp = None,
+    end_timestamp = None
+):
+    if comparison_timestamp_data is None:
+        if comparison_position_data.shape[0] != len(time_index):
+            raise ValueError('Comparison data length does not match primary data length and no corresponding comparison timestamps are specified')
+        comparison_time_index = time_index
+    elif isinstance(comparison_timestamp_data, smcmodel_localize.timestamps.TimeIndex):
+        comparison_time_index = comparison_timestamp_data
+    else:
+        comparison_time_index = smcmodel_localize.timestamps.TimeIndex(comparison_timestamp_data)
+    return comparison_time_index, comparison_time_index.slice(start_timestamp, end_timestamp)
+
+# Per-object plots are drawn by render functions that build one figure and
+# then update its artists for each object in turn. Unless the figures are
+# being shown, they are drawn on the non-interactive Agg canvas without
+# going through pyplot, so nothing accumulates in pyplot's figure registry.
+# With num_workers, the objects are split across a process pool.
+
+def _render_objects(
+    render_function,
+    num_objects,
+    num_workers = None,
+    show = False,
+    **render_arguments
+):
+    object_indices = list(range(num_objects))
+    if num_workers is None or num_workers <= 1 or num_objects <= 1:
+        render_function(object_indices, show = show, **render_arguments)
+        return
+    if show:
+        raise ValueError('Figures can\'t be shown when rendering with multiple workers')
+    object_index_groups = [
+        object_index_group.tolist()
+        for object_index_group in np.array_split(object_indices, min(num_workers, num_objects))
+    ]
+    with concurrent.futures.ProcessPoolExecutor(max_workers = num_workers) as executor:
+        list(executor.map(
+            functools.partial(render_function, show = show, **render_arguments),
+            object_index_groups
+        ))
+
+def _render_positions(
+    object_indices,
+    timestamps_np,
+    positions,
+    comparison_timestamps_np,
+    comparison_positions,
+    comparison_position_data_label,
+    title_strings,
+    output_paths,
+    position_axes_names,
+    timezone_name,
+    x_size_inches,
+    y_size_inches,
+    decimation = None,
+    decimation_width = None,
+    show = False
+):
+    num_position_axes = positions.shape[2]
+    date_formatter = mdates.DateFormatter('%H:%M:%S')
+    fig = None
+    for object_index in object_indices:
+        comparison_series = []
+        series = []
+        for position_axis_index in range(num_position_axes):
+            if comparison_positions is not None:
+                comparison_series.append(_decimate_series(
+                    comparison_timestamps_np,
+                    comparison_positions[:, object_index, position_axis_index],
+                    decimation,
+                    decimation_width
+                ))
+            series.append(_decimate_series(
+                timestamps_np,
+                positions[:, object_index, position_axis_index],
+                decimation,
+                decimation_width
+            ))
+        if fig is None:
+            fig, axes = _create_figure(nrows = num_position_axes, ncols = 1, sharex = True, show = show)
+            comparison_lines = []
+            lines = []
+            for position_axis_index in range(num_position_axes):
+                if comparison_positions is not None:
+                    comparison_lines.append(axes[position_axis_index].plot(
+                        *comparison_series[position_axis_index],
+                        color='orange',
+                        label = comparison_position_data_label
+                    )[0])
+                lines.append(axes[position_axis_index].plot(
+                    *series[position_axis_index],
+                    color='blue',
+                    label = 'Mean estimate'
+                )[0])
+                axes[position_axis_index].set_xlabel('Time ({})'.format(timezone_name))
+                axes[position_axis_index].set_ylabel('{} position'.format(position_axes_names[position_axis_index]))
+                axes[position_axis_index].xaxis.set_major_formatter(date_formatter)
+            lgd = axes[0].legend(loc='upper left', bbox_to_anchor=(1.0, 1.0))
+            fig_suptitle = fig.suptitle(title_strings[object_index], fontsize = 'x-large')
+            fig.autofmt_xdate()
+            fig.set_size_inches(x_size_inches, y_size_inches)
+        else:
+            for position_axis_index in range(num_position_axes):
+                if comparison_positions is not None:
+                    comparison_lines[position_axis_index].set_data(*comparison_series[position_axis_index])
+                lines[position_axis_index].set_data(*series[position_axis_index])
+                axes[position_axis_index].relim()
+                axes[position_axis_index].autoscale_view()
+            fig_suptitle.set_text(title_strings[object_index])
+        if output_paths is not None:
+            fig.savefig(output_paths[object_index], bbox_extra_artists=(lgd, fig_suptitle), bbox_inches='tight')
+        if show:
+            plt.show()
+            _close_figure(fig)
+            fig = None
+    if fig is not None:
+        _close_figure(fig)
+
+def _render_positions_topdown(
+    object_indices,
+    positions,
+    comparison_positions,
+    comparison_position_data_label,
+    title_strings,
+    output_paths,
+    position_axes_names,
+    x_size_inches,
+    y_size_inches,
+    show = False
+):
+    fig = None
+    for object_index in object_indices:
+        if fig is None:
+            fig, ax = _create_figure(show = show)
+            if comparison_positions is not None:
+                comparison_line = ax.plot(
+                    comparison_positions[:, object_index, 0],
+                    comparison_positions[:, object_index, 1],
+                    color='orange',
+                    label = comparison_position_data_label
+                )[0]
+            line = ax.plot(
+                positions[:, object_index, 0],
+                positions[:, object_index, 1],
+                color='blue',
+                label = 'Mean estimate'
+            )[0]
+            lgd = ax.legend(loc='upper left', bbox_to_anchor=(1.0, 1.0))
+            ax.set_xlabel('{} position'.format(position_axes_names[0]))
+            ax.set_ylabel('{} position'.format(position_axes_names[1]))
+            ax.set_aspect('equal')
+            fig_suptitle = fig.suptitle(title_strings[object_index], fontsize = 'x-large')
+            fig.set_size_inches(x_size_inches, y_size_inches)
+        else:
+            if comparison_positions is not None:
+                comparison_line.set_data(
+                    comparison_positions[:, object_index, 0],
+                    comparison_positions[:, object_index, 1]
+                )
+            line.set_data(
+                positions[:, object_index, 0],
+                positions[:, object_index, 1]
+            )
+            ax.relim()
+            ax.autoscale_view()
+            fig_suptitle.set_text(title_strings[object_index])
+        if output_paths is not None:
+            fig.savefig(output_paths[object_index], bbox_extra_artists=(lgd, fig_suptitle), bbox_inches='tight')
+        if show:
+            plt.show()
+            _close_figure(fig)
+            fig = None
+    if fig is not None:
+        _close_figure(fig)
+
+def _render_positions_density(
+    object_indices,
+    timestamps_posix,
+    positions,
+    room_corners,
+    density_bins,
+    frame_window_seconds,
+    frame_step_seconds,
+    title_strings,
+    output_paths,
+    position_axes_names,
+    x_size_inches,
+    y_size_inches,
+    show = False
+):
+    fig = None
+    for object_index in object_indices:
+        if frame_window_seconds is None:
+            frames = [(None, None, position_density(positions[:, object_index], room_corners, density_bins))]
+        else:
+            frames = position_density_frames(
+                timestamps_posix,
+                positions[:, object_index],
+                room_corners,
+                density_bins,
+                frame_window_seconds,
+                frame_step_seconds
+            )
+        for frame_index, (frame_start, frame_end, density) in enumerate(frames):
+            if frame_start is None:
+                title_string = title_strings[object_index]
+            else:
+                title_string = '{}\n{} to {}'.format(
+                    title_strings[object_index],
+                    smcmodel_localize.timestamps.posix_timestamps_to_datetime_index([frame_start])[0].isoformat(),
+                    smcmodel_localize.timestamps.posix_timestamps_to_datetime_index([frame_end])[0].isoformat()
+                )
+            # Empty cells are masked so they show as background
+            density_masked = np.ma.masked_equal(density, 0)
+            if fig is None:
+                fig, ax = _create_figure(show = show)
+                image = ax.imshow(
+                    density_masked,
+                    origin = 'lower',
+                    extent = [room_corners[0][0], room_corners[1][0], room_corners[0][1], room_corners[1][1]],
+                    interpolation = 'nearest',
+                    aspect = 'equal'
+                )
+                colorbar = fig.colorbar(image, ax = ax, shrink = 0.6)
+                colorbar.set_label('Number of position estimates')
+                ax.set_xlabel('{} position'.format(position_axes_names[0]))
+                ax.set_ylabel('{} position'.format(position_axes_names[1]))
+                fig_suptitle = fig.suptitle(title_string, fontsize = 'x-large')
+                fig.set_size_inches(x_size_inches, y_size_inches)
+            else:
+                image.set_data(density_masked)
+                image.autoscale()
+                fig_suptitle.set_text(title_string)
+            if output_paths is not None:
+                output_path = output_paths[object_index]
+                if frame_start is not None:
+                    output_path_root, output_path_extension = os.path.splitext(output_path)
+                    output_path = '{}_{:04}{}'.format(output_path_root, frame_index, output_path_extension)
+                fig.savefig(output_path, bbox_extra_artists=(fig_suptitle,), bbox_inches='tight')
+            if show:
+                plt.show()
+                _close_figure(fig)
+                fig = None
+    if fig is not None:
+        _close_figure(fig)
+
+def position_density(positions, room_corners, bins = 100):
+    cell_indices, num_x_bins, num_y_bins = _density_cell_indices(positions, room_corners, bins)
+    counts = np.bincount(cell_indices[cell_indices >= 0], minlength = num_x_bins*num_y_bins)
+    return counts.reshape(num_y_bins, num_x_bins)
+
+def position_density_frames(
+    timestamps_posix,
+    positions,
+    room_corners,
+    bins = 100,
+    window_seconds = 600.0,
+    step_seconds = None
+):
+    # Each frame covers [frame_end - window, frame_end). The counts are kept
+    # as a running sum: points entering the window are added and points
+    # leaving it are subtracted, so each point is binned exactly once
+    if step_seconds is None:
+        step_seconds = window_seconds
+    timestamps_posix = np.asarray(timestamps_posix, dtype = np.float64)
+    cell_indices, num_x_bins, num_y_bins = _density_cell_indices(positions, room_corners, bins)
+    num_cells = num_x_bins*num_y_bins
+    if len(timestamps_posix) == 0:
+        return
+    density = np.zeros(num_cells, dtype = np.int64)
+    frame_end = timestamps_posix[0] + window_seconds
+    added_index = 0
+    removed_index = 0
+    while frame_end - window_seconds <= timestamps_posix[-1]:
+        new_added_index = int(np.searchsorted(timestamps_posix, frame_end, side = 'left'))
+        new_removed_index = int(np.searchsorted(timestamps_posix, frame_end - window_seconds, side = 'left'))
+        entering = cell_indices[added_index:new_added_index]
+        leaving = cell_indices[removed_index:new_removed_index]
+        density += np.bincount(entering[entering >= 0], minlength = num_cells)
+        density -= np.bincount(leaving[leaving >= 0], minlength = num_cells)
+        added_index = new_added_index
+        removed_index = new_removed_index
+        yield frame_end - window_seconds, frame_end, density.reshape(num_y_bins, num_x_bins).copy()
+        frame_end += step_seconds
+
+def _density_cell_indices(positions, room_corners, bins):
+    if np.ndim(bins) == 0:
+        num_x_bins = num_y_bins = int(bins)
+    else:
+        num_x_bins, num_y_bins = [int(num_bins) for num_bins in bins]
+    positions = np.asarray(positions, dtype = np.float64)
+    x_min, y_min = room_corners[0][:2]
+    x_max, y_max = room_corners[1][:2]
+    with np.errstate(invalid = 'ignore'):
+        x_bins = np.floor((positions[:, 0] - x_min)/(x_max - x_min)*num_x_bins)
+        y_bins = np.floor((positions[:, 1] - y_min)/(y_max - y_min)*num_y_bins)
+        # Points on the far edge of the room belong to the last bin
+        x_bins[positions[:, 0] == x_max] = num_x_bins - 1
+        y_bins[positions[:, 1] == y_max] = num_y_bins - 1
+        inside = (x_bins >= 0) & (x_bins < num_x_bins) & (y_bins >= 0) & (y_bins < num_y_bins)
+    cell_indices = np.full(len(positions), -1, dtype = np.int64)
+    cell_indices[inside] = y_bins[inside].astype(np.int64)*num_x_bins + x_bins[inside].astype(np.int64)
+    return cell_indices, num_x_bins, num_y_bins
+
+def _seconds(duration):
+    if duration is None:
+        return None
+    if isinstance(duration, (int, float, np.integer, np.floating)):
+        return float(duration)
+    return pd.Timedelta(duration).total_seconds()
+
+def _create_figure(nrows = 1, ncols = 1, sharex = False, show = False):
+    if show:
+        return plt.subplots(nrows = nrows, ncols = ncols, sharex = sharex)
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(nrows = nrows, ncols = ncols, sharex = sharex)
+    return fig, axes
+
+def _close_figure(fig):
+    # Figures created through pyplot have to be released from its registry;
+    # Agg figures just drop their artists
+    if hasattr(fig, 'number') and plt.fignum_exists(fig.number):
+        plt.close(fig)
+    else:
+        fig.clear()
+
+def _title_strings(num_objects, title_object_names = None, title_addendum = None):
+    title_strings = []
+    for object_index in range(num_objects):
+        if title_object_names is not None:
+            title_string = title_object_names[object_index]
+        else:
+            title_string = 'Object {}'.format(object_index)
+        if title_addendum is not None:
+            title_string += ' ({})'.format(title_addendum)
+        title_strings.append(title_string)
+    return title_strings
+
+def _output_paths(
+    num_objects,
+    save,
+    output_directory,
+    output_filename_prefix,
+    output_filename_stem,
+    output_filename_object_ids = None,
+    output_filename_extension = 'png'
+):
+    if not save:
+        return None
+    output_paths = []
+    for object_index in range(num_objects):
+        if output_filename_object_ids is not None:
+            output_filename_object_id = output_filename_object_ids[object_index]
+        else:
+            output_filename_object_id = 'obj{:02}'.format(object_index)
+        output_paths.append(os.path.join(
+            output_directory,
+            '{}_{}_{}.{}'.format(
+                output_filename_prefix,
+                output_filename_stem,
+                output_filename_object_id,
+                output_filename_extension
+            )
+        ))
+    return output_paths
+
+# Long time series are reduced to roughly one or two points per pixel column
+# before plotting. Both methods keep the first and last points and the
+# overall minimum and maximum of each series, so the plotted range is
+# unchanged. Missing values are dropped.
+
+def decimation_indices(x, y, width, method = 'min_max'):
+    x = np.asarray(x)
+    if x.dtype.kind == 'M':
+        x = x.astype('datetime64[us]').astype(np.int64)
+    x = x.astype(np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    valid_indices = np.flatnonzero(valid)
+    # The first missing sample of each gap between valid samples is kept so
+    # the plotted line still breaks there
+    gap_indices = np.flatnonzero(~valid & np.concatenate(([False], valid[:-1])))
+    if len(valid_indices) > 0:
+        gap_indices = gap_indices[gap_indices < valid_indices[-1]]
+    if method == 'min_max':
+        max_points = 2*width
+    elif method == 'lttb':
+        max_points = width
+    else:
+        raise ValueError('Decimation method must be one of {} but received \'{}\''.format(
+            DECIMATION_METHODS,
+            method
+        ))
+    if len(valid_indices) <= max(max_points, 2):
+        return np.union1d(valid_indices, gap_indices)
+    x_valid = x[valid_indices]
+    y_valid = y[valid_indices]
+    if method == 'min_max':
+        selected = _min_max_indices(x_valid, y_valid, width)
+    else:
+        selected = _lttb_indices(x_valid, y_valid, max_points)
+    selected = np.union1d(
+        selected,
+        [0, len(x_valid) - 1, np.argmin(y_valid), np.argmax(y_valid)]
+    )
+    return np.union1d(valid_indices[selected], gap_indices)
+
+def _min_max_indices(x, y, num_bins):
+    x_range = x[-1] - x[0]
+    if x_range <= 0:
+        bins = np.zeros(len(x), dtype = np.int64)
+    else:
+        bins = np.minimum(((x - x[0])/x_range*num_bins).astype(np.int64), num_bins - 1)
+    # Sorting by (bin, value) puts each bin's minimum first and maximum last
+    order = np.lexsort((y, bins))
+    sorted_bins = bins[order]
+    bin_starts = np.flatnonzero(np.concatenate(([True], sorted_bins[1:] != sorted_bins[:-1])))
+    bin_ends = np.concatenate((bin_starts[1:], [len(order)])) - 1
+    return np.concatenate((order[bin_starts], order[bin_ends]))
+
+def _lttb_indices(x, y, num_points):
+    num_buckets = num_points - 2
+    bucket_edges = np.linspace(1, len(x) - 1, num_buckets + 1).astype(np.int64)
+    selected = np.empty(num_points, dtype = np.int64)
+    selected[0] = 0
+    selected[-1] = len(x) - 1
+    previous_index = 0
+    for bucket_index in range(num_buckets):
+        bucket_start = bucket_edges[bucket_index]
+        bucket_end = bucket_edges[bucket_index + 1]
+        if bucket_index < num_buckets - 1:
+            next_start = bucket_end
+            next_end = bucket_edges[bucket_index + 2]
+            next_x = x[next_start:next_end].mean()
+            next_y = y[next_start:next_end].mean()
+        else:
+            next_x = x[-1]
+            next_y = y[-1]
+        # Pick the point forming the largest triangle with the previously
+        # selected point and the average of the next bucket
+        areas = np.abs(
+            (x[previous_index] - next_x)*(y[bucket_start:bucket_end] - y[previous_index]) -
+            (x[previous_index] - x[bucket_start:bucket_end])*(next_y - y[previous_index])
+        )
+        previous_index = bucket_start + int(np.argmax(areas))
+        selected[bucket_index + 1] = previous_index
+    return selected
+
+def _decimate_series(x, y, method = None, width = None):
+    if method is None:
+        return x, y
+    indices = decimation_indices(x, y, width, method)
+    return x[indices], y[indices]
+
+def _pixel_width(x_size_inches):
+    dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = matplotlib.rcParams['figure.dpi']
+    return int(round(x_size_inches*dpi))
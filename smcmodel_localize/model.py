@@ -1,10 +1,28 @@
 from smcmodel import SMCModelGeneralTensorflow
+from smcmodel_localize.structures import (
+    parameter_structure_generator,
+    state_structure_generator,
+    observation_structure_generator,
+    state_summary_structure_generator
+)
+import smcmodel_localize.instrumentation
 import numpy as np
+import functools
+import time
 # import tensorflow as tf
 import tensorflow.compat.v1 as tf
 tf.disable_v2_behavior()
 import tensorflow_probability as tfp
 
+# The default measurement functions are defined at module level (rather than
+# as lambdas) so models can be rebuilt from their arguments in other processes
+
+def identity_measurement_value_mean_function(distances):
+    return distances
+
+def constant_measurement_value_sd_function(distances, measurement_value_sd):
+    return measurement_value_sd
+
 class LocalizationModel(SMCModelGeneralTensorflow):
 
     def __init__(
@@ -24,11 +42,16 @@ class LocalizationModel(SMCModelGeneralTensorflow):
         reference_time_interval = 1.0,
         reference_drift = 0.1,
         minimum_drift = 0.0001,
-        measurement_value_mean_function = lambda x: x,
-        measurement_value_sd_function = lambda x: reference_drift,
+        measurement_value_mean_function = identity_measurement_value_mean_function,
+        measurement_value_sd_function = None,
         measurement_value_name = 'measurement_values',
         ping_success_rate = 1.0
     ):
+        if measurement_value_sd_function is None:
+            measurement_value_sd_function = functools.partial(
+                constant_measurement_value_sd_function,
+                measurement_value_sd = reference_drift
+            )
         if fixed_object_positions is not None and num_fixed_object_dimensions == 0:
             raise ValueError('If fixed_object_positions argument is present, num_fixed_object_dimensions argument must be > 0')
         if fixed_object_positions is None and num_fixed_object_dimensions != 0:
@@ -245,67 +268,53 @@ class LocalizationModel(SMCModelGeneralTensorflow):
         }
         return state_summary
 
-def parameter_structure_generator(num_anchors, num_objects, num_moving_object_dimensions, num_fixed_object_dimensions):
-    num_dimensions = num_moving_object_dimensions + num_fixed_object_dimensions
-    parameter_structure = {
-        'fixed_object_positions': {
-            'shape': [num_objects, num_fixed_object_dimensions],
-            'type': 'float32'
-        },
-        'anchor_positions': {
-            'shape': [num_anchors, num_dimensions],
-            'type': 'float32'
-        },
-        'reference_time_interval': {
-            'shape': [],
-            'type': 'float32'
-        },
-        'reference_drift': {
-            'shape': [],
-            'type': 'float32'
-        },
-        'ping_success_rate': {
-            'shape': [],
-            'type': 'float32'
-        }
-    }
-    return parameter_structure
-
-def state_structure_generator(num_objects, num_moving_object_dimensions):
-    state_structure = {
-        'moving_object_positions': {
-            'shape': [num_objects, num_moving_object_dimensions],
-            'type': 'float32'
-        }
-    }
-    return state_structure
-
-def observation_structure_generator(num_anchors, num_objects, measurement_value_name):
-    observation_structure = {
-        measurement_value_name: {
-            'shape': [num_anchors, num_objects],
-            'type': 'float32'
-        }
-    }
-    return observation_structure
-
-def state_summary_structure_generator(num_objects, num_moving_object_dimensions):
-    state_summary_structure = {
-        'moving_object_positions_mean': {
-            'shape': [num_objects, num_moving_object_dimensions],
-            'type': 'float32'
-        },
-        'moving_object_positions_sd': {
-            'shape': [num_objects, num_moving_object_dimensions],
-            'type': 'float32'
-        },
-        'num_resample_indices': {
-            'shape': [],
-            'type': 'int32'
-        },
-        'weights_sum': {
-            'shape': [],
-            'type': 'float32'
-        }
-    }
-    return state_summary_structure
+    # The inference loop lives in smcmodel, so when instrumentation is enabled
+    # the observation queue and state summary destination are wrapped to time
+    # reads and writes. The time before the first observation is read (graph
+    # construction and session setup) is recorded as smc_setup, and the rest,
+    # less the reads and writes, as smc_step, so the step rate doesn't depend
+    # on how long the run is
+    def estimate_state_time_series(
+        self,
+        num_samples,
+        observation_data_queue,
+        state_summary_database = None,
+        *args,
+        instrumentation = None,
+        **kwargs
+    ):
+        if instrumentation is None or not instrumentation.enabled:
+            return super().estimate_state_time_series(
+                num_samples,
+                observation_data_queue,
+                state_summary_database,
+                *args,
+                **kwargs
+            )
+        observation_data_queue = smcmodel_localize.instrumentation.InstrumentedDataSource(
+            observation_data_queue,
+            instrumentation
+        )
+        if state_summary_database is not None:
+            state_summary_database = smcmodel_localize.instrumentation.InstrumentedDataDestination(
+                state_summary_database,
+                instrumentation
+            )
+        start = time.perf_counter()
+        result = super().estimate_state_time_series(
+            num_samples,
+            observation_data_queue,
+            state_summary_database,
+            *args,
+            **kwargs
+        )
+        end = time.perf_counter()
+        steps_start = observation_data_queue.first_read_time
+        if steps_start is None:
+            steps_start = end
+        instrumentation.record('smc_setup', steps_start - start)
+        seconds = end - steps_start - observation_data_queue.read_seconds
+        if state_summary_database is not None:
+            seconds -= state_summary_database.write_seconds
+        instrumentation.record('smc_step', seconds, num_items = observation_data_queue.num_reads)
+        return result
@@ -1,6 +1,6 @@
-import smcmodel_localize.model
+import smcmodel_localize.structures
+import smcmodel_localize.instrumentation
 import numpy as np
-import scipy.optimize
 import tqdm
 
 class LocalizationModelMultilateration:
@@ -64,7 +64,7 @@ class LocalizationModelMultilateration:
         self.num_object_dimensions = num_object_dimensions
         self.fixed_object_positions = fixed_object_positions
         self.measurement_value_name = measurement_value_name
-        self.observation_structure = smcmodel_localize.model.observation_structure_generator(
+        self.observation_structure = smcmodel_localize.structures.observation_structure_generator(
             self.num_anchors,
             self.num_objects,
             self.measurement_value_name
@@ -79,8 +79,10 @@ class LocalizationModelMultilateration:
         observation_data_queue,
         state_summary_database,
         progress_bar = False,
-        num_observations = None
+        num_observations = None,
+        instrumentation = None
     ):
+        instrumentation = smcmodel_localize.instrumentation.active_instrumentation(instrumentation)
         position_guesses = self.initial_position_guesses
         if progress_bar:
             if num_observations is not None:
@@ -117,18 +119,20 @@ class LocalizationModelMultilateration:
                 )
             else:
                 initial_guesses = position_guesses
-            moving_object_positions = np.empty((self.num_objects, self.num_object_dimensions))
-            for object_index in range(self.num_objects):
-                moving_object_positions[object_index] = self.estimated_position(
-                    observation[0, :, object_index],
-                    position_guesses[object_index]
-                )
+            with instrumentation.timer('multilateration_step', num_items = 1):
+                moving_object_positions = np.empty((self.num_objects, self.num_object_dimensions))
+                for object_index in range(self.num_objects):
+                    moving_object_positions[object_index] = self.estimated_position(
+                        observation[0, :, object_index],
+                        position_guesses[object_index]
+                    )
             moving_object_positions_expanded = np.expand_dims(moving_object_positions, axis = 0)
             state_summary = {
                 'moving_object_positions_multilateration': moving_object_positions_expanded,
             }
-            state_summary_database.write_data(
-                timestamp, state_summary)
+            with instrumentation.timer('state_summary_write', num_items = 1):
+                state_summary_database.write_data(
+                    timestamp, state_summary)
             position_guesses = moving_object_positions[:, :self.num_moving_object_dimensions]
             if progress_bar:
                 t.update()
@@ -136,6 +140,8 @@ class LocalizationModelMultilateration:
             t.close()
 
     def estimated_position(self,measured_ranges, initial_guess):
+        # SciPy is slow to import, so it is loaded on first use
+        import scipy.optimize
         solution = scipy.optimize.minimize(
             fun = self.mean_squared_error,
             x0 = initial_guess,
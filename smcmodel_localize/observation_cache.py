@@ -0,0 +1,155 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import uuid
+
+CACHE_FILE_EXTENSION = '.npz'
+
+class ObservationCache:
+
+    def __init__(
+        self,
+        directory,
+        max_size_bytes = 2*1024**3
+    ):
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+
+    def key(
+        self,
+        database_connection,
+        measurement_value_field_name,
+        start_time = None,
+        end_time = None,
+        object_ids = None,
+        anchor_ids = None,
+        measurement_value_min = None,
+        measurement_value_max = None,
+        duplicate_reduction_method = 'mean'
+    ):
+        key_data = {
+            'database_connection': connection_identity(database_connection),
+            'measurement_value_field_name': measurement_value_field_name,
+            'start_time': _timestamp_key(start_time),
+            'end_time': _timestamp_key(end_time),
+            'object_ids': sorted([str(object_id) for object_id in object_ids]) if object_ids is not None else None,
+            'anchor_ids': sorted([str(anchor_id) for anchor_id in anchor_ids]) if anchor_ids is not None else None,
+            'measurement_value_min': measurement_value_min,
+            'measurement_value_max': measurement_value_max,
+            'duplicate_reduction_method': duplicate_reduction_method
+        }
+        key_string = json.dumps(key_data, sort_keys = True, default = str)
+        return hashlib.sha256(key_string.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle = False) as npz_data:
+                measurement_value_field_name = npz_data['measurement_value_field_name'].item()
+                arrays = {
+                    'timestamps': npz_data['timestamps'],
+                    'anchor_ids': npz_data['anchor_ids'].tolist(),
+                    'object_ids': npz_data['object_ids'].tolist(),
+                    measurement_value_field_name: npz_data['measurement_value_array']
+                }
+        except (OSError, ValueError, KeyError):
+            # Unreadable entries (e.g., left by an interrupted write) are
+            # treated as misses
+            self.invalidate(key)
+            return None
+        # The modification time records the last use for LRU eviction
+        os.utime(path)
+        return arrays
+
+    def put(self, key, arrays, measurement_value_field_name):
+        path = self._path(key)
+        temporary_path = os.path.join(
+            self.directory,
+            '.{}.{}.tmp{}'.format(key, uuid.uuid4().hex, CACHE_FILE_EXTENSION)
+        )
+        np.savez(
+            temporary_path,
+            measurement_value_field_name = np.asarray(measurement_value_field_name),
+            timestamps = np.asarray(arrays['timestamps'], dtype = np.float64),
+            anchor_ids = _id_array(arrays['anchor_ids']),
+            object_ids = _id_array(arrays['object_ids']),
+            measurement_value_array = np.asarray(arrays[measurement_value_field_name])
+        )
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def invalidate(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        for path, size, last_used in self._entries():
+            os.remove(path)
+
+    def size_bytes(self):
+        return sum([size for path, size, last_used in self._entries()])
+
+    def evict(self):
+        entries = sorted(self._entries(), key = lambda entry: entry[2])
+        total_size = sum([size for path, size, last_used in entries])
+        for path, size, last_used in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            os.remove(path)
+            total_size -= size
+
+    def _entries(self):
+        entries = []
+        for directory_entry in os.listdir(self.directory):
+            if directory_entry.startswith('.') or not directory_entry.endswith(CACHE_FILE_EXTENSION):
+                continue
+            path = os.path.join(self.directory, directory_entry)
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat_result.st_size, stat_result.st_mtime))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_FILE_EXTENSION)
+
+def connection_identity(database_connection):
+    if hasattr(database_connection, 'cache_identity'):
+        return database_connection.cache_identity()
+    connection_class = type(database_connection)
+    # Without an explicit identity, fall back on the class and its simple
+    # configuration attributes (object reprs would change from run to run)
+    simple_attributes = {
+        name: value
+        for name, value in sorted(vars(database_connection).items())
+        if isinstance(value, (str, int, float, bool)) or value is None
+    }
+    return '{}.{}:{}'.format(
+        connection_class.__module__,
+        connection_class.__qualname__,
+        json.dumps(simple_attributes, sort_keys = True)
+    )
+
+# String IDs usually arrive as object arrays, which can only be saved by
+# pickling, so they are stored as fixed-width unicode instead (tolist() turns
+# them back into Python strings)
+def _id_array(ids):
+    id_array = np.asarray(ids)
+    if id_array.dtype == object:
+        id_array = id_array.astype(str)
+    return id_array
+
+def _timestamp_key(timestamp):
+    if timestamp is None:
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.tz_convert('UTC').isoformat()
@@ -0,0 +1,220 @@
+import smcmodel_localize.model
+import smcmodel_localize.data_pipes
+import smcmodel_localize.timestamps
+import pandas as pd
+import numpy as np
+import concurrent.futures
+import multiprocessing
+import functools
+import pickle
+import time
+
+# A sharded run splits the observation timestamps into contiguous shards with
+# roughly equal numbers of timestamps and estimates each shard with its own
+# LocalizationModel, in parallel worker processes. Each shard also reads the
+# observations from burn_in_seconds before its start, starting from the
+# model's uniform initial sample, so the particles have converged by the time
+# they reach the shard itself. The state summaries for the burn-in periods are
+# discarded when the shards are stitched back together.
+#
+# Models are built inside the workers from model_arguments (keyword arguments
+# for LocalizationModel), so any functions passed in model_arguments must be
+# picklable (i.e., defined at module level rather than lambdas); this is
+# checked before any work starts. Workers are started with spawn, since
+# TensorFlow doesn't survive a fork.
+
+def estimate_state_time_series_sharded(
+    model_arguments,
+    observation_arrays,
+    num_samples,
+    num_shards,
+    burn_in_seconds = 60.0,
+    num_workers = None
+):
+    if num_shards < 1:
+        raise ValueError('Number of shards must be at least 1')
+    if burn_in_seconds < 0:
+        raise ValueError('Burn-in period can\'t be negative')
+    if num_workers is not None and num_workers > 1:
+        try:
+            pickle.dumps(model_arguments)
+        except (pickle.PicklingError, AttributeError, TypeError) as error:
+            raise ValueError('Model arguments must be picklable to be sent to worker processes (use functions defined at module level rather than lambdas): {}'.format(error))
+    measurement_value_field_name = model_arguments.get('measurement_value_name', 'measurement_values')
+    num_moving_object_dimensions = model_arguments.get('num_moving_object_dimensions', 2)
+    timestamps = smcmodel_localize.timestamps.to_posix_timestamps(observation_arrays['timestamps'])
+    num_timestamps = len(timestamps)
+    if num_timestamps == 0:
+        raise ValueError('No observations to estimate')
+    num_shards = min(num_shards, num_timestamps)
+    shard_start_indices = [
+        int(shard_indices[0])
+        for shard_indices in np.array_split(np.arange(num_timestamps), num_shards)
+    ]
+    shard_end_indices = shard_start_indices[1:] + [num_timestamps]
+    shards = []
+    for shard_start_index, shard_end_index in zip(shard_start_indices, shard_end_indices):
+        shard_start_timestamp = timestamps[shard_start_index]
+        burn_in_start_index = int(np.searchsorted(timestamps, shard_start_timestamp - burn_in_seconds, side = 'left'))
+        shards.append({
+            'start_index': shard_start_index,
+            'end_index': shard_end_index,
+            'burn_in_start_index': burn_in_start_index,
+            'start_timestamp': shard_start_timestamp
+        })
+    shard_observation_arrays = [
+        _slice_observation_arrays(
+            observation_arrays,
+            measurement_value_field_name,
+            shard['burn_in_start_index'],
+            shard['end_index']
+        )
+        for shard in shards
+    ]
+    estimate_shard = functools.partial(
+        _estimate_shard,
+        model_arguments,
+        measurement_value_field_name = measurement_value_field_name,
+        num_moving_object_dimensions = num_moving_object_dimensions,
+        num_samples = num_samples
+    )
+    print('Estimating {} timestamps in {} shards with {} seconds of burn-in'.format(
+        num_timestamps,
+        len(shards),
+        burn_in_seconds
+    ))
+    start = time.time()
+    if num_workers is None or num_workers <= 1 or len(shards) <= 1:
+        shard_results = [estimate_shard(arrays) for arrays in shard_observation_arrays]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers = num_workers,
+            mp_context = multiprocessing.get_context('spawn')
+        ) as executor:
+            shard_results = list(executor.map(estimate_shard, shard_observation_arrays))
+    print('Estimated {} shards in {:.1f} seconds'.format(
+        len(shards),
+        time.time() - start
+    ))
+    state_summary_data_destination = stitch_shard_state_summaries(
+        shard_results = shard_results,
+        shard_start_timestamps = [shard['start_timestamp'] for shard in shards],
+        num_objects = len(observation_arrays['object_ids']),
+        num_moving_object_dimensions = num_moving_object_dimensions
+    )
+    seam_report = shard_seam_report(
+        shard_results = shard_results,
+        shard_start_timestamps = [shard['start_timestamp'] for shard in shards],
+        object_ids = observation_arrays['object_ids']
+    )
+    return state_summary_data_destination, seam_report
+
+def stitch_shard_state_summaries(
+    shard_results,
+    shard_start_timestamps,
+    num_objects,
+    num_moving_object_dimensions
+):
+    state_summary_data_destination = smcmodel_localize.data_pipes.create_state_summary_data_destination(
+        num_objects = num_objects,
+        num_moving_object_dimensions = num_moving_object_dimensions
+    )
+    core_slices = [
+        slice(int(np.searchsorted(shard_timestamps, shard_start_timestamp, side = 'left')), None)
+        for (shard_timestamps, shard_array_dict), shard_start_timestamp in zip(shard_results, shard_start_timestamps)
+    ]
+    state_summary_data_destination.timestamps = np.concatenate([
+        shard_timestamps[core_slice]
+        for (shard_timestamps, shard_array_dict), core_slice in zip(shard_results, core_slices)
+    ])
+    for variable_name in state_summary_data_destination.array_dict.keys():
+        state_summary_data_destination.array_dict[variable_name] = np.concatenate([
+            shard_array_dict[variable_name][core_slice]
+            for (shard_timestamps, shard_array_dict), core_slice in zip(shard_results, core_slices)
+        ])
+    return state_summary_data_destination
+
+# For each seam between consecutive shards and each object, the report gives
+# the jump in the stitched position estimate across the seam and the
+# disagreement between the two shards at the last timestamp they share (the
+# end of the earlier shard, which is in the burn-in period of the later one).
+# A disagreement that is large compared to the typical jump means the burn-in
+# period is too short for the particles to converge.
+
+def shard_seam_report(
+    shard_results,
+    shard_start_timestamps,
+    object_ids
+):
+    seam_rows = []
+    for shard_index in range(1, len(shard_results)):
+        previous_timestamps, previous_array_dict = shard_results[shard_index - 1]
+        timestamps, array_dict = shard_results[shard_index]
+        seam_timestamp = shard_start_timestamps[shard_index]
+        seam_index = int(np.searchsorted(timestamps, seam_timestamp, side = 'left'))
+        previous_positions = previous_array_dict['moving_object_positions_mean'][:, 0]
+        positions = array_dict['moving_object_positions_mean'][:, 0]
+        position_jumps = np.linalg.norm(positions[seam_index] - previous_positions[-1], axis = -1)
+        if seam_index > 0 and timestamps[seam_index - 1] == previous_timestamps[-1]:
+            burn_in_disagreements = np.linalg.norm(positions[seam_index - 1] - previous_positions[-1], axis = -1)
+        else:
+            burn_in_disagreements = np.full(len(object_ids), np.nan)
+        for object_index, object_id in enumerate(object_ids):
+            seam_rows.append({
+                'seam_timestamp': seam_timestamp,
+                'object_id': object_id,
+                'position_jump': float(position_jumps[object_index]),
+                'burn_in_disagreement': float(burn_in_disagreements[object_index]),
+                'burn_in_timestamps': seam_index
+            })
+    seam_report = pd.DataFrame(
+        seam_rows,
+        columns = [
+            'seam_timestamp',
+            'object_id',
+            'position_jump',
+            'burn_in_disagreement',
+            'burn_in_timestamps'
+        ]
+    )
+    seam_report['seam_timestamp'] = smcmodel_localize.timestamps.posix_timestamps_to_datetime_index(
+        seam_report['seam_timestamp'].values
+    )
+    return seam_report
+
+def _estimate_shard(
+    model_arguments,
+    observation_arrays,
+    measurement_value_field_name,
+    num_moving_object_dimensions,
+    num_samples
+):
+    model = smcmodel_localize.model.LocalizationModel(**model_arguments)
+    observation_data_source = smcmodel_localize.data_pipes.observation_arrays_to_data_source(
+        arrays = observation_arrays,
+        measurement_value_field_name = measurement_value_field_name
+    )
+    state_summary_data_destination = smcmodel_localize.data_pipes.create_state_summary_data_destination(
+        num_objects = len(observation_arrays['object_ids']),
+        num_moving_object_dimensions = num_moving_object_dimensions
+    )
+    model.estimate_state_time_series(
+        num_samples = num_samples,
+        observation_data_queue = observation_data_source,
+        state_summary_database = state_summary_data_destination
+    )
+    return state_summary_data_destination.timestamps, state_summary_data_destination.array_dict
+
+def _slice_observation_arrays(
+    observation_arrays,
+    measurement_value_field_name,
+    start_index,
+    end_index
+):
+    shard_observation_arrays = {
+        'timestamps': smcmodel_localize.timestamps.to_posix_timestamps(observation_arrays['timestamps'][start_index:end_index]),
+        'anchor_ids': observation_arrays['anchor_ids'],
+        'object_ids': observation_arrays['object_ids'],
+        measurement_value_field_name: observation_arrays[measurement_value_field_name][start_index:end_index]
+    }
+    return shard_observation_arrays
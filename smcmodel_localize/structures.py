@@ -0,0 +1,68 @@
+# Structure generators describe the shape and type of each model variable.
+# They don't depend on TensorFlow, so data pipes and the multilateration model
+# can use them without importing the SMC model.
+
+def parameter_structure_generator(num_anchors, num_objects, num_moving_object_dimensions, num_fixed_object_dimensions):
+    num_dimensions = num_moving_object_dimensions + num_fixed_object_dimensions
+    parameter_structure = {
+        'fixed_object_positions': {
+            'shape': [num_objects, num_fixed_object_dimensions],
+            'type': 'float32'
+        },
+        'anchor_positions': {
+            'shape': [num_anchors, num_dimensions],
+            'type': 'float32'
+        },
+        'reference_time_interval': {
+            'shape': [],
+            'type': 'float32'
+        },
+        'reference_drift': {
+            'shape': [],
+            'type': 'float32'
+        },
+        'ping_success_rate': {
+            'shape': [],
+            'type': 'float32'
+        }
+    }
+    return parameter_structure
+
+def state_structure_generator(num_objects, num_moving_object_dimensions):
+    state_structure = {
+        'moving_object_positions': {
+            'shape': [num_objects, num_moving_object_dimensions],
+            'type': 'float32'
+        }
+    }
+    return state_structure
+
+def observation_structure_generator(num_anchors, num_objects, measurement_value_name):
+    observation_structure = {
+        measurement_value_name: {
+            'shape': [num_anchors, num_objects],
+            'type': 'float32'
+        }
+    }
+    return observation_structure
+
+def state_summary_structure_generator(num_objects, num_moving_object_dimensions):
+    state_summary_structure = {
+        'moving_object_positions_mean': {
+            'shape': [num_objects, num_moving_object_dimensions],
+            'type': 'float32'
+        },
+        'moving_object_positions_sd': {
+            'shape': [num_objects, num_moving_object_dimensions],
+            'type': 'float32'
+        },
+        'num_resample_indices': {
+            'shape': [],
+            'type': 'int32'
+        },
+        'weights_sum': {
+            'shape': [],
+            'type': 'float32'
+        }
+    }
+    return state_summary_structure
@@ -0,0 +1,66 @@
+import pandas as pd
+import numpy as np
+
+# Timestamps are passed between data pipes, models, and visualization as
+# float64 arrays of seconds since the Unix epoch. These functions convert to
+# and from that representation without iterating over Python datetime objects.
+# Naive datetimes are interpreted as UTC.
+
+def to_posix_timestamps(timestamps):
+    if isinstance(timestamps, (pd.Series, pd.Index, pd.api.extensions.ExtensionArray)):
+        if pd.api.types.is_numeric_dtype(timestamps.dtype):
+            return np.asarray(timestamps, dtype = np.float64)
+    else:
+        timestamps = np.asarray(timestamps)
+        if timestamps.dtype.kind in 'fiu':
+            return timestamps.astype(np.float64)
+    datetimes = pd.DatetimeIndex(pd.to_datetime(timestamps, utc = True))
+    nanoseconds = np.asarray(datetimes.tz_convert(None), dtype = 'datetime64[ns]').astype(np.int64)
+    return nanoseconds/1e9
+
+def to_posix_timestamp(timestamp):
+    if isinstance(timestamp, (int, float, np.integer, np.floating)):
+        return float(timestamp)
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.timestamp()
+
+def posix_timestamps_to_datetime_index(posix_timestamps):
+    microseconds = np.round(np.asarray(posix_timestamps, dtype = np.float64)*1e6).astype(np.int64)
+    return pd.DatetimeIndex(microseconds.astype('datetime64[us]')).tz_localize('UTC')
+
+def posix_timestamps_to_numpy_datetimes(posix_timestamps):
+    microseconds = np.round(np.asarray(posix_timestamps, dtype = np.float64)*1e6).astype(np.int64)
+    return microseconds.astype('datetime64[us]')
+
+# A time index converts a sorted set of timestamps once and then answers
+# window queries with binary search, returning a slice that selects the
+# window from any array aligned with the timestamps. Both ends of the window
+# are inclusive.
+
+class TimeIndex:
+
+    def __init__(self, timestamps):
+        self.posix_timestamps = to_posix_timestamps(timestamps)
+        if np.any(np.diff(self.posix_timestamps) < 0):
+            raise ValueError('Timestamps must be in time order to build a time index')
+        self._numpy_datetimes = None
+
+    def __len__(self):
+        return len(self.posix_timestamps)
+
+    @property
+    def numpy_datetimes(self):
+        if self._numpy_datetimes is None:
+            self._numpy_datetimes = posix_timestamps_to_numpy_datetimes(self.posix_timestamps)
+        return self._numpy_datetimes
+
+    def slice(self, start_timestamp = None, end_timestamp = None):
+        start_index = 0
+        end_index = len(self.posix_timestamps)
+        if start_timestamp is not None:
+            start_index = int(np.searchsorted(self.posix_timestamps, to_posix_timestamp(start_timestamp), side = 'left'))
+        if end_timestamp is not None:
+            end_index = int(np.searchsorted(self.posix_timestamps, to_posix_timestamp(end_timestamp), side = 'right'))
+        return slice(start_index, max(start_index, end_index))
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+import time
+
+smcmodel_data_pipes = pytest.importorskip('smcmodel.data_pipes')
+import smcmodel_localize.data_pipes
+
+STRUCTURE = {
+    'positions': {
+        'shape': [2],
+        'type': 'float32'
+    }
+}
+
+def _destination():
+    return smcmodel_data_pipes.DataDestinationArrayDict(
+        structure = STRUCTURE,
+        num_samples = 1
+    )
+
+def _write_rows(buffered_destination, timestamps):
+    for timestamp in timestamps:
+        buffered_destination.write_data(
+            timestamp,
+            {'positions': np.full((1, 2), timestamp, dtype = np.float32)}
+        )
+
+def test_close_writes_all_rows():
+    destination = _destination()
+    with smcmodel_localize.data_pipes.BufferedDataDestination(destination, batch_size = 4) as buffered_destination:
+        _write_rows(buffered_destination, np.arange(10.0))
+    np.testing.assert_array_equal(destination.timestamps, np.arange(10.0))
+    np.testing.assert_array_equal(destination.array_dict['positions'][:, 0, 0], np.arange(10.0))
+
+def test_flush_interval_flushes_idle_buffer():
+    destination = _destination()
+    buffered_destination = smcmodel_localize.data_pipes.BufferedDataDestination(
+        destination,
+        batch_size = 1000,
+        flush_interval = 0.1
+    )
+    try:
+        _write_rows(buffered_destination, [1.0, 2.0, 3.0])
+        # No further writes: the writer thread has to flush on its own
+        deadline = time.monotonic() + 2.0
+        while len(destination.timestamps) < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        np.testing.assert_array_equal(destination.timestamps, [1.0, 2.0, 3.0])
+        _write_rows(buffered_destination, [4.0])
+    finally:
+        buffered_destination.close()
+    np.testing.assert_array_equal(destination.timestamps, [1.0, 2.0, 3.0, 4.0])
+
+def test_short_flush_interval_keeps_every_row_in_order():
+    destination = _destination()
+    with smcmodel_localize.data_pipes.BufferedDataDestination(
+        destination,
+        batch_size = 7,
+        max_queue_depth = 1,
+        flush_interval = 0.0001
+    ) as buffered_destination:
+        _write_rows(buffered_destination, np.arange(2000.0))
+    np.testing.assert_array_equal(destination.timestamps, np.arange(2000.0))
@@ -0,0 +1,131 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.chunk_store
+
+NUM_TIMESTAMPS = 23
+CHUNK_SIZE = 5
+
+def _arrays(anchor_ids = ('anchor_1', 'anchor_2', 'anchor_3'), object_ids = ('tag_a', 'tag_b')):
+    random_state = np.random.RandomState(0)
+    measurement_values = random_state.uniform(-90.0, -40.0, size = (NUM_TIMESTAMPS, 1, len(anchor_ids), len(object_ids))).astype(np.float32)
+    measurement_values[random_state.uniform(size = measurement_values.shape) < 0.3] = np.nan
+    return {
+        'num_timestamps': NUM_TIMESTAMPS,
+        'num_anchors': len(anchor_ids),
+        'num_objects': len(object_ids),
+        'anchor_ids': list(anchor_ids),
+        'object_ids': list(object_ids),
+        'timestamps': 1577880000.0 + 2.0*np.arange(NUM_TIMESTAMPS),
+        'rssi': measurement_values
+    }
+
+def _codec_or_skip(codec):
+    if codec == 'lz4':
+        pytest.importorskip('lz4.frame')
+    return codec
+
+def _assert_matches_slice(arrays_read, arrays, start_index, end_index):
+    assert arrays_read['num_timestamps'] == end_index - start_index
+    assert arrays_read['anchor_ids'] == arrays['anchor_ids']
+    assert arrays_read['object_ids'] == arrays['object_ids']
+    np.testing.assert_array_equal(arrays_read['timestamps'], arrays['timestamps'][start_index:end_index])
+    assert arrays_read['rssi'].dtype == arrays['rssi'].dtype
+    np.testing.assert_array_equal(arrays_read['rssi'], arrays['rssi'][start_index:end_index])
+
+@pytest.mark.parametrize('codec', smcmodel_localize.chunk_store.CHUNK_CODECS)
+@pytest.mark.parametrize('num_workers', [None, 3])
+def test_round_trip(tmp_path, codec, num_workers):
+    arrays = _arrays()
+    smcmodel_localize.chunk_store.arrays_to_chunk_store(
+        arrays,
+        str(tmp_path),
+        'rssi',
+        chunk_size = CHUNK_SIZE,
+        codec = _codec_or_skip(codec),
+        num_workers = num_workers
+    )
+    meta = smcmodel_localize.chunk_store.read_chunk_store_meta(str(tmp_path))
+    assert meta['codec'] == codec
+    assert [(chunk['start_index'], chunk['end_index']) for chunk in meta['chunks']] == [
+        (0, 5), (5, 10), (10, 15), (15, 20), (20, 23)
+    ]
+    _assert_matches_slice(
+        smcmodel_localize.chunk_store.chunk_store_to_arrays(str(tmp_path)),
+        arrays,
+        0,
+        NUM_TIMESTAMPS
+    )
+
+@pytest.mark.parametrize('codec', smcmodel_localize.chunk_store.CHUNK_CODECS)
+@pytest.mark.parametrize('start_index, end_index', [
+    (0, 5),
+    (3, 7),
+    (4, 16),
+    (5, 10),
+    (9, 23),
+    (22, 23),
+    (7, 8)
+])
+def test_sub_ranges_match_slices(tmp_path, codec, start_index, end_index):
+    arrays = _arrays()
+    smcmodel_localize.chunk_store.arrays_to_chunk_store(
+        arrays,
+        str(tmp_path),
+        'rssi',
+        chunk_size = CHUNK_SIZE,
+        codec = _codec_or_skip(codec)
+    )
+    # Bounds are inclusive, so the end bound is the last timestamp included
+    _assert_matches_slice(
+        smcmodel_localize.chunk_store.chunk_store_to_arrays(
+            str(tmp_path),
+            start_timestamp = arrays['timestamps'][start_index],
+            end_timestamp = arrays['timestamps'][end_index - 1]
+        ),
+        arrays,
+        start_index,
+        end_index
+    )
+
+def test_sub_ranges_between_and_outside_timestamps(tmp_path):
+    arrays = _arrays()
+    smcmodel_localize.chunk_store.arrays_to_chunk_store(arrays, str(tmp_path), 'rssi', chunk_size = CHUNK_SIZE)
+    timestamps = arrays['timestamps']
+    ranges = [
+        ((timestamps[3] + timestamps[4])/2, (timestamps[11] + timestamps[12])/2, 4, 12),
+        (pd.Timestamp(timestamps[6], unit = 's', tz = 'UTC'), None, 6, NUM_TIMESTAMPS),
+        (None, timestamps[0] - 10.0, 0, 0),
+        (timestamps[-1] + 10.0, None, NUM_TIMESTAMPS, NUM_TIMESTAMPS),
+        (timestamps[10], timestamps[2], 10, 10)
+    ]
+    for start_timestamp, end_timestamp, start_index, end_index in ranges:
+        _assert_matches_slice(
+            smcmodel_localize.chunk_store.chunk_store_to_arrays(
+                str(tmp_path),
+                start_timestamp = start_timestamp,
+                end_timestamp = end_timestamp
+            ),
+            arrays,
+            start_index,
+            end_index
+        )
+
+def test_numeric_ids_round_trip(tmp_path):
+    arrays = _arrays(anchor_ids = (7, 9, 11), object_ids = (3, 12))
+    smcmodel_localize.chunk_store.arrays_to_chunk_store(arrays, str(tmp_path), 'rssi', chunk_size = CHUNK_SIZE)
+    _assert_matches_slice(
+        smcmodel_localize.chunk_store.chunk_store_to_arrays(str(tmp_path)),
+        arrays,
+        0,
+        NUM_TIMESTAMPS
+    )
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        smcmodel_localize.chunk_store.arrays_to_chunk_store(_arrays(), str(tmp_path), 'rssi', codec = 'gzip')
+    with pytest.raises(ValueError):
+        smcmodel_localize.chunk_store.arrays_to_chunk_store(_arrays(), str(tmp_path), 'rssi', chunk_size = 0)
+    with pytest.raises(ValueError):
+        smcmodel_localize.chunk_store.chunk_store_to_arrays(str(tmp_path / 'missing'))
@@ -0,0 +1,72 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.cubes
+
+def _duplicated_df():
+    return pd.DataFrame({
+        'timestamp': [1.0, 1.0, 1.0, 2.0],
+        'anchor_id': ['anchor_1', 'anchor_1', 'anchor_2', 'anchor_1'],
+        'object_id': ['tag_a', 'tag_a', 'tag_a', 'tag_a'],
+        'rssi': [-50.0, -60.0, -70.0, -80.0]
+    })
+
+def test_collapse_returns_duplicate_count(capsys):
+    dataframe, num_duplicates = smcmodel_localize.cubes.collapse_duplicate_observations(
+        dataframe = _duplicated_df(),
+        measurement_value_field_name = 'rssi',
+        method = 'mean'
+    )
+    assert num_duplicates == 1
+    assert dataframe['rssi'].tolist() == [-55.0, -70.0, -80.0]
+    assert capsys.readouterr().out == ''
+
+def test_observation_df_to_arrays_counts_and_reports_duplicates(capsys):
+    import smcmodel_localize.data_pipes
+    import smcmodel_localize.instrumentation
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation(track_memory = False)
+    arrays = smcmodel_localize.data_pipes.observation_df_to_arrays(
+        dataframe = _duplicated_df(),
+        measurement_value_field_name = 'rssi',
+        instrumentation = instrumentation
+    )
+    assert instrumentation.counters == {'duplicates_collapsed': 1}
+    assert capsys.readouterr().out == 'Collapsed 1 duplicate readings using mean\n'
+    np.testing.assert_array_equal(arrays['rssi'][:, 0, :, 0], [[-55.0, -70.0], [-80.0, np.nan]])
+
+def test_legacy_dataframe_to_arrays_reports_duplicates_once(capsys):
+    import smcmodel_localize.legacy_data_processing
+    dataframe = _duplicated_df().rename(columns = {'rssi': 'value'}).assign(
+        timestamp = lambda dataframe: pd.to_datetime(dataframe['timestamp'], unit = 's', utc = True)
+    )
+    smcmodel_localize.legacy_data_processing.dataframe_to_arrays(dataframe, 'rssi')
+    assert capsys.readouterr().out == 'Collapsed 1 duplicate readings using mean\n'
+    smcmodel_localize.legacy_data_processing.dataframe_to_arrays_by_object(dataframe, 'rssi')
+    assert capsys.readouterr().out.count('Collapsed') == 1
+
+def test_collapse_rejects_count():
+    with pytest.raises(ValueError):
+        smcmodel_localize.cubes.collapse_duplicate_observations(
+            dataframe = _duplicated_df(),
+            measurement_value_field_name = 'rssi',
+            method = 'count'
+        )
+
+def test_reduce_count_still_available():
+    dataframe, num_duplicates = smcmodel_localize.cubes.reduce_duplicate_observations(
+        dataframe = _duplicated_df(),
+        measurement_value_field_name = 'rssi',
+        method = 'count'
+    )
+    assert num_duplicates == 1
+    assert dataframe['rssi'].tolist() == [2.0, 1.0, 1.0]
+
+def test_observation_df_to_arrays_rejects_count():
+    import smcmodel_localize.data_pipes
+    with pytest.raises(ValueError):
+        smcmodel_localize.data_pipes.observation_df_to_arrays(
+            dataframe = _duplicated_df(),
+            measurement_value_field_name = 'rssi',
+            duplicate_reduction_method = 'count'
+        )
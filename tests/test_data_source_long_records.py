@@ -0,0 +1,123 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.data_pipes
+
+ANCHOR_IDS = ['anchor_1', 'anchor_2', 'anchor_3']
+OBJECT_IDS = ['tag_a', 'tag_b']
+
+def _records(num_timestamps = 6, seed = 0):
+    random_state = np.random.RandomState(seed)
+    rows = []
+    for timestamp_index in range(num_timestamps):
+        for anchor_id in ANCHOR_IDS:
+            for object_id in OBJECT_IDS:
+                # Drop some readings so each timestep has missing values
+                if random_state.uniform() < 0.7:
+                    rows.append({
+                        'timestamp': pd.Timestamp('2020-01-01T12:00:00Z') + pd.Timedelta(seconds = timestamp_index),
+                        'anchor_id': anchor_id,
+                        'object_id': object_id,
+                        'rssi': random_state.uniform(-90.0, -40.0)
+                    })
+    return pd.DataFrame(rows)
+
+class RecordBatch:
+    def __init__(self, dataframe):
+        self.dataframe = dataframe
+    def to_pandas(self):
+        return self.dataframe
+
+def _collect(data_source):
+    # The buffer is reused at every step, so each step is copied
+    return [
+        (timestamp, single_time_data['rssi'].copy(), single_time_data['rssi'])
+        for timestamp, single_time_data in data_source
+    ]
+
+def _assert_matches_arrays(steps, records):
+    arrays = smcmodel_localize.data_pipes.observation_df_to_arrays(records, 'rssi')
+    assert arrays['anchor_ids'] == ANCHOR_IDS
+    assert arrays['object_ids'] == OBJECT_IDS
+    assert [timestamp for timestamp, values, buffer in steps] == arrays['timestamps'].tolist()
+    for step_index, (timestamp, values, buffer) in enumerate(steps):
+        assert values.dtype == np.float32
+        np.testing.assert_array_equal(values, arrays['rssi'][step_index].astype(np.float32))
+
+def test_dataframe_matches_observation_arrays():
+    records = _records()
+    data_source = smcmodel_localize.data_pipes.DataSourceLongRecords(records, 'rssi')
+    assert data_source.num_timestamps == 6
+    steps = _collect(data_source)
+    _assert_matches_arrays(steps, records)
+    # Every step returns the same buffer
+    assert all(buffer is steps[0][2] for timestamp, values, buffer in steps)
+
+@pytest.mark.parametrize('wrap_batches', [False, True])
+def test_batches_straddling_timestamps_match_observation_arrays(wrap_batches):
+    records = _records()
+    # Split points fall inside timestamps, so each timestamp's records are
+    # spread over two batches, and one batch is empty
+    split_points = [0, 5, 5, 11, 14, 23, len(records)]
+    batches = [
+        records.iloc[start:end].reset_index(drop = True)
+        for start, end in zip(split_points[:-1], split_points[1:])
+    ]
+    if wrap_batches:
+        batches = [RecordBatch(batch) for batch in batches]
+    data_source = smcmodel_localize.data_pipes.DataSourceLongRecords(
+        iter(batches),
+        'rssi',
+        anchor_ids = ANCHOR_IDS,
+        object_ids = OBJECT_IDS
+    )
+    assert data_source.num_timestamps is None
+    _assert_matches_arrays(_collect(data_source), records)
+
+def test_batches_map_ids_per_batch():
+    records = _records()
+    # Batches with their own anchor and object orders (and categorical IDs
+    # with different categories) are mapped onto the specified IDs, and
+    # records for other anchors are ignored
+    first_batch = records.iloc[:12].iloc[::-1].sort_values('timestamp', kind = 'stable')
+    second_batch = records.iloc[12:].copy()
+    second_batch['anchor_id'] = second_batch['anchor_id'].astype('category')
+    second_batch['object_id'] = second_batch['object_id'].astype('category')
+    unknown_anchor_batch = pd.DataFrame({
+        'timestamp': [records['timestamp'].max()],
+        'anchor_id': ['anchor_9'],
+        'object_id': ['tag_a'],
+        'rssi': [-10.0]
+    })
+    data_source = smcmodel_localize.data_pipes.DataSourceLongRecords(
+        iter([first_batch, second_batch, unknown_anchor_batch]),
+        'rssi',
+        anchor_ids = ANCHOR_IDS,
+        object_ids = OBJECT_IDS
+    )
+    _assert_matches_arrays(_collect(data_source), records)
+
+def test_unsorted_records_raise():
+    records = _records()
+    data_source = smcmodel_localize.data_pipes.DataSourceLongRecords(
+        records.iloc[::-1].reset_index(drop = True),
+        'rssi'
+    )
+    with pytest.raises(ValueError):
+        _collect(data_source)
+    # Later batches can't go back in time either
+    late_records = records[records['timestamp'] > records['timestamp'].min()]
+    early_records = records[records['timestamp'] == records['timestamp'].min()]
+    data_source = smcmodel_localize.data_pipes.DataSourceLongRecords(
+        iter([late_records, late_records.iloc[-1:], early_records]),
+        'rssi',
+        anchor_ids = ANCHOR_IDS,
+        object_ids = OBJECT_IDS
+    )
+    with pytest.raises(ValueError):
+        _collect(data_source)
+
+def test_batches_require_ids():
+    with pytest.raises(ValueError):
+        smcmodel_localize.data_pipes.DataSourceLongRecords(iter([_records()]), 'rssi')
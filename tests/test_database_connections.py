@@ -0,0 +1,94 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.database_connections
+
+def _observation_dataframe(object_ids):
+    num_rows = 2*len(object_ids)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2020-01-01 12:00', periods = num_rows, freq = 's', tz = 'UTC'),
+        'object_id': list(object_ids)*2,
+        'anchor_id': ['anchor_{}'.format(row_index % 3) for row_index in range(num_rows)],
+        'rssi': np.linspace(-80.0, -40.0, num_rows)
+    })
+
+def _parquet_connection(tmp_path):
+    pytest.importorskip('pyarrow')
+    return smcmodel_localize.database_connections.DatabaseConnectionParquet(str(tmp_path / 'store'))
+
+def _sqlite_connection(tmp_path):
+    return smcmodel_localize.database_connections.DatabaseConnectionSQLite(str(tmp_path / 'store.db'))
+
+@pytest.mark.parametrize('object_ids', [[101, 7], ['tag_b', 'tag_a']])
+def test_parquet_round_trip_keeps_object_id_dtype_and_column_order(tmp_path, object_ids):
+    database_connection = _parquet_connection(tmp_path)
+    dataframe = _observation_dataframe(object_ids)
+    database_connection.write_dataframe_object_time_series(dataframe)
+    fetched_dataframe = database_connection.fetch_dataframe_object_time_series(object_ids = object_ids[:1])
+    assert list(fetched_dataframe.columns) == list(dataframe.columns)
+    assert fetched_dataframe['object_id'].tolist() == [object_ids[0]]*2
+    assert fetched_dataframe['object_id'].dtype.kind == dataframe['object_id'].dtype.kind
+
+@pytest.mark.parametrize('connection_function', [_parquet_connection, _sqlite_connection])
+def test_empty_fetch_has_all_columns(tmp_path, connection_function):
+    database_connection = connection_function(tmp_path)
+    dataframe = database_connection.fetch_dataframe_object_time_series(measurement_value_field_name = 'rssi')
+    assert len(dataframe) == 0
+    assert set(dataframe.columns) == {'timestamp', 'anchor_id', 'object_id', 'rssi'}
+    assert str(dataframe['timestamp'].dtype) == 'datetime64[us, UTC]'
+    assert dataframe['rssi'].dtype == np.float64
+
+def test_empty_fetch_builds_empty_arrays(tmp_path):
+    pytest.importorskip('smcmodel')
+    import smcmodel_localize.data_pipes
+    arrays = smcmodel_localize.data_pipes.fetch_observation_arrays(
+        database_connection = _sqlite_connection(tmp_path),
+        measurement_value_field_name = 'rssi'
+    )
+    assert len(arrays['timestamps']) == 0
+    assert arrays['rssi'].shape[0] == 0
+
+def test_sqlite_fetch_with_more_ids_than_bound_variables(tmp_path):
+    database_connection = _sqlite_connection(tmp_path)
+    object_ids = ['object_{:05}'.format(object_index) for object_index in range(20)]
+    database_connection.write_dataframe_object_time_series(_observation_dataframe(object_ids))
+    requested_object_ids = object_ids[::2] + ['missing_{:06}'.format(index) for index in range(300000)]
+    dataframe = database_connection.fetch_dataframe_object_time_series(
+        object_ids = requested_object_ids,
+        anchor_ids = ['anchor_0', 'anchor_1']
+    )
+    assert set(dataframe['object_id']) == set(object_ids[::2])
+    assert set(dataframe['anchor_id']) <= {'anchor_0', 'anchor_1'}
+    assert len(dataframe) > 0
+    # Temporary tables are dropped after the query
+    temporary_tables = database_connection.connection.execute('SELECT name FROM temp.sqlite_master').fetchall()
+    assert temporary_tables == []
+
+def test_parquet_object_ids_with_path_characters(tmp_path):
+    database_connection = _parquet_connection(tmp_path)
+    object_ids = ['site/tag_a', 'tag=b', '100%', '..', 'tag c']
+    database_connection.write_dataframe_object_time_series(_observation_dataframe(object_ids))
+    # Each ID gets its own partition directory inside the date directory
+    date_directory = tmp_path / 'store' / 'date=2020-01-01'
+    assert len(list(date_directory.iterdir())) == len(object_ids)
+    assert not (tmp_path / 'store' / 'date=2020-01-01' / 'object_id=site').exists()
+    dataframe = database_connection.fetch_dataframe_object_time_series()
+    assert sorted(dataframe['object_id'].unique()) == sorted(object_ids)
+    for object_id in object_ids:
+        fetched_dataframe = database_connection.fetch_dataframe_object_time_series(object_ids = [object_id])
+        assert fetched_dataframe['object_id'].tolist() == [object_id]*2
+    database_connection.delete_object_time_series_partitions([('2020-01-01', 'site/tag_a'), ('2020-01-01', 'tag=b')])
+    dataframe = database_connection.fetch_dataframe_object_time_series()
+    assert sorted(dataframe['object_id'].unique()) == sorted(['100%', '..', 'tag c'])
+
+@pytest.mark.parametrize('object_ids', [
+    ['tag_a', ''],
+    ['tag_a', None],
+    ['tag_a', smcmodel_localize.database_connections.PARTITION_NULL_FALLBACK]
+])
+def test_parquet_rejects_object_ids_that_cannot_round_trip(tmp_path, object_ids):
+    database_connection = _parquet_connection(tmp_path)
+    with pytest.raises(ValueError):
+        database_connection.write_dataframe_object_time_series(_observation_dataframe(object_ids))
+    assert not (tmp_path / 'store').exists()
@@ -0,0 +1,198 @@
+import os
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.legacy_data_processing
+import smcmodel_localize.ingestion_ledger
+import smcmodel_localize.database_connections
+
+def _write_csv(path, rows):
+    with open(path, 'w') as fp:
+        fp.write('timestamp,anchor_id,object_id,value\n')
+        for row in rows:
+            fp.write('{},{},{},{}\n'.format(*row))
+
+def _rows(day, hours, object_id, anchor_id, value_offset):
+    return [
+        ('2020-01-{:02}T{:02}:30:00Z'.format(day, hour), anchor_id, object_id, value_offset + hour)
+        for hour in hours
+    ]
+
+def _read_outputs(directory):
+    outputs = {}
+    for filename in sorted(os.listdir(directory)):
+        arrays = smcmodel_localize.legacy_data_processing.npz_file_to_arrays(
+            directory = directory,
+            filename = filename,
+            measurement_value_name = 'rssi'
+        )
+        outputs[filename] = arrays
+    return outputs
+
+def test_incremental_run_matches_full_rebuild(tmp_path):
+    input_directory = tmp_path / 'input' / 'site'
+    input_directory.mkdir(parents = True)
+    shrinking_path = str(input_directory / 'a.csv')
+    _write_csv(shrinking_path, (
+        _rows(1, range(10, 21), 'tag_a', 'anchor_1', -90.0) +
+        _rows(1, range(10, 21), 'tag_b', 'anchor_1', -80.0) +
+        _rows(2, range(10, 21), 'tag_b', 'anchor_2', -70.0)
+    ))
+    _write_csv(str(input_directory / 'b.csv'), _rows(2, range(11, 16), 'tag_b', 'anchor_1', -60.0))
+    incremental_directory = tmp_path / 'incremental'
+    incremental_directory.mkdir()
+    ledger_path = str(tmp_path / 'ledger.json')
+    arguments = {
+        'input_top_directory': str(tmp_path / 'input'),
+        'output_filename_stem': 'observations',
+        'measurement_value_name': 'rssi',
+        'start_hour': 12,
+        'end_hour': 19
+    }
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        output_directory = str(incremental_directory),
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+        **arguments
+    )
+    # The changed file loses all of tag_a and tag_b's readings on the second
+    # day, and a new file arrives
+    _write_csv(shrinking_path, (
+        _rows(1, range(10, 16), 'tag_a', 'anchor_1', -90.0) +
+        _rows(1, range(10, 21), 'tag_b', 'anchor_1', -80.0)
+    ))
+    _write_csv(str(input_directory / 'c.csv'), _rows(1, range(14, 21), 'tag_c', 'anchor_2', -50.0))
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        output_directory = str(incremental_directory),
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+        **arguments
+    )
+    full_directory = tmp_path / 'full'
+    full_directory.mkdir()
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_date_range(
+        output_directory = str(full_directory),
+        start_date = '2020-01-01',
+        end_date = '2020-01-02',
+        **arguments
+    )
+    incremental_outputs = _read_outputs(str(incremental_directory))
+    full_outputs = _read_outputs(str(full_directory))
+    assert sorted(incremental_outputs.keys()) == sorted(full_outputs.keys())
+    for filename, full_arrays in full_outputs.items():
+        incremental_arrays = incremental_outputs[filename]
+        assert incremental_arrays['anchor_ids'] == full_arrays['anchor_ids']
+        assert incremental_arrays['object_ids'] == full_arrays['object_ids']
+        np.testing.assert_array_equal(incremental_arrays['timestamps'], full_arrays['timestamps'])
+        np.testing.assert_array_equal(incremental_arrays['rssi'], full_arrays['rssi'])
+    assert 'observations_20200101_tag-a.npz' in full_outputs
+    assert full_outputs['observations_20200101_tag-a.npz']['num_timestamps'] == 4
+
+def _sqlite_connection(path):
+    return smcmodel_localize.database_connections.DatabaseConnectionSQLite(path)
+
+def _parquet_connection(path):
+    pytest.importorskip('pyarrow')
+    return smcmodel_localize.database_connections.DatabaseConnectionParquet(path)
+
+def _fetch_rows(database_connection):
+    dataframe = database_connection.fetch_dataframe_object_time_series()
+    dataframe['timestamp'] = pd.to_datetime(dataframe['timestamp'], utc = True)
+    dataframe['object_id'] = dataframe['object_id'].astype(str)
+    return sorted(
+        dataframe[['timestamp', 'anchor_id', 'object_id', 'rssi']].itertuples(index = False, name = None)
+    )
+
+@pytest.mark.parametrize('connection_function', [_sqlite_connection, _parquet_connection])
+def test_incremental_database_run_replaces_changed_files(tmp_path, connection_function):
+    input_directory = tmp_path / 'input' / 'site'
+    input_directory.mkdir(parents = True)
+    changing_path = str(input_directory / 'a.csv')
+    _write_csv(changing_path, (
+        _rows(1, range(12, 18), 'tag_a', 'anchor_1', -90.0) +
+        _rows(2, range(12, 18), 'tag_a', 'anchor_1', -85.0)
+    ))
+    _write_csv(str(input_directory / 'b.csv'), _rows(1, range(12, 18), 'tag_a', 'anchor_2', -60.0))
+    ledger_path = str(tmp_path / 'ledger.json')
+    database_connection = connection_function(str(tmp_path / 'incremental'))
+    arguments = {
+        'input_top_directory': str(tmp_path / 'input'),
+        'output_directory': None,
+        'output_filename_stem': None,
+        'measurement_value_name': 'rssi',
+        'start_hour': 12,
+        'end_hour': 19
+    }
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+        database_connection = database_connection,
+        **arguments
+    )
+    assert len(_fetch_rows(database_connection)) == 18
+    # The changed file loses its second day and two readings on the first,
+    # and one of its remaining readings changes value
+    _write_csv(changing_path, (
+        _rows(1, range(12, 15), 'tag_a', 'anchor_1', -90.0) +
+        _rows(1, [15], 'tag_a', 'anchor_1', -50.0)
+    ))
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+        database_connection = database_connection,
+        **arguments
+    )
+    full_database_connection = connection_function(str(tmp_path / 'full'))
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(str(tmp_path / 'full_ledger.json')),
+        database_connection = full_database_connection,
+        **arguments
+    )
+    incremental_rows = _fetch_rows(database_connection)
+    assert len(incremental_rows) == 10
+    assert incremental_rows == _fetch_rows(full_database_connection)
+
+def test_incremental_database_run_rejects_changed_files_without_delete(tmp_path):
+    class AppendOnlyDatabaseConnection:
+        def __init__(self):
+            self.dataframes = []
+        def write_dataframe_object_time_series(self, dataframe):
+            self.dataframes.append(dataframe)
+    input_directory = tmp_path / 'input' / 'site'
+    input_directory.mkdir(parents = True)
+    changing_path = str(input_directory / 'a.csv')
+    _write_csv(changing_path, _rows(1, range(12, 18), 'tag_a', 'anchor_1', -90.0))
+    ledger_path = str(tmp_path / 'ledger.json')
+    database_connection = AppendOnlyDatabaseConnection()
+    arguments = {
+        'input_top_directory': str(tmp_path / 'input'),
+        'output_directory': None,
+        'output_filename_stem': None,
+        'measurement_value_name': 'rssi',
+        'database_connection': database_connection
+    }
+    smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+        ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+        **arguments
+    )
+    _write_csv(changing_path, _rows(1, range(12, 15), 'tag_a', 'anchor_1', -90.0))
+    with pytest.raises(ValueError):
+        smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_incremental(
+            ledger = smcmodel_localize.ingestion_ledger.IngestionLedger(ledger_path),
+            **arguments
+        )
+    assert len(database_connection.dataframes) == 1
+
+@pytest.mark.parametrize('object_ids', [[3, 12], ['tag_a', 'tag_b'], np.array(['tag_a', 'tag_b'], dtype = object)])
+def test_npz_file_round_trips_ids(tmp_path, object_ids):
+    arrays = {
+        'timestamps': np.array([1.0, 2.0]),
+        'anchor_ids': np.array([7, 9]),
+        'object_ids': object_ids,
+        'rssi': np.arange(8.0).reshape((2, 1, 2, 2)),
+        'num_timestamps': 2,
+        'num_anchors': 2,
+        'num_objects': 2
+    }
+    smcmodel_localize.legacy_data_processing.arrays_to_npz_file(arrays, str(tmp_path), 'observations')
+    arrays_read = smcmodel_localize.legacy_data_processing.npz_file_to_arrays(str(tmp_path), 'observations.npz', 'rssi')
+    assert arrays_read['anchor_ids'] == [7, 9]
+    assert arrays_read['object_ids'] == list(object_ids)
+    assert type(arrays_read['object_ids'][0]) == type(np.asarray(object_ids).tolist()[0])
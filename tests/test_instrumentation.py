@@ -0,0 +1,120 @@
+import json
+import pytest
+import numpy as np
+
+import smcmodel_localize.instrumentation
+
+def test_report_totals_and_rates():
+    callback_stages = []
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation(
+        callback = callback_stages.append,
+        track_memory = False
+    )
+    instrumentation.record('fetch', 2.0, num_items = 100)
+    instrumentation.record('fetch', 3.0, num_items = 150)
+    instrumentation.record('cube_building', 1.0)
+    instrumentation.count('observation_cache_hits')
+    instrumentation.count('observation_cache_hits', 2)
+    report = instrumentation.report()
+    assert report['stages']['fetch']['calls'] == 2
+    assert report['stages']['fetch']['seconds'] == 5.0
+    assert report['stages']['fetch']['num_items'] == 250
+    assert report['stages']['fetch']['items_per_second'] == 50.0
+    assert report['stages']['cube_building']['num_items'] == 0
+    assert report['stages']['cube_building']['items_per_second'] == 0.0
+    assert report['counters'] == {'observation_cache_hits': 3}
+    assert report['peak_rss_bytes'] is None
+    assert [stage['stage'] for stage in callback_stages] == ['fetch', 'fetch', 'cube_building']
+    assert callback_stages[1]['num_items'] == 150
+
+def test_timer_records_items(tmp_path):
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation()
+    with instrumentation.timer('filter', num_items = 5) as timer:
+        timer.add_items(7)
+    with pytest.raises(RuntimeError):
+        with instrumentation.timer('filter'):
+            raise RuntimeError()
+    report_path = str(tmp_path / 'report.json')
+    instrumentation.write_report(report_path)
+    with open(report_path) as fp:
+        report = json.load(fp)
+    assert report['stages']['filter']['calls'] == 2
+    assert report['stages']['filter']['num_items'] == 12
+    assert report['stages']['filter']['seconds'] >= 0.0
+
+def test_null_instrumentation_is_default_and_does_nothing():
+    instrumentation = smcmodel_localize.instrumentation.active_instrumentation(None)
+    assert instrumentation is smcmodel_localize.instrumentation.NULL_INSTRUMENTATION
+    assert not instrumentation.enabled
+    with instrumentation.timer('fetch', num_items = 3) as timer:
+        timer.add_items(4)
+    instrumentation.record('fetch', 1.0)
+    instrumentation.count('observation_cache_hits')
+    assert not hasattr(instrumentation, 'stages')
+    enabled_instrumentation = smcmodel_localize.instrumentation.Instrumentation()
+    assert smcmodel_localize.instrumentation.active_instrumentation(enabled_instrumentation) is enabled_instrumentation
+
+def test_instrumented_pipes_count_reads_and_writes():
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation(track_memory = False)
+    class DataDestination:
+        def __init__(self):
+            self.timestamps = []
+        def write_data(self, timestamp, single_time_data):
+            self.timestamps.append(timestamp)
+    data_source = smcmodel_localize.instrumentation.InstrumentedDataSource(
+        [(1.0, {}), (2.0, {}), (3.0, {})],
+        instrumentation
+    )
+    data_destination = smcmodel_localize.instrumentation.InstrumentedDataDestination(
+        DataDestination(),
+        instrumentation
+    )
+    assert data_source.first_read_time is None
+    for timestamp, single_time_data in data_source:
+        data_destination.write_data(timestamp, single_time_data)
+    assert data_source.num_reads == 3
+    assert data_source.first_read_time is not None
+    assert data_destination.timestamps == [1.0, 2.0, 3.0]
+    report = instrumentation.report()
+    assert report['stages']['observation_read']['num_items'] == 3
+    assert report['stages']['state_summary_write']['num_items'] == 3
+
+def test_localization_model_records_setup_and_steps():
+    pytest.importorskip('tensorflow')
+    pytest.importorskip('smcmodel')
+    import smcmodel_localize.model
+    import smcmodel_localize.data_pipes
+    num_timestamps = 20
+    arrays = {
+        'timestamps': 1577880000.0 + np.arange(num_timestamps, dtype = np.float64),
+        'anchor_ids': ['anchor_{}'.format(anchor_index) for anchor_index in range(4)],
+        'object_ids': ['tag_a'],
+        'range': np.full((num_timestamps, 1, 4, 1), 5.0)
+    }
+    model = smcmodel_localize.model.LocalizationModel(
+        num_objects = 1,
+        measurement_value_name = 'range'
+    )
+    state_summary_data_destinations = []
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation()
+    for run_instrumentation in (None, instrumentation):
+        state_summary_data_destination = smcmodel_localize.data_pipes.create_state_summary_data_destination(
+            num_objects = 1,
+            num_moving_object_dimensions = 2
+        )
+        model.estimate_state_time_series(
+            num_samples = 10,
+            observation_data_queue = smcmodel_localize.data_pipes.observation_arrays_to_data_source(arrays, 'range'),
+            state_summary_database = state_summary_data_destination,
+            instrumentation = run_instrumentation
+        )
+        state_summary_data_destinations.append(state_summary_data_destination)
+    for state_summary_data_destination in state_summary_data_destinations:
+        assert len(state_summary_data_destination.timestamps) == num_timestamps
+    stages = instrumentation.report()['stages']
+    assert stages['smc_setup']['calls'] == 1
+    assert stages['smc_setup']['num_items'] == 0
+    assert stages['smc_step']['num_items'] == num_timestamps
+    assert stages['observation_read']['num_items'] == num_timestamps
+    assert stages['state_summary_write']['num_items'] == num_timestamps
+    assert stages['smc_step']['seconds'] >= 0.0
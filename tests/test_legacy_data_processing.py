@@ -0,0 +1,387 @@
+import os
+import pytest
+import pandas as pd
+import numpy as np
+import itertools
+
+import smcmodel_localize.legacy_data_processing
+import smcmodel_localize.timestamps
+
+def _long_df(start, num_timestamps, anchor_ids, object_ids, seed = 0, missing_fraction = 0.2, freq = '10s'):
+    random_state = np.random.RandomState(seed)
+    timestamps = pd.date_range(start, periods = num_timestamps, freq = freq, tz = 'UTC')
+    index = pd.MultiIndex.from_product(
+        [timestamps, anchor_ids, object_ids],
+        names = ['timestamp', 'anchor_id', 'object_id']
+    )
+    dataframe = index.to_frame(index = False)
+    dataframe['value'] = random_state.uniform(-90.0, -40.0, size = len(dataframe)).round(1)
+    keep = random_state.uniform(size = len(dataframe)) >= missing_fraction
+    return dataframe[keep].reset_index(drop = True)
+
+def _assert_arrays_equal(arrays, expected_arrays, measurement_value_name):
+    assert arrays['num_timestamps'] == expected_arrays['num_timestamps']
+    assert arrays['num_anchors'] == expected_arrays['num_anchors']
+    assert arrays['num_objects'] == expected_arrays['num_objects']
+    assert list(arrays['anchor_ids']) == list(expected_arrays['anchor_ids'])
+    assert list(arrays['object_ids']) == list(expected_arrays['object_ids'])
+    np.testing.assert_array_equal(
+        smcmodel_localize.timestamps.to_posix_timestamps(arrays['timestamps']),
+        smcmodel_localize.timestamps.to_posix_timestamps(expected_arrays['timestamps'])
+    )
+    np.testing.assert_allclose(
+        np.asarray(arrays[measurement_value_name], dtype = np.float64),
+        np.asarray(expected_arrays[measurement_value_name], dtype = np.float64),
+        rtol = 1e-6
+    )
+
+def test_cube_files_match_combined_arrays(tmp_path):
+    # The second day has an extra anchor and object, so the cube has to
+    # union the IDs and leave the first day's missing cells empty
+    dataframe_day_1 = _long_df('2020-01-01 12:00', 6, ['anchor_1', 'anchor_2'], ['tag_a'], seed = 1)
+    dataframe_day_2 = _long_df('2020-01-02 12:00', 5, ['anchor_1', 'anchor_2', 'anchor_3'], ['tag_a', 'tag_b'], seed = 2)
+    arrays_list = [
+        smcmodel_localize.legacy_data_processing.dataframe_to_arrays(dataframe, 'rssi')
+        for dataframe in [dataframe_day_2, dataframe_day_1]
+    ]
+    smcmodel_localize.legacy_data_processing.arrays_list_to_cube_files(
+        arrays_list = arrays_list,
+        directory = str(tmp_path),
+        filename_stem = 'cube',
+        measurement_value_name = 'rssi'
+    )
+    expected_arrays = smcmodel_localize.legacy_data_processing.dataframe_to_arrays(
+        pd.concat([dataframe_day_1, dataframe_day_2], ignore_index = True),
+        'rssi'
+    )
+    arrays = smcmodel_localize.legacy_data_processing.cube_files_to_arrays(str(tmp_path), 'cube')
+    assert isinstance(arrays['rssi'], np.memmap)
+    assert arrays['rssi'].dtype == np.float32
+    _assert_arrays_equal(arrays, expected_arrays, 'rssi')
+    timestamps = smcmodel_localize.timestamps.to_posix_timestamps(expected_arrays['timestamps'])
+    num_timestamps = len(timestamps)
+    # Window bounds are inclusive and may fall between stored timestamps
+    for start_index, end_index in [(0, 3), (4, 8), (5, num_timestamps), (num_timestamps - 1, num_timestamps)]:
+        windowed_arrays = smcmodel_localize.legacy_data_processing.cube_files_to_arrays(
+            str(tmp_path),
+            'cube',
+            start_timestamp = timestamps[start_index] - 1.0,
+            end_timestamp = timestamps[end_index - 1]
+        )
+        assert windowed_arrays['num_timestamps'] == end_index - start_index
+        np.testing.assert_array_equal(windowed_arrays['timestamps'], timestamps[start_index:end_index])
+        np.testing.assert_allclose(
+            windowed_arrays['rssi'],
+            expected_arrays['rssi'][start_index:end_index].astype(np.float64),
+            rtol = 1e-6
+        )
+    empty_arrays = smcmodel_localize.legacy_data_processing.cube_files_to_arrays(
+        str(tmp_path),
+        'cube',
+        start_timestamp = timestamps[-1] + 1.0
+    )
+    assert empty_arrays['num_timestamps'] == 0
+    assert empty_arrays['rssi'].shape == (0, 1, 3, 2)
+
+def test_single_arrays_cube_file_round_trip(tmp_path):
+    arrays = smcmodel_localize.legacy_data_processing.dataframe_to_arrays(
+        _long_df('2020-01-01 12:00', 4, ['anchor_1', 'anchor_2'], ['tag_a', 'tag_b']),
+        'rssi'
+    )
+    smcmodel_localize.legacy_data_processing.arrays_to_cube_files(arrays, str(tmp_path), 'cube', 'rssi')
+    _assert_arrays_equal(
+        smcmodel_localize.legacy_data_processing.cube_files_to_arrays(str(tmp_path), 'cube'),
+        arrays,
+        'rssi'
+    )
+
+def test_cube_files_reject_overlapping_arrays(tmp_path):
+    arrays = smcmodel_localize.legacy_data_processing.dataframe_to_arrays(
+        _long_df('2020-01-01 12:00', 4, ['anchor_1'], ['tag_a']),
+        'rssi'
+    )
+    with pytest.raises(ValueError):
+        smcmodel_localize.legacy_data_processing.arrays_list_to_cube_files(
+            arrays_list = [arrays, arrays],
+            directory = str(tmp_path),
+            filename_stem = 'cube',
+            measurement_value_name = 'rssi'
+        )
+
+def _wide_df(num_timestamps, object_ids, num_anchors, seed = 0):
+    random_state = np.random.RandomState(seed)
+    timestamps = pd.date_range('2020-01-01 12:00', periods = num_timestamps, freq = '10s', tz = 'UTC')
+    index = pd.MultiIndex.from_product([timestamps, object_ids], names = ['timestamp', 'object_id'])
+    dataframe = index.to_frame(index = False)
+    for anchor_index in range(num_anchors):
+        values = random_state.uniform(-90.0, -40.0, size = len(dataframe)).round(1)
+        values[random_state.uniform(size = len(dataframe)) < 0.3] = np.nan
+        dataframe['anchor_{:02}'.format(anchor_index)] = values
+    # Drop some (timestamp, object) rows entirely and shuffle the rest
+    keep = random_state.uniform(size = len(dataframe)) >= 0.2
+    return dataframe[keep].sample(frac = 1.0, random_state = random_state).reset_index(drop = True)
+
+# The merge-and-reshape conversion that wide_dataframe_to_arrays replaced;
+# it only handles frames without repeated (timestamp, object) rows
+def _baseline_wide_dataframe_to_arrays(dataframe, num_anchors, measurement_value_name):
+    timestamps = np.sort(dataframe['timestamp'].unique())
+    object_ids = np.sort(dataframe['object_id'].unique())
+    dataframe_all = pd.DataFrame(
+        list(itertools.product(timestamps, object_ids)),
+        columns = ['timestamp', 'object_id']
+    )
+    dataframe_merged = dataframe_all.merge(right = dataframe, how = 'left', on = ['timestamp', 'object_id'])
+    anchor_data_column_names = ['anchor_{:02}'.format(i) for i in range(num_anchors)]
+    measurement_values = dataframe_merged[anchor_data_column_names].values
+    measurement_value_array = measurement_values.reshape(len(timestamps), 1, len(object_ids), num_anchors)
+    return {
+        'num_timestamps': len(timestamps),
+        'num_anchors': num_anchors,
+        'num_objects': len(object_ids),
+        'timestamps': timestamps,
+        'anchor_ids': anchor_data_column_names,
+        'object_ids': object_ids,
+        measurement_value_name: np.swapaxes(measurement_value_array, 2, 3)
+    }
+
+def test_wide_dataframe_to_arrays_matches_baseline():
+    dataframe = _wide_df(12, ['tag_a', 'tag_b', 'tag_c'], 4)
+    _assert_arrays_equal(
+        smcmodel_localize.legacy_data_processing.wide_dataframe_to_arrays(dataframe, 4, 'rssi'),
+        _baseline_wide_dataframe_to_arrays(dataframe, 4, 'rssi'),
+        'rssi'
+    )
+
+def test_wide_dataframe_to_arrays_keeps_latest_repeated_row(capsys):
+    dataframe = _wide_df(6, ['tag_a', 'tag_b'], 3, seed = 1)
+    repeated_rows = dataframe.iloc[[0, 2]].copy()
+    repeated_rows[['anchor_00', 'anchor_01', 'anchor_02']] = [[-10.0, np.nan, -11.0], [-12.0, -13.0, np.nan]]
+    dataframe_repeated = pd.concat([dataframe, repeated_rows], ignore_index = True)
+    arrays = smcmodel_localize.legacy_data_processing.wide_dataframe_to_arrays(dataframe_repeated, 3, 'rssi')
+    assert capsys.readouterr().out == 'Collapsed 2 duplicate rows keeping the latest\n'
+    # The result equals the baseline run on the frame with the earlier copies
+    # of the repeated rows removed
+    expected_arrays = _baseline_wide_dataframe_to_arrays(
+        dataframe_repeated.drop(index = [0, 2]),
+        3,
+        'rssi'
+    )
+    _assert_arrays_equal(arrays, expected_arrays, 'rssi')
+
+def test_wide_csv_file_to_arrays_matches_dataframe_path(tmp_path):
+    dataframe = _wide_df(10, ['tag_a', 'tag_b'], 3, seed = 2).rename(columns = {
+        'timestamp': 'time',
+        'object_id': 'tag',
+        'anchor_00': 'a1',
+        'anchor_01': 'a2',
+        'anchor_02': 'a3'
+    })
+    dataframe.to_csv(tmp_path / 'wide.csv', index = False)
+    arguments = dict(
+        directory = str(tmp_path),
+        filename = 'wide.csv',
+        timestamp_column_name = 'time',
+        anchor_data_column_names = ['a1', 'a2', 'a3'],
+        object_id_column_name = 'tag',
+        min_data_value = -85.0
+    )
+    arrays = smcmodel_localize.legacy_data_processing.wide_csv_file_to_arrays(
+        measurement_value_name = 'rssi',
+        **arguments
+    )
+    expected_arrays = _baseline_wide_dataframe_to_arrays(
+        smcmodel_localize.legacy_data_processing.wide_csv_file_to_dataframe(**arguments),
+        3,
+        'rssi'
+    )
+    _assert_arrays_equal(arrays, expected_arrays, 'rssi')
+    assert np.nanmin(arrays['rssi']) > -85.0
+
+def _by_object_df():
+    dataframe = pd.concat([
+        _long_df('2020-01-01 12:00', 8, ['anchor_1', 'anchor_2', 'anchor_3'], ['tag_a', 'tag_b'], seed = 3),
+        # This object is only seen by two anchors over a shorter span
+        _long_df('2020-01-01 12:00:30', 4, ['anchor_2', 'anchor_3'], ['tag_c'], seed = 4)
+    ])
+    # Repeated readings that the duplicate reduction has to collapse
+    dataframe = pd.concat([dataframe, dataframe.iloc[[1, 5, -1]].assign(value = -30.0)])
+    return dataframe.sample(frac = 1.0, random_state = 5).reset_index(drop = True)
+
+def test_dataframe_to_arrays_by_object_matches_per_object_arrays():
+    dataframe = _by_object_df()
+    arrays_by_object = smcmodel_localize.legacy_data_processing.dataframe_to_arrays_by_object(dataframe, 'rssi')
+    assert list(arrays_by_object.keys()) == ['tag_a', 'tag_b', 'tag_c']
+    # The baseline splits the frame with groupby and converts each object's
+    # rows separately
+    for object_id, dataframe_single_object in dataframe.groupby('object_id', observed = True):
+        _assert_arrays_equal(
+            arrays_by_object[object_id],
+            smcmodel_localize.legacy_data_processing.dataframe_to_arrays(dataframe_single_object, 'rssi'),
+            'rssi'
+        )
+
+def test_dataframe_to_arrays_by_object_lazy_matches_eager(capsys):
+    dataframe = _by_object_df()
+    arrays_by_object = smcmodel_localize.legacy_data_processing.dataframe_to_arrays_by_object(dataframe, 'rssi')
+    arrays_by_object_lazy = smcmodel_localize.legacy_data_processing.dataframe_to_arrays_by_object(
+        dataframe,
+        'rssi',
+        lazy = True
+    )
+    assert not isinstance(arrays_by_object_lazy, dict)
+    capsys.readouterr()
+    object_id, arrays = next(arrays_by_object_lazy)
+    # Later objects are not converted until they are asked for
+    assert capsys.readouterr().out.count('Processing data for object') == 1
+    object_ids = [object_id]
+    _assert_arrays_equal(arrays, arrays_by_object[object_id], 'rssi')
+    for object_id, arrays in arrays_by_object_lazy:
+        object_ids.append(object_id)
+        _assert_arrays_equal(arrays, arrays_by_object[object_id], 'rssi')
+    assert object_ids == list(arrays_by_object.keys())
+
+def _write_long_csv(path, dataframe):
+    dataframe.assign(
+        timestamp = dataframe['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    ).to_csv(path, index = False)
+
+def _read_npz_outputs(directory):
+    return {
+        filename: smcmodel_localize.legacy_data_processing.npz_file_to_arrays(directory, filename, 'rssi')
+        for filename in sorted(os.listdir(directory))
+    }
+
+def test_date_range_matches_one_day_builder(tmp_path, capsys):
+    # Local days in Chicago run from 18:00 to 01:00 UTC for the 12:00 to
+    # 19:00 window, so some rows for each day fall on the next UTC date. The
+    # second day has no data at all.
+    input_directory = tmp_path / 'input' / 'site'
+    input_directory.mkdir(parents = True)
+    _write_long_csv(
+        str(input_directory / 'a.csv'),
+        _long_df('2020-01-01 15:30', 13*6, ['anchor_1', 'anchor_2'], ['tag_a', 'tag_b'], seed = 6, freq = '10min')
+    )
+    _write_long_csv(
+        str(input_directory / 'b.csv'),
+        _long_df('2020-01-03 16:30', 11*6, ['anchor_2', 'anchor_3'], ['tag_b', 'tag_c'], seed = 7, freq = '10min')
+    )
+    arguments = {
+        'input_top_directory': str(tmp_path / 'input'),
+        'output_filename_stem': 'observations',
+        'measurement_value_name': 'rssi',
+        'start_hour': 12,
+        'end_hour': 19,
+        'tz': 'America/Chicago'
+    }
+    one_day_directory = tmp_path / 'one_day'
+    one_day_directory.mkdir()
+    capsys.readouterr()
+    for day in [1, 2, 3]:
+        smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_one_day(
+            output_directory = str(one_day_directory),
+            year = 2020,
+            month = 1,
+            day = day,
+            **arguments
+        )
+    assert 'No observations for 2020-01-02' in capsys.readouterr().out
+    date_range_directory = tmp_path / 'date_range'
+    date_range_directory.mkdir()
+    summary = smcmodel_localize.legacy_data_processing.csv_directories_to_npz_files_by_object_date_range(
+        output_directory = str(date_range_directory),
+        start_date = '2020-01-01',
+        end_date = '2020-01-03',
+        num_day_workers = 2,
+        **arguments
+    )
+    assert 'No observations for 2020-01-02' in capsys.readouterr().out
+    assert summary['num_rows'].tolist()[1] == 0
+    assert summary['num_objects'].tolist() == [2, 0, 2]
+    one_day_outputs = _read_npz_outputs(str(one_day_directory))
+    date_range_outputs = _read_npz_outputs(str(date_range_directory))
+    assert list(date_range_outputs.keys()) == [
+        'observations_20200101_tag-a.npz',
+        'observations_20200101_tag-b.npz',
+        'observations_20200103_tag-b.npz',
+        'observations_20200103_tag-c.npz'
+    ]
+    assert list(one_day_outputs.keys()) == list(date_range_outputs.keys())
+    for filename, arrays in date_range_outputs.items():
+        _assert_arrays_equal(arrays, one_day_outputs[filename], 'rssi')
+
+def _write_wide_csv(path):
+    dataframe = _wide_df(15, ['tag_a', 'tag_b'], 3, seed = 8).rename(columns = {
+        'anchor_00': 'a1',
+        'anchor_01': 'a2',
+        'anchor_02': 'a3'
+    })
+    dataframe.to_csv(path, index = False)
+
+# The whole-file melt that the streaming conversion replaced
+def _baseline_long_dataframe(path, id_column_names, data_column_names, new_id_values):
+    dataframe = pd.read_csv(path, dtype = str)
+    dataframe.rename(mapper = dict(zip(data_column_names, new_id_values)), axis = 'columns', inplace = True)
+    dataframe_long = pd.melt(
+        dataframe,
+        id_vars = id_column_names,
+        value_vars = new_id_values,
+        var_name = 'anchor_id',
+        value_name = 'rssi'
+    )
+    return dataframe_long.dropna(axis = 0, subset = ['rssi'])
+
+def _sorted_rows(dataframe):
+    return dataframe.astype(str).sort_values(list(dataframe.columns)).reset_index(drop = True)
+
+@pytest.mark.parametrize('compression, extension', [(None, ''), ('gzip', '.gz'), ('bz2', '.bz2'), ('xz', '.xz')])
+def test_wide_csv_file_to_long_csv_file_matches_baseline(tmp_path, compression, extension):
+    _write_wide_csv(str(tmp_path / 'wide.csv'))
+    smcmodel_localize.legacy_data_processing.wide_csv_file_to_long_csv_file(
+        directory = str(tmp_path),
+        filename = 'wide.csv',
+        id_column_names = ['timestamp', 'object_id'],
+        data_column_names = ['a1', 'a2', 'a3'],
+        new_id_column_name = 'anchor_id',
+        new_data_column_name = 'rssi',
+        new_id_values = ['anchor_1', 'anchor_2', 'anchor_3'],
+        output_directory = str(tmp_path),
+        chunk_size = 7,
+        compression = compression
+    )
+    assert sorted(os.listdir(str(tmp_path))) == ['long_wide.csv' + extension, 'wide.csv']
+    dataframe_long = pd.read_csv(str(tmp_path / ('long_wide.csv' + extension)), dtype = str)
+    expected_dataframe_long = _baseline_long_dataframe(
+        str(tmp_path / 'wide.csv'),
+        ['timestamp', 'object_id'],
+        ['a1', 'a2', 'a3'],
+        ['anchor_1', 'anchor_2', 'anchor_3']
+    )
+    assert list(dataframe_long.columns) == ['timestamp', 'object_id', 'anchor_id', 'rssi']
+    pd.testing.assert_frame_equal(_sorted_rows(dataframe_long), _sorted_rows(expected_dataframe_long))
+
+def test_failed_wide_csv_file_to_long_csv_file_leaves_no_output(tmp_path, monkeypatch):
+    _write_wide_csv(str(tmp_path / 'wide.csv'))
+    output_directory = tmp_path / 'output'
+    output_directory.mkdir()
+    melt = pd.melt
+    num_calls = []
+    def failing_melt(*args, **kwargs):
+        num_calls.append(1)
+        if len(num_calls) == 3:
+            raise RuntimeError('Simulated failure')
+        return melt(*args, **kwargs)
+    monkeypatch.setattr(pd, 'melt', failing_melt)
+    with pytest.raises(RuntimeError):
+        smcmodel_localize.legacy_data_processing.wide_csv_file_to_long_csv_file(
+            directory = str(tmp_path),
+            filename = 'wide.csv',
+            id_column_names = ['timestamp', 'object_id'],
+            data_column_names = ['a1', 'a2', 'a3'],
+            new_id_column_name = 'anchor_id',
+            new_data_column_name = 'rssi',
+            output_directory = str(output_directory),
+            chunk_size = 7
+        )
+    # The first two chunks were written before the failure, but neither the
+    # output file nor the temporary file is left behind
+    assert os.listdir(str(output_directory)) == []
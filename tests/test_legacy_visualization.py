@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+
+import smcmodel_localize.legacy_visualization
+
+@pytest.mark.parametrize('method', ['min_max', 'lttb'])
+def test_decimation_keeps_gaps(method):
+    x = np.arange(10000.0)
+    y = np.sin(x/100.0)
+    y[:10] = np.nan
+    y[3000:3500] = np.nan
+    y[7000] = np.nan
+    y[-5:] = np.nan
+    indices = smcmodel_localize.legacy_visualization.decimation_indices(x, y, 100, method)
+    assert len(indices) < 300
+    assert np.all(np.diff(indices) > 0)
+    # One break is kept for each interior gap, but none at the ends
+    assert indices[np.isnan(y[indices])].tolist() == [3000, 7000]
+
+def test_decimation_keeps_gaps_without_decimating():
+    y = np.array([1.0, np.nan, np.nan, 2.0, 3.0, np.nan])
+    indices = smcmodel_localize.legacy_visualization.decimation_indices(np.arange(6.0), y, 100)
+    assert indices.tolist() == [0, 1, 3, 4]
+
+def test_density_plot_defaults_room_corners_for_3d_positions(tmp_path):
+    class StateSummaryDataDestination:
+        pass
+    random_state = np.random.RandomState(0)
+    state_summary_data_destination = StateSummaryDataDestination()
+    state_summary_data_destination.timestamps = 1577836800.0 + np.arange(50.0)
+    state_summary_data_destination.array_dict = {
+        'moving_object_positions_mean': random_state.uniform(0.0, 5.0, size = (50, 1, 2, 3))
+    }
+    smcmodel_localize.legacy_visualization.plot_positions_topdown(
+        state_summary_data_destination,
+        output_directory = str(tmp_path),
+        output_filename_stem = 'positions',
+        mode = 'density',
+        density_bins = 10
+    )
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_position_density_accepts_3d_room_corners():
+    positions = np.array([[0.5, 0.5, 1.0], [1.5, 0.5, 2.0], [1.5, 1.5, 0.0]])
+    density = smcmodel_localize.legacy_visualization.position_density(
+        positions,
+        [[0.0, 0.0, 0.0], [2.0, 2.0, 3.0]],
+        bins = 2
+    )
+    assert density.tolist() == [[1, 1], [0, 1]]
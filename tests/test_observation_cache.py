@@ -0,0 +1,65 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.observation_cache
+import smcmodel_localize.database_connections
+
+def _arrays(anchor_ids, object_ids):
+    return {
+        'timestamps': np.array([1.0, 2.0, 3.0]),
+        'anchor_ids': anchor_ids,
+        'object_ids': object_ids,
+        'rssi': np.arange(3.0*len(anchor_ids)*len(object_ids)).reshape((3, 1, len(anchor_ids), len(object_ids)))
+    }
+
+@pytest.mark.parametrize('object_ids', [
+    ['tag_a', 'tag_b'],
+    np.array(['tag_a', 'tag_b'], dtype = object),
+    pd.Series(['tag_a', 'tag_b'], dtype = 'string').array,
+    [3, 12]
+])
+def test_get_hits_after_put(tmp_path, object_ids):
+    observation_cache = smcmodel_localize.observation_cache.ObservationCache(str(tmp_path))
+    arrays = _arrays(np.array(['anchor_1', 'anchor_2'], dtype = object), object_ids)
+    observation_cache.put('key', arrays, 'rssi')
+    cached_arrays = observation_cache.get('key')
+    assert cached_arrays is not None
+    assert cached_arrays['anchor_ids'] == ['anchor_1', 'anchor_2']
+    assert cached_arrays['object_ids'] == list(object_ids)
+    np.testing.assert_array_equal(cached_arrays['timestamps'], arrays['timestamps'])
+    np.testing.assert_array_equal(cached_arrays['rssi'], arrays['rssi'])
+
+def test_prepare_observation_data_hits_cache_with_string_ids(tmp_path):
+    pytest.importorskip('smcmodel')
+    import smcmodel_localize.data_pipes
+    import smcmodel_localize.instrumentation
+    database_connection = smcmodel_localize.database_connections.DatabaseConnectionSQLite(str(tmp_path / 'observations.db'))
+    database_connection.write_dataframe_object_time_series(pd.DataFrame({
+        'timestamp': pd.date_range('2020-01-01', periods = 4, freq = 's', tz = 'UTC'),
+        'anchor_id': ['anchor_1', 'anchor_2', 'anchor_1', 'anchor_2'],
+        'object_id': ['tag_a', 'tag_b', 'tag_b', 'tag_a'],
+        'rssi': [-50.0, -60.0, -70.0, -80.0]
+    }))
+    observation_cache = smcmodel_localize.observation_cache.ObservationCache(str(tmp_path / 'cache'))
+    instrumentation = smcmodel_localize.instrumentation.Instrumentation()
+    observation_data = [
+        smcmodel_localize.data_pipes.prepare_observation_data(
+            database_connection = database_connection,
+            measurement_value_field_name = 'rssi',
+            observation_cache = observation_cache,
+            instrumentation = instrumentation
+        )
+        for repeat_index in range(2)
+    ]
+    # The cube is only built, and its duplicates counted, on the miss
+    assert instrumentation.counters == {
+        'observation_cache_misses': 1,
+        'duplicates_collapsed': 0,
+        'observation_cache_hits': 1
+    }
+    assert observation_data[1]['object_ids'] == ['tag_a', 'tag_b']
+    np.testing.assert_array_equal(
+        observation_data[0]['observation_arrays']['rssi'],
+        observation_data[1]['observation_arrays']['rssi']
+    )
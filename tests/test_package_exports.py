@@ -0,0 +1,92 @@
+import importlib
+import inspect
+import os
+import subprocess
+import sys
+import pytest
+
+import smcmodel_localize
+
+def _import_or_skip(module_name):
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as error:
+        # Only missing third-party dependencies are skipped; a broken import
+        # within the package is a failure
+        if error.name is None or error.name.split('.')[0] == 'smcmodel_localize':
+            raise
+        pytest.skip('{} requires {}'.format(module_name, error.name))
+
+def _public_names(module):
+    public_names = set()
+    for name, value in vars(module).items():
+        if name.startswith('_'):
+            continue
+        if inspect.isfunction(value) or inspect.isclass(value):
+            if value.__module__ == module.__name__:
+                public_names.add(name)
+        elif name.isupper():
+            public_names.add(name)
+    return public_names
+
+@pytest.mark.parametrize('module_name', sorted(smcmodel_localize._EXPORTS.keys()))
+def test_exports_match_module(module_name):
+    module = _import_or_skip(module_name)
+    names = smcmodel_localize._EXPORTS[module_name]
+    assert len(names) == len(set(names))
+    assert set(names) == _public_names(module)
+    for name in names:
+        assert getattr(smcmodel_localize, name) is getattr(module, name)
+
+def test_exports_are_unique_across_modules():
+    names = [name for module_names in smcmodel_localize._EXPORTS.values() for name in module_names]
+    assert len(names) == len(set(names))
+    assert sorted(smcmodel_localize.__all__) == sorted(names)
+    assert set(names) <= set(dir(smcmodel_localize))
+
+def test_submodules_match_package_files():
+    package_directory = os.path.dirname(smcmodel_localize.__file__)
+    module_names = set(
+        os.path.splitext(filename)[0]
+        for filename in os.listdir(package_directory)
+        if filename.endswith('.py') and filename != '__init__.py'
+    )
+    assert set(smcmodel_localize._SUBMODULES) == module_names
+    for module_name in smcmodel_localize._EXPORTS.keys():
+        assert module_name.split('.', 1)[1] in smcmodel_localize._SUBMODULES
+
+@pytest.mark.parametrize('submodule_name', smcmodel_localize._SUBMODULES)
+def test_submodules_resolve(submodule_name):
+    module = _import_or_skip('smcmodel_localize.{}'.format(submodule_name))
+    assert getattr(smcmodel_localize, submodule_name) is module
+
+def test_unknown_attribute_raises():
+    with pytest.raises(AttributeError):
+        smcmodel_localize.not_an_export
+
+def test_data_pipes_helpers_import_without_tensorflow():
+    # Run in a fresh interpreter, since other tests may already have imported
+    # TensorFlow
+    script = """
+import sys
+import pandas as pd
+import smcmodel_localize
+import smcmodel_localize.data_pipes
+arrays = smcmodel_localize.observation_df_to_arrays(
+    pd.DataFrame({
+        'timestamp': pd.to_datetime(['2020-01-01T12:00:00Z', '2020-01-01T12:00:01Z']),
+        'anchor_id': ['anchor_1', 'anchor_1'],
+        'object_id': ['tag_a', 'tag_a'],
+        'rssi': [-50.0, -60.0]
+    }),
+    'rssi'
+)
+assert len(arrays['timestamps']) == 2
+loaded_modules = sorted(
+    module_name
+    for module_name in sys.modules
+    if module_name.split('.')[0] in ('tensorflow', 'tensorflow_probability', 'smcmodel')
+)
+assert loaded_modules == [], loaded_modules
+"""
+    subprocess.run([sys.executable, '-c', script], check = True)
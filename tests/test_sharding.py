@@ -0,0 +1,64 @@
+import pickle
+import pytest
+import numpy as np
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('smcmodel')
+
+import smcmodel_localize.model
+import smcmodel_localize.sharding
+
+MODEL_ARGUMENTS = {
+    'num_objects': 2,
+    'num_anchors': 4,
+    'room_corners': [[0.0, 0.0], [10.0, 20.0]],
+    'anchor_positions': [[0.0, 0.0], [10.0, 0.0], [0.0, 20.0], [10.0, 20.0]],
+    'measurement_value_name': 'range'
+}
+
+def _observation_arrays(num_timestamps):
+    random_state = np.random.RandomState(0)
+    anchor_positions = np.asarray(MODEL_ARGUMENTS['anchor_positions'])
+    object_positions = np.stack([
+        np.linspace([2.0, 3.0], [8.0, 15.0], num_timestamps),
+        np.linspace([7.0, 18.0], [3.0, 4.0], num_timestamps)
+    ], axis = 1)
+    ranges = np.linalg.norm(object_positions[:, np.newaxis, :, :] - anchor_positions[np.newaxis, :, np.newaxis, :], axis = -1)
+    return {
+        'timestamps': 1577880000.0 + np.arange(num_timestamps, dtype = np.float64),
+        'anchor_ids': ['anchor_{}'.format(anchor_index) for anchor_index in range(4)],
+        'object_ids': ['tag_a', 'tag_b'],
+        'range': (ranges + random_state.normal(scale = 0.1, size = ranges.shape))[:, np.newaxis, :, :]
+    }
+
+def test_default_model_arguments_pickle():
+    model = smcmodel_localize.model.LocalizationModel(**MODEL_ARGUMENTS)
+    pickle.dumps(model.measurement_value_mean_function)
+    pickle.dumps(model.measurement_value_sd_function)
+    assert model.measurement_value_sd_function(np.ones(3)) == model.reference_drift
+
+def test_sharded_run_in_worker_processes():
+    observation_arrays = _observation_arrays(40)
+    state_summary_data_destination, seam_report = smcmodel_localize.sharding.estimate_state_time_series_sharded(
+        model_arguments = MODEL_ARGUMENTS,
+        observation_arrays = observation_arrays,
+        num_samples = 100,
+        num_shards = 2,
+        burn_in_seconds = 10.0,
+        num_workers = 2
+    )
+    np.testing.assert_array_equal(state_summary_data_destination.timestamps, observation_arrays['timestamps'])
+    assert state_summary_data_destination.array_dict['moving_object_positions_mean'].shape == (40, 1, 2, 2)
+    assert seam_report['object_id'].tolist() == ['tag_a', 'tag_b']
+    assert (seam_report['burn_in_timestamps'] == 10).all()
+
+def test_unpicklable_model_arguments_rejected():
+    model_arguments = dict(MODEL_ARGUMENTS, measurement_value_mean_function = lambda distances: distances)
+    with pytest.raises(ValueError, match = 'picklable'):
+        smcmodel_localize.sharding.estimate_state_time_series_sharded(
+            model_arguments = model_arguments,
+            observation_arrays = _observation_arrays(10),
+            num_samples = 10,
+            num_shards = 2,
+            num_workers = 2
+        )
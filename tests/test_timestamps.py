@@ -0,0 +1,71 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+import smcmodel_localize.timestamps
+
+# Repeated timestamps are allowed and must land on the same side of a bound
+POSIX_TIMESTAMPS = np.array([100.0, 101.0, 101.0, 102.5, 104.0, 104.0, 107.0, 110.0])
+
+def _boolean_window(posix_timestamps, start_timestamp, end_timestamp):
+    # The boolean-mask window selection that TimeIndex.slice replaced
+    boolean = np.full(posix_timestamps.shape, True)
+    if start_timestamp is not None:
+        boolean &= posix_timestamps >= smcmodel_localize.timestamps.to_posix_timestamp(start_timestamp)
+    if end_timestamp is not None:
+        boolean &= posix_timestamps <= smcmodel_localize.timestamps.to_posix_timestamp(end_timestamp)
+    return boolean
+
+@pytest.mark.parametrize('start_timestamp, end_timestamp', [
+    (None, None),
+    (101.0, 104.0),
+    (101.0, 101.0),
+    (100.5, 106.9),
+    (None, 102.5),
+    (104.0, None),
+    (100.0, 110.0),
+    (90.0, 120.0),
+    (105.0, 106.0),
+    (111.0, None),
+    (None, 99.0),
+    (107.0, 102.0)
+])
+def test_slice_matches_boolean_window(start_timestamp, end_timestamp):
+    time_index = smcmodel_localize.timestamps.TimeIndex(POSIX_TIMESTAMPS)
+    values = np.arange(len(POSIX_TIMESTAMPS))
+    time_slice = time_index.slice(start_timestamp, end_timestamp)
+    assert isinstance(time_slice, slice)
+    np.testing.assert_array_equal(
+        values[time_slice],
+        values[_boolean_window(POSIX_TIMESTAMPS, start_timestamp, end_timestamp)]
+    )
+
+def test_slice_of_empty_window_is_empty():
+    time_index = smcmodel_localize.timestamps.TimeIndex(POSIX_TIMESTAMPS)
+    for start_timestamp, end_timestamp in [(105.0, 106.0), (111.0, None), (None, 99.0), (107.0, 102.0)]:
+        time_slice = time_index.slice(start_timestamp, end_timestamp)
+        assert time_slice.stop == time_slice.start
+        assert len(POSIX_TIMESTAMPS[time_slice]) == 0
+    assert smcmodel_localize.timestamps.TimeIndex([]).slice(100.0, 110.0) == slice(0, 0)
+
+def test_slice_accepts_datetime_bounds():
+    datetimes = pd.DatetimeIndex(
+        smcmodel_localize.timestamps.posix_timestamps_to_datetime_index(POSIX_TIMESTAMPS + 1.6e9)
+    )
+    time_index = smcmodel_localize.timestamps.TimeIndex(datetimes)
+    np.testing.assert_array_equal(time_index.posix_timestamps, POSIX_TIMESTAMPS + 1.6e9)
+    np.testing.assert_array_equal(time_index.numpy_datetimes, datetimes.tz_convert(None).to_numpy())
+    # Naive bounds are read as UTC, aware bounds are converted
+    bounds = [
+        (datetimes[1].tz_convert(None), datetimes[4].tz_convert('America/Chicago')),
+        (datetimes[3].isoformat(), None)
+    ]
+    for start_timestamp, end_timestamp in bounds:
+        np.testing.assert_array_equal(
+            datetimes[time_index.slice(start_timestamp, end_timestamp)],
+            datetimes[_boolean_window(time_index.posix_timestamps, start_timestamp, end_timestamp)]
+        )
+
+def test_time_index_rejects_unsorted_timestamps():
+    with pytest.raises(ValueError):
+        smcmodel_localize.timestamps.TimeIndex([101.0, 100.0])